@@ -0,0 +1,128 @@
+"""
+Latency of a user's own paper under a burst of neighbor papers, with and
+without admission control (src/verifier/admission.py).
+
+A burst of --neighbors cold /score requests arrives at once, and
+--interactive cold /score requests for "the user's paper" arrive spread
+over the following --spread seconds, all through the Flask test client
+against an in-process benchmarks/fake_gemini.py. Each mode scores fresh
+synthetic papers:
+    fifo        every request is interactive and nothing is turned away,
+                as before admission control
+    admission   the burst is sent as "priority": "neighbor" with
+                --neighbor-deadline seconds, the user's papers as interactive
+One JSON line per mode and class reports p50/p95 latency of the answered
+requests, how long the slowest 429/503 took, and the count of each HTTP
+status.
+
+Usage (from the repository root):
+    python benchmarks/bench_admission.py --neighbors 40 --interactive 5 --latency-median 0.8
+"""
+
+import argparse
+import collections
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src", "verifier"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_gemini
+from bench_scoring import percentile, serve_directory, synthetic_pages, write_pdf
+
+MODES = ("fifo", "admission")
+
+
+def run_mode(mode: str, args, pdf_base_url: str, first_paper: int) -> list[dict]:
+    import endpoint
+    from admission import AdmissionController
+    # fifo: no slot limit and nothing turned away, everyone in one class
+    endpoint.admission = (AdmissionController(slots=10_000, queue_limits={"interactive": 10_000})
+                          if mode == "fifo" else AdmissionController())
+    client = endpoint.app.test_client()
+    outcomes = collections.defaultdict(list)
+
+    def score(paper: int, priority_class: str):
+        body = {"paper_id": f"bench-{paper}", "pdf_url": f"{pdf_base_url}/paper_{paper}.pdf"}
+        if mode == "admission" and priority_class == "neighbor":
+            body |= {"priority": "neighbor", "deadline_seconds": args.neighbor_deadline}
+        start = time.perf_counter()
+        response = client.post("/score", json=body)
+        outcomes[priority_class].append((response.status_code, time.perf_counter() - start))
+
+    threads = [threading.Thread(target=score, args=(first_paper + i, "neighbor")) for i in range(args.neighbors)]
+    for thread in threads:
+        thread.start()
+    for i in range(args.interactive):
+        time.sleep(args.spread / args.interactive)
+        thread = threading.Thread(target=score, args=(first_paper + args.neighbors + i, "interactive"))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    reports = []
+    for priority_class in ("interactive", "neighbor"):
+        latencies = [seconds for status, seconds in outcomes[priority_class] if status == 200]
+        turned_away = [seconds for status, seconds in outcomes[priority_class] if status in (429, 503)]
+        reports.append({
+            "mode": mode,
+            "class": priority_class,
+            "requests": len(outcomes[priority_class]),
+            "statuses": dict(collections.Counter(str(status) for status, _ in outcomes[priority_class])),
+            "latency_p50": round(statistics.median(latencies), 3) if latencies else None,
+            "latency_p95": round(percentile(latencies, 95), 3) if latencies else None,
+            "latency_max": round(max(latencies), 3) if latencies else None,
+            "turned_away_latency_max": round(max(turned_away), 3) if turned_away else None,
+        })
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--neighbors", type=int, default=40, help="cold neighbor papers in the burst")
+    parser.add_argument("--interactive", type=int, default=5, help="user papers arriving during the burst")
+    parser.add_argument("--spread", type=float, default=5, help="seconds over which the user papers arrive")
+    parser.add_argument("--pages", type=int, default=8, help="pages per synthetic paper")
+    parser.add_argument("--neighbor-deadline", type=float, default=30, help="deadline_seconds of the burst")
+    parser.add_argument("--initial-seconds", type=float, default=2,
+                        help="seconds per paper admission control assumes before timing one")
+    fake_gemini.add_arguments(parser)
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    server, gemini_url = fake_gemini.start_server(fake_gemini.config_from_args(args))
+    # Must be set before the service modules read their configuration
+    os.environ.update({
+        "GOOGLE_GEMINI_BASE_URL": gemini_url,
+        "GEMINI_API_KEY": "fake",
+        "SCORE_CACHE_DIR": os.path.join(workdir.name, "gemini_cache"),
+        "PDF_STORE_DIR": os.path.join(workdir.name, "pdf_store"),
+        "EXTRACTION_STORE_DIR": os.path.join(workdir.name, "extraction_store"),
+        "JOBS_DB_PATH": os.path.join(workdir.name, "jobs.sqlite3"),
+        "GRADE_STORE_DIR": os.path.join(workdir.name, "grade_store"),
+        "VECTOR_INDEX_DIR": os.path.join(workdir.name, "vector_index"),
+        "ADMISSION_INITIAL_SECONDS": str(args.initial_seconds),
+        "LOG_LEVEL": "WARNING",
+    })
+
+    papers_per_mode = args.neighbors + args.interactive
+    pdf_dir = os.path.join(workdir.name, "pdfs")
+    os.makedirs(pdf_dir)
+    for paper in range(papers_per_mode * len(MODES)):
+        write_pdf(os.path.join(pdf_dir, f"paper_{paper}.pdf"), synthetic_pages(paper, args.pages))
+    pdf_base_url = serve_directory(pdf_dir)
+
+    for i, mode in enumerate(MODES):
+        for report in run_mode(mode, args, pdf_base_url, i * papers_per_mode):
+            print(json.dumps(report), flush=True)
+
+
+if __name__ == "__main__":
+    main()
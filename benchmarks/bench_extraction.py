@@ -0,0 +1,94 @@
+"""
+Serial vs process-pool PDF text extraction.
+
+Runs extraction.extract_pages over data/2510.02306v1.pdf, that paper
+repeated into larger documents, and synthetic text-dense PDFs, and prints
+one JSON line per (document, mode) with the best-of-N wall time.
+
+Usage (from the repository root):
+    python benchmarks/bench_extraction.py --repeat 3 --workers 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src", "verifier"))
+
+import fitz
+
+SAMPLE_PDF = os.path.join(ROOT, "data", "2510.02306v1.pdf")
+LOREM = ("Hyperparameters were tuned with a grid search over learning rates "
+         "and batch sizes on 8 NVIDIA A100 GPUs. ") * 60
+
+
+def repeated_pdf(path: str, copies: int):
+    with fitz.open(SAMPLE_PDF) as src, fitz.open() as out:
+        for _ in range(copies):
+            out.insert_pdf(src)
+        out.save(path)
+
+
+def synthetic_pdf(path: str, pages: int):
+    with fitz.open() as out:
+        for i in range(pages):
+            page = out.new_page()
+            page.insert_textbox(fitz.Rect(36, 36, 576, 756), f"Page {i + 1}\n{LOREM}", fontsize=7)
+        out.save(path)
+
+
+def best_time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    # The pool is sized from the environment when extraction is first imported
+    os.environ["EXTRACTION_WORKERS"] = str(args.workers)
+    import extraction
+
+    with tempfile.TemporaryDirectory() as tmp:
+        documents = [("sample", SAMPLE_PDF)]
+        for copies in (10, 50):
+            path = os.path.join(tmp, f"sample_x{copies}.pdf")
+            repeated_pdf(path, copies)
+            documents.append((f"sample_x{copies}", path))
+        for pages in (100, 400):
+            path = os.path.join(tmp, f"synthetic_{pages}.pdf")
+            synthetic_pdf(path, pages)
+            documents.append((f"synthetic_{pages}", path))
+
+        # Warm the pool so worker start-up is not charged to the first document
+        extraction.extract_pages(documents[-1][1], workers=args.workers)
+
+        for name, path in documents:
+            with fitz.open(path) as doc:
+                page_count = doc.page_count
+            serial = best_time(lambda: extraction.extract_pages(path, workers=1), args.repeat)
+            parallel = best_time(lambda: extraction.extract_pages(path, workers=args.workers), args.repeat)
+            for mode, seconds in (("serial", serial), ("parallel", parallel)):
+                print(json.dumps({
+                    "document": name,
+                    "pages": page_count,
+                    "mode": mode,
+                    "workers": 1 if mode == "serial" else args.workers,
+                    "seconds": round(seconds, 4),
+                    "pages_per_sec": round(page_count / seconds, 1),
+                }))
+
+
+if __name__ == "__main__":
+    main()
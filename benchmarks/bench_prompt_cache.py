@@ -0,0 +1,122 @@
+"""
+Tokens billed and call latency of the PROMPT_CACHE_MODE settings.
+
+Scores data/2510.02306v1.pdf plus --papers synthetic papers through
+ScoringEngine.generate() against an in-process benchmarks/fake_gemini.py,
+once per mode, with a fresh engine (and so fresh context caches) each time:
+    off       rubric instructions prepended to every call's contents
+    system    instructions sent as a system instruction
+    explicit  instructions registered once as cached content
+Pages are sent one per call, and with --batched also packed as in
+PAGE_BATCHING. One JSON line per mode reports prompt and cached tokens, the
+input cost at the strong tier's prices (cached tokens at cached_price), and
+p50/p95 call latency. The engine does not stream, so time to first token is
+the time to the whole response; the fake models prefill as
+--prefill-per-1k seconds per thousand uncached prompt tokens. Engine rate
+limits are lifted and a warm-up pass runs first, so latencies are the
+fake's and not queueing or connection setup.
+
+Usage (from the repository root):
+    python benchmarks/bench_prompt_cache.py --papers 4 --latency-median 0.4 --prefill-per-1k 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src", "verifier"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_gemini
+from bench_scoring import SAMPLE_PDF, percentile, synthetic_pages
+
+MODES = ("off", "system", "explicit")
+
+
+async def run_calls(engine, calls: list[tuple[str, str]], usage) -> list[float]:
+    """Send (instruction, contents) calls concurrently; returns per-call seconds."""
+    async def call(instruction, contents):
+        start = time.perf_counter()
+        await engine.generate(contents, usage, instruction=instruction)
+        return time.perf_counter() - start
+    return await asyncio.gather(*(call(instruction, contents) for instruction, contents in calls))
+
+
+def page_calls(documents: list[list[str]], batched: bool) -> list[tuple[str, str]]:
+    from prompts import PAGE_DELIMITER, build_prompt
+    from score import pack_pages
+    calls = []
+    for pages in documents:
+        if not batched:
+            calls.extend((build_prompt(), page) for page in pages)
+            continue
+        for batch in pack_pages(pages):
+            contents = "".join(f"\n{PAGE_DELIMITER.format(page=i + 1)}\n{pages[i]}\n" for i in batch)
+            calls.append((build_prompt(batched=True), contents))
+    return calls
+
+
+def bench_mode(mode: str, calls: list, server, args) -> dict:
+    from constants import MODEL_TIERS
+    from engine import ScoringEngine, TokenUsage
+    from google import genai
+    from score import usage_cost
+
+    engine = ScoringEngine(client=genai.Client(), prompt_cache_mode=mode)
+    usage = TokenUsage()
+    counts_before = dict(server.config.counts)
+    start = time.perf_counter()
+    latencies = engine.run(run_calls(engine, calls, usage))
+    seconds = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "calls": len(calls),
+        "seconds": round(seconds, 3),
+        "prompt_tokens": usage.prompt_tokens,
+        "cached_tokens": usage.cached_tokens,
+        "uncached_prompt_tokens": usage.prompt_tokens - usage.cached_tokens,
+        "input_cost_usd": round(usage_cost(usage, {**MODEL_TIERS[-1], "output_price": 0}), 6),
+        "cache_creates": server.config.counts["cache_creates"] - counts_before["cache_creates"],
+        "latency_p50": round(statistics.median(latencies), 3),
+        "latency_p95": round(percentile(latencies, 95), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--papers", type=int, default=4, help="synthetic papers besides the sample PDF")
+    parser.add_argument("--pages", type=int, default=8, help="pages per synthetic paper")
+    parser.add_argument("--batched", action="store_true", help="also measure batched page calls")
+    fake_gemini.add_arguments(parser)
+    args = parser.parse_args()
+
+    server, gemini_url = fake_gemini.start_server(fake_gemini.config_from_args(args))
+    # Must be set before the service modules read their configuration; the
+    # engine limits are lifted so latencies are the fake's, not queueing
+    os.environ.update({
+        "GOOGLE_GEMINI_BASE_URL": gemini_url,
+        "GEMINI_API_KEY": "fake",
+        "GEMINI_MAX_CONCURRENCY": "256",
+        "GEMINI_REQUESTS_PER_SECOND": "1000",
+        "GEMINI_TOKENS_PER_MINUTE": "1e9",
+        "LOG_LEVEL": "WARNING",
+    })
+
+    from extraction import extract_pages
+    documents = [extract_pages(SAMPLE_PDF)] + [synthetic_pages(i, args.pages) for i in range(args.papers)]
+    # Unreported warm-up, so the first mode does not pay for opening connections
+    bench_mode("off", page_calls(documents, False), server, args)
+    for batched in (False, True) if args.batched else (False,):
+        calls = page_calls(documents, batched)
+        for mode in MODES:
+            print(json.dumps({"batched": batched, **bench_mode(mode, calls, server, args)}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Offline throughput benchmark of the scoring path against a fake Gemini.
+
+Starts benchmarks/fake_gemini.py in-process, points google-genai at it and
+runs three drivers:
+    score      score.score() on whole synthetic papers
+    pages      score.score_pages_concurrently() on data/2510.02306v1.pdf
+               and synthetic multi-page papers
+    endpoints  /score, /score-by-text and /upload-pdf through the Flask test
+               client, every request sent cold and then warm
+    cascade    the pages driver's documents scored by the strong model alone
+               and through the MODEL_TIERS cascade (not part of the default
+               set); the cascade report adds per-tier calls and cost, and how
+               many aggregate grades differ from the strong model's
+
+PDFs for /score are served from a temporary directory by a local HTTP
+server, and all caches and stores live in a temporary directory, so runs
+start cold and never touch the working tree. Each driver prints one JSON
+line with papers/sec, pages/sec, p50/p95/p99 latency, peak RSS and cache hit
+ratio. With --baseline, a driver that got slower than --tolerance (on
+pages/sec or p95) fails the run.
+
+Usage (from the repository root):
+    python benchmarks/bench_scoring.py --papers 20 --latency-median 0.5 --output bench.json
+    python benchmarks/bench_scoring.py --baseline bench.json --tolerance 0.2
+    python benchmarks/bench_scoring.py --drivers cascade --lite-noise 0.1
+"""
+
+import argparse
+import functools
+import http.server
+import io
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src", "verifier"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fitz
+
+import fake_gemini
+
+SAMPLE_PDF = os.path.join(ROOT, "data", "2510.02306v1.pdf")
+SECTIONS = [
+    "3 Method\nWe propose an encoder-decoder architecture trained with a contrastive objective. ",
+    "4 Experimental Setup\nWe train for 10 epochs with a learning rate of 3e-5, batch size 32 and AdamW "
+    "on 8 NVIDIA A100 GPUs, which takes 12 GPU hours. ",
+    "5 Results\nWe report accuracy and F1 averaged over 5 random seeds, with standard deviation. ",
+    "Data\nThe dataset has 12,000 English sentences split into train/dev/test; we tokenize and deduplicate it. ",
+    "Related work\nPrior approaches to this problem differ in how they model context. ",
+]
+
+
+def synthetic_pages(paper: int, pages: int) -> list[str]:
+    """Distinct text-dense pages; the paper number keeps every paper a cache miss."""
+    return [f"Synthetic paper {paper}, page {page + 1}\n" + SECTIONS[(paper + page) % len(SECTIONS)] * 25
+            for page in range(pages)]
+
+
+def write_pdf(path: str, pages: list[str]):
+    with fitz.open() as out:
+        for text in pages:
+            out.new_page().insert_textbox(fitz.Rect(36, 36, 576, 756), text, fontsize=7)
+        out.save(path)
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0.0
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def run_driver(name: str, jobs: list, concurrency: int, pages: int, server, hit_ratio=None) -> dict:
+    """Run the (fn, args) jobs on a thread pool and summarize them as one report."""
+    from engine import get_engine
+    engine = get_engine()
+    calls_before, retries_before, hedges_before = server.config.counts["generateContent"], engine.retries, engine.hedges
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(lambda job: timed(*job), jobs))
+    seconds = time.perf_counter() - start
+
+    return {
+        "driver": name,
+        "papers": len(jobs),
+        "pages": pages,
+        "concurrency": concurrency,
+        "seconds": round(seconds, 3),
+        "papers_per_sec": round(len(jobs) / seconds, 2),
+        "pages_per_sec": round(pages / seconds, 2),
+        "latency_p50": round(statistics.median(latencies), 3),
+        "latency_p95": round(percentile(latencies, 95), 3),
+        "latency_p99": round(percentile(latencies, 99), 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "cache_hit_ratio": hit_ratio() if hit_ratio else None,
+        "gemini_calls": server.config.counts["generateContent"] - calls_before,
+        "engine_retries": engine.retries - retries_before,
+        "engine_hedges": engine.hedges - hedges_before,
+    }
+
+
+def bench_score(args, server, corpus) -> dict:
+    from score import score
+    jobs = [(score, "\n".join(pages), "gemini-2.5-flash") for pages in corpus]
+    return run_driver("score", jobs, args.concurrency, sum(len(p) for p in corpus), server)
+
+
+def bench_pages(args, server, corpus) -> dict:
+    from extraction import extract_pages
+    from score import score_pages_concurrently
+    documents = [extract_pages(SAMPLE_PDF)] + corpus
+    jobs = [(score_pages_concurrently, pages, "gemini-2.5-flash") for pages in documents]
+    return run_driver("pages", jobs, args.concurrency, sum(len(p) for p in documents), server)
+
+
+def bench_cascade(args, server, corpus) -> list[dict]:
+    from constants import MODEL_TIERS
+    from endpoint import calc_aggregate_graded_rubric
+    from engine import TokenUsage
+    from extraction import extract_pages
+    from score import score_pages_concurrently, usage_cost
+    documents = [extract_pages(SAMPLE_PDF)] + corpus
+    pages = sum(len(p) for p in documents)
+    strong = MODEL_TIERS[-1]
+    reports, grades = [], {}
+
+    for mode, tiers in (("strong", None), ("cascade", MODEL_TIERS)):
+        usages, tier_stats, grades[mode] = [TokenUsage() for _ in documents], [{} for _ in documents], [None] * len(documents)
+
+        def run(i, tiers=tiers, mode=mode):
+            results = score_pages_concurrently(documents[i], strong['model'], usage=usages[i],
+                                               tiers=tiers, tier_stats=tier_stats[i])
+            grades[mode][i] = calc_aggregate_graded_rubric([result['fields'] for result in results])
+
+        calls_before = dict(server.config.model_counts)
+        report = run_driver(f"cascade {mode}", [(run, i) for i in range(len(documents))], args.concurrency, pages, server)
+        report["calls_by_model"] = {model: count - calls_before.get(model, 0)
+                                    for model, count in server.config.model_counts.items()
+                                    if count > calls_before.get(model, 0)}
+        if tiers is None:
+            total = TokenUsage()
+            for usage in usages:
+                total.merge(usage)
+            report["cost_usd"] = round(usage_cost(total, strong), 4)
+        else:
+            report["tiers"] = {}
+            for stats in tier_stats:
+                for name, tier in stats.items():
+                    summary = report["tiers"].setdefault(name, {"model": tier["model"], "pages_scored": 0,
+                                                                "pages_escalated": 0, "requests": 0, "cost_usd": 0.0})
+                    for key in ("pages_scored", "pages_escalated", "requests", "cost_usd"):
+                        summary[key] += tier[key]
+            report["cost_usd"] = round(sum(t["cost_usd"] for t in report["tiers"].values()), 4)
+            for summary in report["tiers"].values():
+                summary["cost_usd"] = round(summary["cost_usd"], 4)
+            changed = [sum(a.get(field) != b.get(field) for field in a.keys() | b.keys()) for a, b in zip(grades["strong"], grades["cascade"])]
+            report["papers_with_changed_grades"] = sum(1 for n in changed if n)
+            report["changed_grades"] = sum(changed)
+        reports.append(report)
+    return reports
+
+
+def bench_endpoints(args, server, corpus, pdf_dir, pdf_base_url) -> list[dict]:
+    import endpoint
+    client = endpoint.app.test_client()
+
+    def post(path, expected=200, kwargs=None):
+        response = client.post(path, **(kwargs or {}))
+        if response.status_code != expected:
+            raise RuntimeError(f"{path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+    def upload(path):
+        with open(path, "rb") as f:
+            post("/upload-pdf", 200, {"data": {"file": (io.BytesIO(f.read()), os.path.basename(path))},
+                                      "content_type": "multipart/form-data"})
+
+    papers = [(f"synthetic-{i}", f"{pdf_base_url}/paper_{i}.pdf", pages) for i, pages in enumerate(corpus)]
+    routes = {
+        "/score": [(post, "/score", 200, {"json": {"paper_id": paper_id, "pdf_url": pdf_url}})
+                   for paper_id, pdf_url, _ in papers],
+        "/score-by-text": [(post, "/score-by-text", 200, {"json": {"paper_id": paper_id, "paper_text": "\n".join(pages)}})
+                           for paper_id, _, pages in papers],
+        "/upload-pdf": [(upload, os.path.join(pdf_dir, f"paper_{i}.pdf")) for i in range(len(papers))],
+    }
+
+    reports = []
+    for route, jobs in routes.items():
+        for phase in ("cold", "warm"):
+            before = endpoint.cache.stats()
+
+            def hit_ratio(before=before):
+                after = endpoint.cache.stats()
+                hits = sum(after[k] - before[k] for k in ("hot_hits", "disk_hits"))
+                lookups = hits + after["misses"] - before["misses"]
+                return round(hits / lookups, 3) if lookups else None
+
+            report = run_driver(f"endpoint {route} {phase}", jobs, args.concurrency,
+                                sum(len(pages) for *_, pages in papers), server, hit_ratio)
+            reports.append(report)
+    return reports
+
+
+def serve_directory(directory: str) -> str:
+    class QuietHandler(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def check_regressions(reports: list[dict], baseline_path: str, tolerance: float) -> list[str]:
+    with open(baseline_path) as f:
+        baseline = {report["driver"]: report for report in json.load(f)}
+    regressions = []
+    for report in reports:
+        previous = baseline.get(report["driver"])
+        if previous is None:
+            continue
+        if report["pages_per_sec"] < previous["pages_per_sec"] * (1 - tolerance):
+            regressions.append(f"{report['driver']}: pages/sec {previous['pages_per_sec']} -> {report['pages_per_sec']}")
+        if report["latency_p95"] > previous["latency_p95"] * (1 + tolerance):
+            regressions.append(f"{report['driver']}: p95 {previous['latency_p95']}s -> {report['latency_p95']}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--drivers", default="score,pages,endpoints", help="comma-separated drivers to run")
+    parser.add_argument("--papers", type=int, default=10, help="synthetic papers per driver")
+    parser.add_argument("--pages", type=int, default=8, help="pages per synthetic paper")
+    parser.add_argument("--concurrency", type=int, default=4, help="papers scored at once")
+    parser.add_argument("--output", help="write all reports to this JSON file")
+    parser.add_argument("--baseline", help="JSON file from an earlier --output run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    fake_gemini.add_arguments(parser)
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    server, gemini_url = fake_gemini.start_server(fake_gemini.config_from_args(args))
+    # Must be set before the service modules read their configuration
+    os.environ.update({
+        "GOOGLE_GEMINI_BASE_URL": gemini_url,
+        "GEMINI_API_KEY": "fake",
+        "SCORE_CACHE_DIR": os.path.join(workdir.name, "gemini_cache"),
+        "PDF_STORE_DIR": os.path.join(workdir.name, "pdf_store"),
+        "EXTRACTION_STORE_DIR": os.path.join(workdir.name, "extraction_store"),
+        "JOBS_DB_PATH": os.path.join(workdir.name, "jobs.sqlite3"),
+        "GRADE_STORE_DIR": os.path.join(workdir.name, "grade_store"),
+        "VECTOR_INDEX_DIR": os.path.join(workdir.name, "vector_index"),
+        "UPLOAD_DIR": os.path.join(workdir.name, "uploads"),
+    })
+
+    corpus = [synthetic_pages(i, args.pages) for i in range(args.papers)]
+    pdf_dir = os.path.join(workdir.name, "pdfs")
+    os.makedirs(pdf_dir)
+    for i, pages in enumerate(corpus):
+        write_pdf(os.path.join(pdf_dir, f"paper_{i}.pdf"), pages)
+
+    drivers = args.drivers.split(",")
+    reports = []
+    if "score" in drivers:
+        reports.append(bench_score(args, server, corpus))
+    if "pages" in drivers:
+        reports.append(bench_pages(args, server, corpus))
+    if "cascade" in drivers:
+        reports.extend(bench_cascade(args, server, corpus))
+    if "endpoints" in drivers:
+        reports.extend(bench_endpoints(args, server, corpus, pdf_dir, serve_directory(pdf_dir)))
+
+    for report in reports:
+        print(json.dumps(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+
+    if args.baseline:
+        regressions = check_regressions(reports, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Queries/sec of src/verifier/vector_index.py against corpus size.
+
+For each size, a fresh index in a temporary directory is filled with
+synthetic clustered embeddings (768 dimensions like bge-base-en-v1.5,
+spread around --clusters topic centers), then timed for:
+    exact       brute-force search, one query at a time and in batches
+    ivf         search through an inverted file of sqrt(size) lists,
+                with recall@k measured against the exact results
+One JSON line is printed per size.
+
+Usage (from the repository root):
+    python benchmarks/bench_vector_index.py --sizes 10000,50000,200000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src", "verifier"))
+
+from vector_index import VectorIndex
+
+
+def synthetic_embeddings(rng, centers: np.ndarray, count: int, noise: float) -> np.ndarray:
+    topics = rng.integers(0, len(centers), count)
+    return (centers[topics] + noise * rng.standard_normal((count, centers.shape[1]), dtype=np.float32)).astype(np.float32)
+
+
+def queries_per_sec(index: VectorIndex, queries: np.ndarray, k: int, batch: int, **kwargs) -> tuple[float, list]:
+    results = []
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        results.extend(index.search(queries[i:i + batch], k, **kwargs))
+    return len(queries) / (time.perf_counter() - start), results
+
+
+def recall(exact: list, approximate: list) -> float:
+    hits = [len({i for i, *_ in a} & {i for i, *_ in e}) / max(len(e), 1) for e, a in zip(exact, approximate)]
+    return float(np.mean(hits))
+
+
+def bench_size(args, size: int) -> dict:
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((args.clusters, args.dim), dtype=np.float32)
+    with tempfile.TemporaryDirectory() as directory:
+        index = VectorIndex(directory)
+        start = time.perf_counter()
+        for offset in range(0, size, args.chunk):
+            count = min(args.chunk, size - offset)
+            index.upsert([f"paper-{offset + i}" for i in range(count)],
+                         synthetic_embeddings(rng, centers, count, args.noise),
+                         [{"title": f"Paper {offset + i}"} for i in range(count)])
+        upsert_seconds = time.perf_counter() - start
+        queries = synthetic_embeddings(rng, centers, args.queries, args.noise)
+
+        exact_qps, exact = queries_per_sec(index, queries, args.k, 1)
+        exact_batched_qps, _ = queries_per_sec(index, queries, args.k, args.batch)
+
+        nlist = max(1, int(np.sqrt(size)))
+        start = time.perf_counter()
+        index.build_ivf(nlist)
+        build_seconds = time.perf_counter() - start
+        ivf_qps, approximate = queries_per_sec(index, queries, args.k, 1, nprobe=args.nprobe)
+
+    return {
+        "size": size,
+        "dim": args.dim,
+        "upsert_per_sec": round(size / upsert_seconds),
+        "exact_qps": round(exact_qps, 1),
+        f"exact_qps_batch{args.batch}": round(exact_batched_qps, 1),
+        "ivf_nlist": nlist,
+        "ivf_nprobe": args.nprobe,
+        "ivf_build_seconds": round(build_seconds, 2),
+        "ivf_qps": round(ivf_qps, 1),
+        f"ivf_recall_at_{args.k}": round(recall(exact, approximate), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10000,50000,200000", help="comma-separated corpus sizes")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=500, help="topic centers of the synthetic corpus")
+    parser.add_argument("--noise", type=float, default=0.6, help="spread of papers around their topic")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=32, help="queries per batched search")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--chunk", type=int, default=10000, help="rows per upsert")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        print(json.dumps(bench_size(args, size)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+Local stand-in for the Gemini REST API, for benchmarks that must not spend
+real quota.
+
+Serves models/<model>:generateContent and models/<model>:countTokens the way
+google-genai calls them, answering with rubric-formatted text for the fields
+named in the prompt (one block per "=== PAGE n ===" section for batched
+prompts) plus usage metadata. The prompt is the cached content named by the
+request, its system instruction and its contents, in that order; cached
+contents are created, read, extended and deleted under cachedContents, and
+their tokens are reported as cachedContentTokenCount. Latency is log-normal
+around a configurable median plus an optional prefill time per thousand
+uncached prompt tokens, and a configurable share of calls fails with 503 or
+is rate limited with 429 and Retry-After. Grades are a deterministic function of the page
+text, so repeated runs score identically. Models with "lite" in their name
+stand in for a cheaper tier: they answer --lite-speedup times faster, and
+change a --lite-noise share of grades to a neighboring grade (also
+deterministically). Thinking tokens follow the request's thinking budget.
+
+Point the service at it with:
+    GOOGLE_GEMINI_BASE_URL=http://127.0.0.1:8089 GEMINI_API_KEY=fake
+
+Usage (from the repository root):
+    python benchmarks/fake_gemini.py --port 8089 --latency-median 0.8 --error-rate 0.01
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GRADES = ["Complete", "Partial", "Not Present"]
+RUBRIC_LINE = re.compile(r"^(?P<field>[A-Z][\w/ ]+?) - ", re.MULTILINE)
+PAGE_LINE = re.compile(r"^=== PAGE (\d+) ===$", re.MULTILINE)
+PATH = re.compile(r"/models/(?P<model>[^/:]+):(?P<method>generateContent|countTokens)$")
+CACHE_PATH = re.compile(r"/(?P<name>cachedContents(?:/[^/]+)?)$")
+
+
+class FakeGeminiConfig:
+    def __init__(self, latency_median=0.8, latency_sigma=0.5, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1.0, seed=None, lite_noise=0.0, lite_speedup=3.0, prefill_per_1k=0.0,
+                 cache_support=True, cache_min_tokens=1024):
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.lite_noise = lite_noise
+        self.lite_speedup = lite_speedup
+        self.prefill_per_1k = prefill_per_1k
+        self.cache_support = cache_support
+        self.cache_min_tokens = cache_min_tokens
+        # name -> {"model", "text", "expires"}
+        self.cached_contents = {}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"generateContent": 0, "countTokens": 0, "errors": 0, "rate_limited": 0,
+                       "cache_creates": 0, "cache_updates": 0, "cache_hits": 0}
+        self.model_counts = {}
+
+    def draw(self, model: str = "", uncached_tokens: int = 0):
+        """(latency seconds, failure status or None) for one call."""
+        median = self.latency_median + self.prefill_per_1k * uncached_tokens / 1000
+        if is_lite(model):
+            median /= self.lite_speedup
+        with self.lock:
+            latency = median * self.random.lognormvariate(0, self.latency_sigma)
+            roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return latency / 10, 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return latency, 503
+        return latency, None
+
+
+def prompt_text(body: dict) -> str:
+    return "".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+
+
+def instruction_text(body: dict) -> str:
+    instruction = body.get("systemInstruction") or {}
+    return "".join(part.get("text", "") for part in instruction.get("parts", []))
+
+
+def timestamp(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def cache_resource(name: str, entry: dict) -> dict:
+    return {"name": name, "model": f"models/{entry['model']}", "displayName": entry.get("display_name", ""),
+            "expireTime": timestamp(entry["expires"]),
+            "usageMetadata": {"totalTokenCount": count_tokens(entry["text"])}}
+
+
+def parse_ttl(value: str) -> float:
+    return float(str(value).rstrip("s"))
+
+
+def rubric_fields(prompt: str) -> list[str]:
+    rubric = prompt.split("## RUBRIC:", 1)[-1].split("---", 1)[0]
+    return RUBRIC_LINE.findall(rubric)
+
+
+def is_lite(model: str) -> bool:
+    return "lite" in model
+
+
+def grade_block(fields: list[str], text: str, noise: float = 0.0) -> str:
+    # Stripped, so a page grades the same wherever it sits in a batch
+    text = text.strip()
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    grades = [GRADES[digest[i % len(digest)] % len(GRADES)] for i in range(len(fields))]
+    if noise:
+        rolls = hashlib.sha256(b"lite\0" + text.encode("utf-8")).digest()
+        for i, grade in enumerate(grades):
+            roll = rolls[(2 * i) % len(rolls)]
+            if roll < noise * 256:
+                # A neighboring grade: Complete <-> Partial <-> Not Present
+                index = GRADES.index(grade)
+                if 0 < index < len(GRADES) - 1:
+                    index += 1 if rolls[(2 * i + 1) % len(rolls)] % 2 else -1
+                else:
+                    index += 1 if index == 0 else -1
+                grades[i] = GRADES[index]
+    lines = [f"{field}: {grade}" for field, grade in zip(fields, grades)]
+    return "\n".join(lines) + "\nAssessment: Synthetic assessment from the fake Gemini server.\n"
+
+
+def fake_response(prompt: str, noise: float = 0.0) -> str:
+    fields = rubric_fields(prompt)
+    paper = prompt.split("=== PAPER BEGINS ===", 1)[-1]
+    pages = PAGE_LINE.split(paper)
+    if len(pages) == 1:
+        return grade_block(fields, paper, noise)
+    # split() gives [preamble, number, text, number, text, ...]
+    return "\n".join(f"=== PAGE {number} ===\n{grade_block(fields, text, noise)}"
+                     for number, text in zip(pages[1::2], pages[2::2]))
+
+
+def thinking_budget(body: dict) -> int:
+    budget = body.get("generationConfig", {}).get("thinkingConfig", {}).get("thinkingBudget")
+    return 200 if budget is None or budget < 0 else min(200, budget)
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def make_handler(config: FakeGeminiConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status: int, payload: dict, headers: dict = None):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_error_json(self, code: int, status: str, message: str):
+            self.send_json(code, {"error": {"code": code, "message": message, "status": status}})
+
+        def read_body(self) -> dict:
+            return json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+
+        def cached_content(self, name: str):
+            """The live cached content called name, or None after replying with an error."""
+            with config.lock:
+                entry = config.cached_contents.get(name)
+                if entry is not None and entry["expires"] <= time.time():
+                    del config.cached_contents[name]
+                    entry = None
+            if entry is None:
+                self.send_error_json(403, "PERMISSION_DENIED", "CachedContent not found (or permission denied)")
+            return entry
+
+        def handle_cache(self, method: str, name: str):
+            body = self.read_body() if method in ("POST", "PATCH") else {}
+            if not config.cache_support:
+                self.send_error_json(404, "NOT_FOUND", "Context caching is not available")
+            elif method == "POST" and name == "cachedContents":
+                model = body.get("model", "").removeprefix("models/")
+                text = instruction_text(body) + prompt_text(body)
+                if count_tokens(text) < config.cache_min_tokens:
+                    self.send_error_json(400, "INVALID_ARGUMENT",
+                                         f"Cached content is too small, min_total_token_count={config.cache_min_tokens}")
+                    return
+                entry = {"model": model, "text": text, "display_name": body.get("displayName", ""),
+                         "expires": time.time() + parse_ttl(body.get("ttl", "3600s"))}
+                name = f"cachedContents/{uuid.uuid4().hex[:16]}"
+                with config.lock:
+                    config.cached_contents[name] = entry
+                    config.counts["cache_creates"] += 1
+                self.send_json(200, cache_resource(name, entry))
+            elif (entry := self.cached_content(name)) is None:
+                return
+            elif method == "PATCH":
+                with config.lock:
+                    entry["expires"] = time.time() + parse_ttl(body.get("ttl", "3600s"))
+                    config.counts["cache_updates"] += 1
+                self.send_json(200, cache_resource(name, entry))
+            elif method == "DELETE":
+                with config.lock:
+                    config.cached_contents.pop(name, None)
+                self.send_json(200, {})
+            else:
+                self.send_json(200, cache_resource(name, entry))
+
+        def route_cache(self, method: str) -> bool:
+            match = CACHE_PATH.search(self.path.split("?", 1)[0])
+            if match is None:
+                return False
+            self.handle_cache(method, match.group("name"))
+            return True
+
+        def do_GET(self):
+            if not self.route_cache("GET"):
+                self.send_error_json(404, "NOT_FOUND", "Not found")
+
+        def do_PATCH(self):
+            if not self.route_cache("PATCH"):
+                self.send_error_json(404, "NOT_FOUND", "Not found")
+
+        def do_DELETE(self):
+            if not self.route_cache("DELETE"):
+                self.send_error_json(404, "NOT_FOUND", "Not found")
+
+        def do_POST(self):
+            if self.route_cache("POST"):
+                return
+            body = self.read_body()
+            match = PATH.search(self.path.split("?", 1)[0])
+            if match is None:
+                self.send_error_json(404, "NOT_FOUND", "Not found")
+                return
+
+            method, model = match.group("method"), match.group("model")
+            with config.lock:
+                config.counts[method] += 1
+                if method == "generateContent":
+                    config.model_counts[model] = config.model_counts.get(model, 0) + 1
+            cached_text = ""
+            if body.get("cachedContent"):
+                entry = self.cached_content(body["cachedContent"])
+                if entry is None:
+                    return
+                if entry["model"] != model:
+                    self.send_error_json(400, "INVALID_ARGUMENT", "Model does not match the cached content")
+                    return
+                cached_text = entry["text"]
+                with config.lock:
+                    config.counts["cache_hits"] += 1
+            prompt = cached_text + instruction_text(body) + prompt_text(body)
+            if method == "countTokens":
+                self.send_json(200, {"totalTokens": count_tokens(prompt)})
+                return
+
+            cached_tokens = count_tokens(cached_text) if cached_text else 0
+            latency, failure = config.draw(model, count_tokens(prompt) - cached_tokens)
+            time.sleep(latency)
+            if failure == 429:
+                with config.lock:
+                    config.counts["rate_limited"] += 1
+                self.send_json(429, {"error": {"code": 429, "message": "Resource exhausted",
+                                               "status": "RESOURCE_EXHAUSTED"}},
+                               {"Retry-After": str(config.retry_after)})
+                return
+            if failure == 503:
+                with config.lock:
+                    config.counts["errors"] += 1
+                self.send_error_json(503, "UNAVAILABLE", "The model is overloaded")
+                return
+
+            text = fake_response(prompt, config.lite_noise if is_lite(model) else 0.0)
+            prompt_tokens, output_tokens, thinking_tokens = count_tokens(prompt), count_tokens(text), thinking_budget(body)
+            self.send_json(200, {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+                "usageMetadata": {
+                    "promptTokenCount": prompt_tokens,
+                    "cachedContentTokenCount": cached_tokens,
+                    "candidatesTokenCount": output_tokens,
+                    "thoughtsTokenCount": thinking_tokens,
+                    "totalTokenCount": prompt_tokens + output_tokens + thinking_tokens,
+                },
+                "modelVersion": model,
+            })
+
+    return Handler
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections when many calls start at once
+    request_queue_size = 256
+
+
+def start_server(config: FakeGeminiConfig = None, host="127.0.0.1", port=0):
+    """Serve on a daemon thread. Returns (server, base_url); port 0 picks a free port."""
+    config = config or FakeGeminiConfig()
+    server = FakeGeminiServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, name="fake-gemini", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-median", type=float, default=0.8, help="median seconds per call")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal sigma of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls failing with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of calls failing with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--lite-noise", type=float, default=0.0, help="share of grades lite models get wrong")
+    parser.add_argument("--lite-speedup", type=float, default=3.0, help="how much faster lite models answer")
+    parser.add_argument("--prefill-per-1k", type=float, default=0.0,
+                        help="extra seconds per thousand uncached prompt tokens")
+    parser.add_argument("--no-cache-support", dest="cache_support", action="store_false",
+                        help="answer cachedContents requests with 404")
+
+
+def config_from_args(args) -> FakeGeminiConfig:
+    return FakeGeminiConfig(args.latency_median, args.latency_sigma, args.error_rate,
+                            args.rate_limit_rate, args.retry_after, args.seed, args.lite_noise, args.lite_speedup,
+                            args.prefill_per_1k, args.cache_support)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Gemini API server for offline benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server, url = start_server(config_from_args(args), args.host, args.port)
+    print(f"Fake Gemini listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,171 @@
+"""
+HTTP load test of the serving modes: the Flask development server
+(python endpoint.py) against gunicorn (gunicorn -c gunicorn.conf.py wsgi:app).
+
+Each mode is started as a subprocess on a free port with its caches and
+stores in a fresh temporary directory and google-genai pointed at an
+in-process benchmarks/fake_gemini.py. Once /ready answers, client threads
+send requests for --duration seconds in two phases:
+    cached  /score for papers already scored (cache hits, server overhead only)
+    cold    /score-by-text for papers never seen before (scored via fake Gemini)
+and one JSON line per mode and phase reports requests/sec and p50/p95
+latency.
+
+Usage (from the repository root):
+    python benchmarks/load_test.py --clients 16 --duration 20 --latency-median 0.5
+"""
+
+import argparse
+import itertools
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_DIR = os.path.join(ROOT, "src", "verifier")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_gemini
+from bench_scoring import percentile, serve_directory, synthetic_pages, write_pdf
+
+MODES = {
+    "dev": [sys.executable, "endpoint.py"],
+    "gunicorn": [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mode(mode: str, workdir: str, gemini_url: str, args) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = dict(os.environ, **{
+        "PORT": str(port),
+        "GOOGLE_GEMINI_BASE_URL": gemini_url,
+        "GEMINI_API_KEY": "fake",
+        "SCORE_CACHE_DIR": os.path.join(workdir, "gemini_cache"),
+        "PDF_STORE_DIR": os.path.join(workdir, "pdf_store"),
+        "EXTRACTION_STORE_DIR": os.path.join(workdir, "extraction_store"),
+        "JOBS_DB_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "GRADE_STORE_DIR": os.path.join(workdir, "grade_store"),
+        "VECTOR_INDEX_DIR": os.path.join(workdir, "vector_index"),
+        "WEB_CONCURRENCY": str(args.workers),
+        "GUNICORN_THREADS": str(args.threads),
+        "LOG_LEVEL": "WARNING",
+    })
+    process = subprocess.Popen(MODES[mode], cwd=SERVICE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{mode} server exited with {process.returncode}")
+        try:
+            if requests.get(f"{url}/ready", timeout=1).status_code == 200:
+                return process, url
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{mode} server never became ready")
+
+
+def stop_mode(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def run_phase(name: str, url: str, requests_iter, clients: int, duration: float) -> dict:
+    """Send requests from clients threads until duration runs out."""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        nonlocal errors
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            with lock:
+                path, body = next(requests_iter)
+            start = time.perf_counter()
+            try:
+                ok = session.post(f"{url}{path}", json=body, timeout=300).status_code == 200
+            except requests.RequestException:
+                ok = False
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                errors += not ok
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    return {
+        "phase": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": round(len(latencies) / seconds, 2),
+        "latency_p50": round(statistics.median(latencies), 3) if latencies else None,
+        "latency_p95": round(percentile(latencies, 95), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--modes", default="dev,gunicorn", help="comma-separated serving modes")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent client threads")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per phase")
+    parser.add_argument("--papers", type=int, default=8, help="papers in the cached phase")
+    parser.add_argument("--pages", type=int, default=6, help="pages per synthetic paper")
+    parser.add_argument("--workers", type=int, default=2, help="WEB_CONCURRENCY for gunicorn")
+    parser.add_argument("--threads", type=int, default=8, help="GUNICORN_THREADS for gunicorn")
+    fake_gemini.add_arguments(parser)
+    args = parser.parse_args()
+
+    _, gemini_url = fake_gemini.start_server(fake_gemini.config_from_args(args))
+    pdf_dir = tempfile.TemporaryDirectory()
+    for i in range(args.papers):
+        write_pdf(os.path.join(pdf_dir.name, f"paper_{i}.pdf"), synthetic_pages(i, args.pages))
+    pdf_base_url = serve_directory(pdf_dir.name)
+
+    for mode in args.modes.split(","):
+        with tempfile.TemporaryDirectory() as workdir:
+            process, url = start_mode(mode, workdir, gemini_url, args)
+            try:
+                papers = [{"paper_id": f"load-{i}", "pdf_url": f"{pdf_base_url}/paper_{i}.pdf"}
+                          for i in range(args.papers)]
+                for paper in papers:
+                    requests.post(f"{url}/score", json=paper, timeout=300).raise_for_status()
+
+                cached = itertools.cycle([("/score", paper) for paper in papers])
+                # Numbered past the cached papers so every cold request is a cache miss
+                cold = (("/score-by-text", {"paper_id": f"cold-{i}",
+                                            "paper_text": "\n".join(synthetic_pages(args.papers + i, args.pages))})
+                        for i in itertools.count())
+                for name, requests_iter in (("cached", cached), ("cold", cold)):
+                    report = run_phase(name, url, requests_iter, args.clients, args.duration)
+                    print(json.dumps({"mode": mode, "clients": args.clients, **report}), flush=True)
+            finally:
+                stop_mode(process)
+
+
+if __name__ == "__main__":
+    main()
@@ -63,7 +63,7 @@ export default {
 
       // Full pipeline orchestrator - coordinates everything
       if (path === '/api/analyze-full-pipeline' && method === 'POST') {
-        return await handleFullPipeline(request, env, corsHeaders);
+        return await handleFullPipeline(request, env, corsHeaders, ctx);
       }
 
       // Default response
@@ -550,9 +550,9 @@ async function handleAnalyze(request, env, corsHeaders) {
 }
 
 // Full pipeline orchestrator - combines all services
-async function handleFullPipeline(request, env, corsHeaders) {
+async function handleFullPipeline(request, env, corsHeaders, ctx) {
   try {
-    const { paper_id, paper_text, k = 5 } = await request.json();
+    const { paper_id, paper_text, k = 5, stream = false } = await request.json();
     
     if (!paper_id && !paper_text) {
       return new Response(JSON.stringify({ 
@@ -567,6 +567,7 @@ async function handleFullPipeline(request, env, corsHeaders) {
     
     // STEP 1: Extract paper text (if arXiv paper)
     let extractedText = paper_text;
+    let textHandle = null;
     
     if (paper_id && !paper_text) {
       console.log('Calling Flask to extract paper text...');
@@ -574,7 +575,8 @@ async function handleFullPipeline(request, env, corsHeaders) {
       const extractResponse = await fetch(`${env.FLASK_API_URL}/process-arxiv`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ paper_id })
+        // Only the excerpt is needed here; the full text stays in Flask's store
+        body: JSON.stringify({ paper_id, include_text: false })
       });
       
       if (!extractResponse.ok) {
@@ -589,7 +591,8 @@ async function handleFullPipeline(request, env, corsHeaders) {
       }
       
       const extractData = await extractResponse.json();
-      extractedText = extractData.text || '';
+      extractedText = extractData.excerpt || extractData.text || '';
+      textHandle = extractData.text_handle || null;
     }
     
     // Take first 400 words for embedding (token limit consideration)
@@ -620,78 +623,72 @@ async function handleFullPipeline(request, env, corsHeaders) {
     
     console.log(`Found ${similarPapers.length} similar papers`);
     
-    // STEP 3A: Score the uploaded paper
-    console.log('Scoring uploaded paper...');
-    let uploadedPaperScore = null;
+    const analyzedPaperId = paper_id || 'uploaded';
     
-    try {
-      const scoreResponse = await fetch(`${env.FLASK_API_URL}/score-by-text`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          paper_id: paper_id || 'uploaded',
-          paper_text: paperExcerpt
-        })
-      });
+    // With stream: true, papers are sent as NDJSON events as soon as each is
+    // scored, piped from Flask's /score-batch stream:
+    //   {"type": "start", "analyzed_paper_id": ..., "similar_papers_found": n}
+    //   {"type": "uploaded_paper", "paper": {...}}
+    //   {"type": "similar_paper", "paper": {...}}   one per scored neighbor
+    //   {"type": "done", "success": ..., "total_analyzed": ...}
+    if (stream) {
+      const { readable, writable } = new TransformStream();
+      const writer = writable.getWriter();
+      const encoder = new TextEncoder();
+      const send = event => writer.write(encoder.encode(JSON.stringify(event) + '\n'));
       
-      if (scoreResponse.ok) {
-        const scoreData = await scoreResponse.json();
-        const rubricDetails = scoreData.graded_rubric || {};
-        uploadedPaperScore = {
-          id: paper_id || 'uploaded',
-          title: 'Your Uploaded Paper',
-          authors: [],
-          similarity_score: 1.0, // Perfect similarity to itself
-          rubric_score: scoreData.graded_rubric_score || 0,
-          rubric_details: rubricDetails,
-          page_references: filterPageReferences(scoreData.page_references || {}, rubricDetails),
-          assessment: scoreData.graded_rubric?.Assessment || 'No assessment available',
-          is_uploaded_paper: true
-        };
-        console.log(`Uploaded paper scored: ${Math.round(uploadedPaperScore.rubric_score * 100)}%`);
-      } else {
-        console.warn('Failed to score uploaded paper');
+      const pipeline = (async () => {
+        let scoredCount = 0;
+        try {
+          await send({ type: 'start', analyzed_paper_id: analyzedPaperId, similar_papers_found: similarPapers.length });
+          
+          const uploadedPaperScore = await scoreUploadedPaper(env, paper_id, textHandle, paperExcerpt);
+          if (uploadedPaperScore) {
+            await send({ type: 'uploaded_paper', paper: formatUploadedPaper(uploadedPaperScore) });
+          }
+          
+          for await (const scoredPaper of scoreSimilarPapers(env, similarPapers)) {
+            scoredCount++;
+            await send({ type: 'similar_paper', paper: formatSimilarPaper(scoredPaper) });
+          }
+          
+          await send({
+            type: 'done',
+            success: scoredCount > 0,
+            error: scoredCount > 0 ? undefined : 'Failed to score any papers',
+            total_analyzed: scoredCount + (uploadedPaperScore ? 1 : 0),
+            timestamp: new Date().toISOString()
+          });
+        } catch (error) {
+          console.error('Full pipeline stream error:', error);
+          await send({ type: 'done', success: false, error: 'Pipeline failed', message: error.message });
+        } finally {
+          await writer.close();
+        }
+      })();
+      if (ctx) {
+        ctx.waitUntil(pipeline);
       }
-    } catch (error) {
-      console.error('Error scoring uploaded paper:', error.message);
+      
+      return new Response(readable, {
+        headers: { ...corsHeaders, 'Content-Type': 'application/x-ndjson' }
+      });
     }
     
-    // STEP 3B: Score each similar paper via Flask
+    // STEP 3A: Score the uploaded paper
+    console.log('Scoring uploaded paper...');
+    const uploadedPaperScore = await scoreUploadedPaper(env, paper_id, textHandle, paperExcerpt);
+    
+    // STEP 3B: Score all similar papers with one streamed /score-batch call.
+    // Flask answers cached papers first and streams the rest as they finish.
     console.log('Scoring similar papers with Gemini...');
-    const scoringPromises = similarPapers.map(async (paper) => {
-      try {
-        const scoreResponse = await fetch(`${env.FLASK_API_URL}/score`, {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({
-            paper_id: paper.id.replace('arxiv:', ''),
-            pdf_url: paper.pdf_url
-          })
-        });
-        
-        if (!scoreResponse.ok) {
-          console.warn(`Failed to score paper ${paper.id}: ${scoreResponse.status}`);
-          return null;
-        }
-        
-        const scoreData = await scoreResponse.json();
-        const rubricDetails = scoreData.graded_rubric || {};
-        
-        return {
-          ...paper,
-          rubric_score: scoreData.graded_rubric_score || 0,
-          rubric_details: rubricDetails,
-          page_references: filterPageReferences(scoreData.page_references || {}, rubricDetails),
-          assessment: scoreData.graded_rubric?.Assessment || 'No assessment available'
-        };
-      } catch (error) {
-        console.error(`Error scoring paper ${paper.id}:`, error.message);
-        return null;
-      }
-    });
+    const scoredPapers = [];
+    for await (const scoredPaper of scoreSimilarPapers(env, similarPapers)) {
+      scoredPapers.push(scoredPaper);
+    }
     
-    // Execute all scoring in parallel
-    const scoredPapers = (await Promise.all(scoringPromises)).filter(p => p !== null);
+    // Keep the similarity order of the search results
+    scoredPapers.sort((a, b) => b.similarity_score - a.similarity_score);
     
     if (scoredPapers.length === 0) {
       return new Response(JSON.stringify({ 
@@ -708,35 +705,9 @@ async function handleFullPipeline(request, env, corsHeaders) {
     // STEP 4: Return aggregated results
     return new Response(JSON.stringify({
       success: true,
-      analyzed_paper_id: paper_id || 'uploaded',
-      uploaded_paper: uploadedPaperScore ? {
-        id: uploadedPaperScore.id,
-        title: uploadedPaperScore.title,
-        authors: uploadedPaperScore.authors,
-        similarity_score: uploadedPaperScore.similarity_score,
-        reproducibility_score: Math.round(uploadedPaperScore.rubric_score * 100),
-        data_available: uploadedPaperScore.rubric_details?.['Data Download'] !== 'Not Present',
-        code_available: uploadedPaperScore.rubric_details?.['Link to Code'] !== 'Not Present',
-        rubric_breakdown: uploadedPaperScore.rubric_details,
-        page_references: uploadedPaperScore.page_references,
-        assessment: uploadedPaperScore.assessment,
-        is_uploaded_paper: true,
-        pdf_url: uploadedPaperScore.pdf_url || (uploadedPaperScore.id && uploadedPaperScore.id.startsWith && uploadedPaperScore.id.startsWith('arxiv:') ? `https://arxiv.org/pdf/${uploadedPaperScore.id.replace('arxiv:', '')}.pdf` : '')
-      } : null,
-      similar_papers: scoredPapers.map(p => ({
-        id: p.id,
-        title: p.title,
-        authors: p.authors,
-        similarity_score: p.similarity_score,
-        reproducibility_score: Math.round(p.rubric_score * 100), // Convert to 0-100
-        data_available: p.rubric_details?.['Data Download'] !== 'Not Present',
-        code_available: p.rubric_details?.['Link to Code'] !== 'Not Present',
-        rubric_breakdown: p.rubric_details,
-        page_references: p.page_references,
-        assessment: p.assessment,
-        abstract: p.abstract,
-        pdf_url: p.pdf_url
-      })),
+      analyzed_paper_id: analyzedPaperId,
+      uploaded_paper: uploadedPaperScore ? formatUploadedPaper(uploadedPaperScore) : null,
+      similar_papers: scoredPapers.map(formatSimilarPaper),
       total_analyzed: scoredPapers.length + (uploadedPaperScore ? 1 : 0),
       timestamp: new Date().toISOString()
     }), {
@@ -756,6 +727,153 @@ async function handleFullPipeline(request, env, corsHeaders) {
   }
 }
 
+// Helper function to score the analyzed paper itself, by text handle or excerpt
+async function scoreUploadedPaper(env, paper_id, textHandle, paperExcerpt) {
+  try {
+    const scoreResponse = await fetch(`${env.FLASK_API_URL}/score-by-text`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(textHandle ? {
+        paper_id: paper_id || 'uploaded',
+        text_handle: textHandle,
+        max_words: 400
+      } : {
+        paper_id: paper_id || 'uploaded',
+        paper_text: paperExcerpt
+      })
+    });
+    
+    if (!scoreResponse.ok) {
+      console.warn('Failed to score uploaded paper');
+      return null;
+    }
+    const scoreData = await scoreResponse.json();
+    const rubricDetails = scoreData.graded_rubric || {};
+    const uploadedPaperScore = {
+      id: paper_id || 'uploaded',
+      title: 'Your Uploaded Paper',
+      authors: [],
+      similarity_score: 1.0, // Perfect similarity to itself
+      rubric_score: scoreData.graded_rubric_score || 0,
+      rubric_details: rubricDetails,
+      page_references: filterPageReferences(scoreData.page_references || {}, rubricDetails),
+      assessment: scoreData.graded_rubric?.Assessment || 'No assessment available',
+      is_uploaded_paper: true
+    };
+    console.log(`Uploaded paper scored: ${Math.round(uploadedPaperScore.rubric_score * 100)}%`);
+    return uploadedPaperScore;
+  } catch (error) {
+    console.error('Error scoring uploaded paper:', error.message);
+    return null;
+  }
+}
+
+// Helper function to score similar papers with one streamed /score-batch call,
+// yielding each scored paper as soon as its NDJSON line arrives
+async function* scoreSimilarPapers(env, similarPapers) {
+  const papersById = new Map(similarPapers.map(paper => [paper.id.replace('arxiv:', ''), paper]));
+  
+  try {
+    const batchResponse = await fetch(`${env.FLASK_API_URL}/score-batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        papers: similarPapers.map(paper => ({
+          paper_id: paper.id.replace('arxiv:', ''),
+          pdf_url: paper.pdf_url
+        }))
+      })
+    });
+    
+    if (!batchResponse.ok) {
+      console.warn(`Failed to score similar papers: ${batchResponse.status}`);
+      return;
+    }
+    for await (const scoreData of readNdjson(batchResponse)) {
+      const paper = papersById.get(scoreData.paper_id);
+      if (!paper || scoreData.status !== 200) {
+        console.warn(`Failed to score paper ${scoreData.paper_id}: ${scoreData.error || scoreData.status}`);
+        continue;
+      }
+      
+      const rubricDetails = scoreData.graded_rubric || {};
+      yield {
+        ...paper,
+        rubric_score: scoreData.graded_rubric_score || 0,
+        rubric_details: rubricDetails,
+        page_references: filterPageReferences(scoreData.page_references || {}, rubricDetails),
+        assessment: scoreData.graded_rubric?.Assessment || 'No assessment available'
+      };
+    }
+  } catch (error) {
+    console.error('Error scoring similar papers:', error.message);
+  }
+}
+
+// Helper function to shape the analyzed paper for the response
+function formatUploadedPaper(uploadedPaperScore) {
+  return {
+    id: uploadedPaperScore.id,
+    title: uploadedPaperScore.title,
+    authors: uploadedPaperScore.authors,
+    similarity_score: uploadedPaperScore.similarity_score,
+    reproducibility_score: Math.round(uploadedPaperScore.rubric_score * 100),
+    data_available: uploadedPaperScore.rubric_details?.['Data Download'] !== 'Not Present',
+    code_available: uploadedPaperScore.rubric_details?.['Link to Code'] !== 'Not Present',
+    rubric_breakdown: uploadedPaperScore.rubric_details,
+    page_references: uploadedPaperScore.page_references,
+    assessment: uploadedPaperScore.assessment,
+    is_uploaded_paper: true,
+    pdf_url: uploadedPaperScore.pdf_url || (uploadedPaperScore.id && uploadedPaperScore.id.startsWith && uploadedPaperScore.id.startsWith('arxiv:') ? `https://arxiv.org/pdf/${uploadedPaperScore.id.replace('arxiv:', '')}.pdf` : '')
+  };
+}
+
+// Helper function to shape a scored similar paper for the response
+function formatSimilarPaper(p) {
+  return {
+    id: p.id,
+    title: p.title,
+    authors: p.authors,
+    similarity_score: p.similarity_score,
+    reproducibility_score: Math.round(p.rubric_score * 100), // Convert to 0-100
+    data_available: p.rubric_details?.['Data Download'] !== 'Not Present',
+    code_available: p.rubric_details?.['Link to Code'] !== 'Not Present',
+    rubric_breakdown: p.rubric_details,
+    page_references: p.page_references,
+    assessment: p.assessment,
+    abstract: p.abstract,
+    pdf_url: p.pdf_url
+  };
+}
+
+// Helper function to read an NDJSON response body one parsed object at a time
+async function* readNdjson(response) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  
+  while (true) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+    
+    let newline;
+    while ((newline = buffer.indexOf('\n')) >= 0) {
+      const line = buffer.slice(0, newline).trim();
+      buffer = buffer.slice(newline + 1);
+      if (line) {
+        yield JSON.parse(line);
+      }
+    }
+    
+    if (done) {
+      if (buffer.trim()) {
+        yield JSON.parse(buffer);
+      }
+      return;
+    }
+  }
+}
+
 // Helper function to filter page references for fields that are "Not Applicable"
 function filterPageReferences(pageReferences, rubricDetails) {
   if (!pageReferences || !rubricDetails) {
@@ -2,6 +2,34 @@ import React, { useState, useRef, useEffect } from 'react';
 import { Plus, X, FileText, Database, Link2, CheckCircle, Loader, Cpu, Code, Server, TrendingUp, BarChart, Sliders, Circle, Minus } from 'lucide-react';
 import './App.css';
 
+// Helper function to read an NDJSON response body one parsed object at a time
+async function* readNdjson(response) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  
+  while (true) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+    
+    let newline;
+    while ((newline = buffer.indexOf('\n')) >= 0) {
+      const line = buffer.slice(0, newline).trim();
+      buffer = buffer.slice(newline + 1);
+      if (line) {
+        yield JSON.parse(line);
+      }
+    }
+    
+    if (done) {
+      if (buffer.trim()) {
+        yield JSON.parse(buffer);
+      }
+      return;
+    }
+  }
+}
+
 // Helper function to parse arXiv URLs/IDs
 const parseArxivUrl = (input) => {
   const cleaned = input.trim();
@@ -560,6 +588,8 @@ const HexGrid = () => {
         // Step 1: Upload PDF to Flask for text extraction
         const formData = new FormData();
         formData.append('file', uploadedFile);
+        // Only the excerpt is needed; Flask extracts the full text in the background
+        formData.append('include_text', 'false');
         
         console.log('Sending PDF to:', `${FLASK_URL}/upload-pdf`);
         
@@ -583,13 +613,13 @@ const HexGrid = () => {
         
         uploadData = await uploadResponse.json();
         paperId = uploadData.paper_id;
-        paperText = uploadData.text;
+        paperText = uploadData.excerpt || uploadData.text;
         
-        console.log(`PDF uploaded successfully. Paper ID: ${paperId}, Text length: ${uploadData.text_length}`);
+        console.log(`PDF uploaded successfully. Paper ID: ${paperId}, Pages: ${uploadData.page_count}`);
         console.log('Upload data:', { title: uploadData.title, abstract: uploadData.abstract?.substring(0, 100) });
       }
       
-      // Call the orchestrator endpoint
+      // Call the orchestrator endpoint; scored papers stream in one at a time
       console.log('Calling Worker API at:', WORKER_URL);
       
       const response = await fetch(`${WORKER_URL}/api/analyze-full-pipeline`, {
@@ -600,7 +630,8 @@ const HexGrid = () => {
           paper_text: paperText, // Only set for PDF uploads
           paper_title: inputMode === 'upload' && uploadData ? uploadData.title : null,
           paper_abstract: inputMode === 'upload' && uploadData ? uploadData.abstract : null,
-          k: kValue
+          k: kValue,
+          stream: true
         })
       });
       
@@ -609,79 +640,85 @@ const HexGrid = () => {
         throw new Error(errorData.error || `HTTP ${response.status}: ${response.statusText}`);
       }
       
-      const data = await response.json();
-      
-      if (!data.success) {
-        throw new Error(data.error || 'Analysis failed');
-      }
-      
-      console.log(`Received ${data.similar_papers.length} similar papers${data.uploaded_paper ? ' + uploaded paper' : ''}`);
-      
-      // Calculate total hexagons needed (similar papers + uploaded paper if exists)
-      const totalPapers = data.similar_papers.length + (data.uploaded_paper ? 1 : 0);
-      
-      // Select scattered hexagons across the grid, excluding already-used ones
-      const nearby = scatterHexagons(visibleHexagons, Math.min(totalPapers, 12), activeHexagons);
-      
-      // Animate hexagons turning on
-      for (let i = 0; i < nearby.length; i++) {
-        await new Promise(resolve => setTimeout(resolve, 150));
-        setActiveHexagons(prev => [...prev, nearby[i]]);
-      }
-      
       // Get current query ID and increment for next query
       const currentQueryId = queryIdCounter;
       setQueryIdCounter(prev => prev + 1);
       
-      // Map similar papers to paper format
-      const mappedSimilarPapers = data.similar_papers.map((paper, idx) => ({
-        id: paper.id,
-        title: paper.title,
-        score: paper.reproducibility_score, // Already 0-100
-        dataAvailable: paper.data_available,
-        codeAvailable: paper.code_available,
-        replications: Math.round(paper.similarity_score * 100), // Convert similarity to percentage
-        rubricBreakdown: paper.rubric_breakdown,
-        pageReferences: paper.page_references || {},
-        assessment: paper.assessment,
-        isUploadedPaper: false,
-        queryId: currentQueryId,
-        hex: nearby[idx],
-        pdfUrl: paper.pdf_url || `https://arxiv.org/pdf/${paper.id.replace('arxiv:', '')}.pdf`
-      }));
+      let nearby = [];
+      const mappedPapers = [];
+      let done = null;
       
-      // Add uploaded paper if it exists
-      const allPapers = [...mappedSimilarPapers];
-      if (data.uploaded_paper) {
-        const customName = paperName.trim() || 'Your Uploaded Paper';
-        const uploadedPaperObj = {
-          id: data.uploaded_paper.id,
-          title: customName, // Use custom name as the title
-          originalTitle: data.uploaded_paper.title, // Store original title
-          score: data.uploaded_paper.reproducibility_score,
-          dataAvailable: data.uploaded_paper.data_available,
-          codeAvailable: data.uploaded_paper.code_available,
-          replications: Math.round(data.uploaded_paper.similarity_score * 100),
-          rubricBreakdown: data.uploaded_paper.rubric_breakdown,
-          pageReferences: data.uploaded_paper.page_references || {},
-          assessment: data.uploaded_paper.assessment,
-          isUploadedPaper: true,
-          queryId: currentQueryId,
-          paperName: customName, // Also store in paperName for label
-          hex: nearby[mappedSimilarPapers.length], // Assign to the next available hexagon
-          pdfUrl: data.uploaded_paper.pdf_url || (data.uploaded_paper.id.startsWith('arxiv:') ? `https://arxiv.org/pdf/${data.uploaded_paper.id.replace('arxiv:', '')}.pdf` : '#')
-        };
-        allPapers.push(uploadedPaperObj);
-        console.log(`Uploaded paper score: ${uploadedPaperObj.score}%`);
+      for await (const event of readNdjson(response)) {
+        if (event.type === 'start') {
+          // Similar papers plus the analyzed paper itself
+          const totalPapers = event.similar_papers_found + 1;
+          
+          // Select scattered hexagons across the grid, excluding already-used ones
+          nearby = scatterHexagons(visibleHexagons, Math.min(totalPapers, 12), activeHexagons);
+          console.log(`Scoring ${event.similar_papers_found} similar papers + analyzed paper`);
+        } else if (event.type === 'similar_paper' || event.type === 'uploaded_paper') {
+          const paper = event.paper;
+          const hex = nearby[mappedPapers.length];
+          let mappedPaper;
+          
+          if (event.type === 'similar_paper') {
+            mappedPaper = {
+              id: paper.id,
+              title: paper.title,
+              score: paper.reproducibility_score, // Already 0-100
+              dataAvailable: paper.data_available,
+              codeAvailable: paper.code_available,
+              replications: Math.round(paper.similarity_score * 100), // Convert similarity to percentage
+              rubricBreakdown: paper.rubric_breakdown,
+              pageReferences: paper.page_references || {},
+              assessment: paper.assessment,
+              isUploadedPaper: false,
+              queryId: currentQueryId,
+              hex,
+              pdfUrl: paper.pdf_url || `https://arxiv.org/pdf/${paper.id.replace('arxiv:', '')}.pdf`
+            };
+          } else {
+            const customName = paperName.trim() || 'Your Uploaded Paper';
+            mappedPaper = {
+              id: paper.id,
+              title: customName, // Use custom name as the title
+              originalTitle: paper.title, // Store original title
+              score: paper.reproducibility_score,
+              dataAvailable: paper.data_available,
+              codeAvailable: paper.code_available,
+              replications: Math.round(paper.similarity_score * 100),
+              rubricBreakdown: paper.rubric_breakdown,
+              pageReferences: paper.page_references || {},
+              assessment: paper.assessment,
+              isUploadedPaper: true,
+              queryId: currentQueryId,
+              paperName: customName, // Also store in paperName for label
+              hex,
+              pdfUrl: paper.pdf_url || (paper.id.startsWith('arxiv:') ? `https://arxiv.org/pdf/${paper.id.replace('arxiv:', '')}.pdf` : '#')
+            };
+            console.log(`Uploaded paper score: ${mappedPaper.score}%`);
+          }
+          mappedPapers.push(mappedPaper);
+          
+          // Turn the paper's hexagon on and show its card as soon as it is scored
+          if (hex) {
+            setActiveHexagons(prev => [...prev, hex]);
+            setConnections(prev => [...prev, hex]);
+          }
+          setPapers(prev => [...prev, mappedPaper]);
+          setShowCards(true);
+          setIsFadingOut(false);
+          setLoading(false);
+        } else if (event.type === 'done') {
+          done = event;
+        }
       }
       
-      const mappedPapers = allPapers;
+      if (!done || !done.success) {
+        throw new Error(done?.error || 'Analysis failed');
+      }
       
-      // Append new papers and connections to existing ones
-      setPapers(prev => [...prev, ...mappedPapers]);
-      setConnections(prev => [...prev, ...nearby]);
-      setShowCards(true); // Show cards initially
-      setIsFadingOut(false); // Reset fade-out state
+      console.log(`Received ${mappedPapers.length} scored papers`);
       setLoading(false);
       
       // Clear the paper name for next query
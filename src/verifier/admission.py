@@ -0,0 +1,209 @@
+"""
+Admission control for paper scoring.
+
+Cold papers compete for the same Gemini quota whether they are a user's
+own paper, the neighbors shown next to it or corpus pre-scoring, and a
+burst can queue more work than finishes before the caller gives up. The
+AdmissionController sits in front of score_pages_concurrently(): at most
+ADMISSION_SLOTS papers are scored at once per worker process, and waiting
+papers are queued per priority class,
+
+    interactive   the paper a user asked about (/score, /score-by-text)
+    neighbor      papers shown next to it (/score-batch, /neighbors jobs)
+    bulk          corpus pre-scoring (bulk_score.py)
+
+and served strictly in that order, FIFO within a class. Each class queue is
+bounded. Callers pass a deadline; one whose estimated wait already exceeds
+it is turned away with Overloaded right away instead of being queued, and a
+queued caller whose deadline passes is dropped before any of its pages are
+sent. The wait is estimated from the papers queued ahead and a moving
+average of how long a paper holds its slot.
+
+Each class also maps to an engine priority, so the Gemini calls of papers
+already being scored are ordered the same way (see engine.PrioritySemaphore).
+Each gunicorn worker process has its own controller.
+"""
+
+import collections
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from constants import ADMISSION_DEADLINES, ADMISSION_INITIAL_SECONDS, ADMISSION_QUEUE_LIMITS, ADMISSION_SLOTS
+from engine import PRIORITY_BACKGROUND, PRIORITY_NEIGHBOR, PRIORITY_NORMAL
+from log import get_logger
+from metrics import ADMISSION_DECISIONS, ADMISSION_QUEUED, ADMISSION_WAIT_SECONDS, timed
+
+logger = get_logger(__name__)
+
+CLASSES = ("interactive", "neighbor", "bulk")
+ENGINE_PRIORITY = {"interactive": PRIORITY_NORMAL, "neighbor": PRIORITY_NEIGHBOR, "bulk": PRIORITY_BACKGROUND}
+
+
+class Overloaded(Exception):
+    """A scoring request turned away; status is 429 or 503, retry_after in seconds."""
+
+    def __init__(self, status: int, reason: str, priority_class: str, retry_after: float):
+        super().__init__(f"{priority_class} scoring {reason.replace('_', ' ')}")
+        self.status = status
+        self.reason = reason
+        self.priority_class = priority_class
+        self.retry_after = max(1, math.ceil(retry_after))
+
+    def as_dict(self) -> dict:
+        return {"error": "Server overloaded, retry later", "reason": self.reason,
+                "priority": self.priority_class, "retry_after": self.retry_after}
+
+
+def deadline_for(priority_class: str, seconds=None) -> Optional[float]:
+    """Monotonic deadline from a caller's seconds, or the class default; None waits indefinitely."""
+    if seconds is None:
+        seconds = ADMISSION_DEADLINES.get(priority_class)
+    return None if seconds is None else time.monotonic() + float(seconds)
+
+
+class _Waiter:
+    def __init__(self, deadline: Optional[float]):
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+        self.dropped = False
+
+
+class AdmissionController:
+    def __init__(self, slots=ADMISSION_SLOTS, queue_limits=ADMISSION_QUEUE_LIMITS,
+                 initial_seconds=ADMISSION_INITIAL_SECONDS, smoothing=0.2):
+        """
+        Args:
+            slots: papers scored at once
+            queue_limits: class -> most papers waiting in that class
+            initial_seconds: assumed seconds per paper until one has been timed
+            smoothing: weight of the newest sample in the moving average
+        """
+        self.slots = slots
+        self.queue_limits = queue_limits
+        self.smoothing = smoothing
+        self.service_seconds = initial_seconds
+        self.free = slots
+        self.queues = {priority_class: collections.deque() for priority_class in CLASSES}
+        self._cond = threading.Condition()
+
+    def _ahead(self, priority_class: str) -> int:
+        """Papers served before a new arrival of priority_class."""
+        rank = CLASSES.index(priority_class)
+        return sum(len(self.queues[c]) for c in CLASSES[:rank + 1])
+
+    def _estimate(self, ahead: int) -> float:
+        if self.free > ahead:
+            return 0.0
+        return (ahead - self.free + 1) * self.service_seconds / self.slots
+
+    def estimated_wait(self, priority_class: str) -> float:
+        """Seconds a paper of priority_class arriving now would wait for a slot."""
+        with self._cond:
+            return self._estimate(self._ahead(priority_class))
+
+    def _reject(self, priority_class: str, deadline: Optional[float]):
+        """Raise Overloaded if a new paper of priority_class should not be queued."""
+        estimate = self._estimate(self._ahead(priority_class))
+        if len(self.queues[priority_class]) >= self.queue_limits.get(priority_class, 0):
+            ADMISSION_DECISIONS.inc(priority=priority_class, outcome="queue_full")
+            raise Overloaded(429, "queue_full", priority_class, estimate)
+        if deadline is not None and estimate > deadline - time.monotonic():
+            ADMISSION_DECISIONS.inc(priority=priority_class, outcome="over_deadline")
+            raise Overloaded(503, "over_deadline", priority_class, estimate)
+
+    def check(self, priority_class: str, deadline: Optional[float] = None):
+        """
+        Fail fast, before downloading or extracting a paper that would be
+        turned away at slot() anyway.
+        """
+        with self._cond:
+            self._reject(priority_class, deadline)
+
+    def _next(self) -> Optional[_Waiter]:
+        """The waiter due for the next free slot, dropping those past their deadline."""
+        now = time.monotonic()
+        for priority_class in CLASSES:
+            queue = self.queues[priority_class]
+            while queue and queue[0].deadline is not None and queue[0].deadline <= now:
+                self._remove(priority_class, queue[0])
+            if queue:
+                return queue[0]
+        return None
+
+    def _remove(self, priority_class: str, waiter: _Waiter):
+        self.queues[priority_class].remove(waiter)
+        ADMISSION_QUEUED.dec(priority=priority_class)
+        if waiter.deadline is not None and waiter.deadline <= time.monotonic():
+            waiter.dropped = True
+
+    def _acquire(self, priority_class: str, deadline: Optional[float]) -> float:
+        with self._cond:
+            if self.free > 0 and self._next() is None:
+                self.free -= 1
+                ADMISSION_DECISIONS.inc(priority=priority_class, outcome="admitted")
+                ADMISSION_WAIT_SECONDS.observe(0.0, priority=priority_class)
+                return 0.0
+
+            self._reject(priority_class, deadline)
+            waiter = _Waiter(deadline)
+            self.queues[priority_class].append(waiter)
+            ADMISSION_QUEUED.inc(priority=priority_class)
+            while not (self.free > 0 and self._next() is waiter):
+                if waiter.dropped or (deadline is not None and deadline <= time.monotonic()):
+                    if not waiter.dropped:
+                        self._remove(priority_class, waiter)
+                    # A slot freed while this waiter was at the head goes to the next one
+                    self._cond.notify_all()
+                    waited = time.monotonic() - waiter.enqueued
+                    ADMISSION_DECISIONS.inc(priority=priority_class, outcome="dropped")
+                    ADMISSION_WAIT_SECONDS.observe(waited, priority=priority_class)
+                    logger.info(f"Dropped {priority_class} paper after {waited:.1f}s in queue, deadline passed")
+                    raise Overloaded(503, "deadline_passed", priority_class,
+                                     self._estimate(self._ahead(priority_class)))
+                self._cond.wait(None if deadline is None else deadline - time.monotonic())
+
+            self._remove(priority_class, waiter)
+            self.free -= 1
+            # More slots may be free for the waiters behind
+            self._cond.notify_all()
+            waited = time.monotonic() - waiter.enqueued
+            ADMISSION_DECISIONS.inc(priority=priority_class, outcome="admitted")
+            ADMISSION_WAIT_SECONDS.observe(waited, priority=priority_class)
+            return waited
+
+    def _release(self, seconds: float):
+        with self._cond:
+            self.free += 1
+            self.service_seconds += self.smoothing * (seconds - self.service_seconds)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority_class: str, deadline: Optional[float] = None):
+        """
+        Hold one scoring slot for the enclosed block, waiting behind papers of
+        the same or a higher class. Raises Overloaded if the class queue is
+        full, the estimated wait exceeds deadline, or deadline passes while
+        queued.
+        """
+        with timed("admission"):
+            self._acquire(priority_class, deadline)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "slots": self.slots,
+                "free_slots": self.free,
+                "seconds_per_paper": round(self.service_seconds, 3),
+                "queued": {priority_class: len(queue) for priority_class, queue in self.queues.items()},
+                "queue_limits": dict(self.queue_limits),
+                "estimated_wait": {priority_class: round(self._estimate(self._ahead(priority_class)), 3)
+                                   for priority_class in CLASSES},
+            }
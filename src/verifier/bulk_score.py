@@ -0,0 +1,218 @@
+"""
+Offline pre-scoring of a paper corpus into the score cache.
+
+Neighbors returned by Vectorize come from the corpus pushed through
+/api/upsert, so scoring that corpus ahead of time keeps /score and
+/score-batch answering from cache. Papers are read from a JSONL file (one
+/api/upsert-style object per line) or a CSV file with a header; each record
+needs an id ("paper_id", "arxiv_id" or "id", an "arxiv:" prefix is dropped)
+and optionally a "pdf_url" (arxiv.org/pdf/<id>.pdf otherwise) and
+"categories", which are recorded in the grade store for /rank.
+
+Papers already in the cache are skipped (their grades are added to the
+grade store if missing there). The rest are scored through the
+same score_pdf() path and cache keys as the service, as jobs of a JobQueue
+in a checkpoint database of their own: an interrupted run picks up where it
+stopped, down to the pages already scored. Papers are admitted as the bulk
+priority class (see admission.py), --concurrency at a time. Gemini calls
+go through the process-wide engine, whose rate limits are set from
+--requests-per-second and --tokens-per-minute divided by the shard count,
+so all shards together stay within the account quota. With --shard i/n
+only papers whose id hashes to shard i are scored, so n machines can split
+a corpus without coordination.
+
+Usage (from src/verifier):
+    python bulk_score.py corpus.jsonl --concurrency 8 --requests-per-second 10
+    python bulk_score.py corpus.csv --shard 0/4 --checkpoint shard0.sqlite3
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+
+ARXIV_PDF_URL = "https://arxiv.org/pdf/{}.pdf"
+
+
+def read_corpus(path: str) -> list[tuple[str, str, list]]:
+    """(paper_id, pdf_url, categories) from a JSONL or CSV listing, in file order."""
+    with open(path, newline="") as f:
+        if path.endswith((".jsonl", ".json", ".ndjson")):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            records = list(csv.DictReader(f))
+
+    papers, seen = [], set()
+    for record in records:
+        paper_id = record.get("paper_id") or record.get("arxiv_id") or record.get("id")
+        if not paper_id:
+            continue
+        paper_id = paper_id.strip().removeprefix("arxiv:")
+        if paper_id in seen:
+            continue
+        seen.add(paper_id)
+        categories = record.get("categories") or []
+        if isinstance(categories, str):
+            # CSV: space-separated like arXiv metadata, primary first
+            categories = categories.split()
+        papers.append((paper_id, record.get("pdf_url") or ARXIV_PDF_URL.format(paper_id), categories))
+    return papers
+
+
+def in_shard(paper_id: str, shard: int, shards: int) -> bool:
+    digest = hashlib.sha256(paper_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shards == shard
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    shard, _, shards = value.partition("/")
+    shard, shards = int(shard), int(shards or 1)
+    if not 0 <= shard < shards:
+        raise argparse.ArgumentTypeError(f"shard must be i/n with 0 <= i < n, got {value}")
+    return shard, shards
+
+
+class Progress:
+    """Thread-safe counters for the progress lines and the final summary."""
+
+    def __init__(self, total: int, skipped: int):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.partial = 0
+        self.failed = 0
+        self.pages = 0
+        self.tokens = 0
+
+    @property
+    def finished(self) -> int:
+        return self.done + self.partial + self.failed
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def report(self) -> dict:
+        with self.lock:
+            seconds = time.monotonic() - self.started
+            papers_per_sec = self.finished / seconds if seconds else 0.0
+            remaining = self.total - self.finished
+            return {
+                "queued": self.total,
+                "skipped_cached": self.skipped,
+                "done": self.done,
+                "partial": self.partial,
+                "failed": self.failed,
+                "pages_scored": self.pages,
+                "tokens": self.tokens,
+                "seconds": round(seconds, 1),
+                "papers_per_sec": round(papers_per_sec, 3),
+                "pages_per_sec": round(self.pages / seconds, 2) if seconds else 0.0,
+                "eta_seconds": round(remaining / papers_per_sec) if papers_per_sec else None,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("corpus", help="JSONL or CSV listing of papers")
+    parser.add_argument("--shard", type=parse_shard, default=(0, 1), help="i/n: score only shard i of n")
+    parser.add_argument("--concurrency", type=int, default=8, help="papers scored at once")
+    parser.add_argument("--requests-per-second", type=float, help="Gemini request rate across all shards")
+    parser.add_argument("--tokens-per-minute", type=float, help="Gemini token rate across all shards")
+    parser.add_argument("--checkpoint", help="checkpoint database (default: bulk_score.<i>-of-<n>.sqlite3)")
+    parser.add_argument("--limit", type=int, help="score at most this many uncached papers")
+    parser.add_argument("--progress-interval", type=float, default=10, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    shard, shards = args.shard
+    # Must be set before the service modules read their configuration
+    os.environ["ADMISSION_SLOTS"] = str(args.concurrency)
+    if args.requests_per_second:
+        os.environ["GEMINI_REQUESTS_PER_SECOND"] = str(args.requests_per_second / shards)
+    if args.tokens_per_minute:
+        os.environ["GEMINI_TOKENS_PER_MINUTE"] = str(args.tokens_per_minute / shards)
+
+    from endpoint import PDF_SCORING_MODE, cache, flight, grade_store, record_grades, run_scoring_job
+    from engine import preload
+    from jobs import ACTIVE, JobQueue
+    from admission import CLASSES
+    preload()
+
+    papers = [paper for paper in read_corpus(args.corpus) if in_shard(paper[0], shard, shards)]
+    categories = {paper_id: paper_categories for paper_id, _, paper_categories in papers}
+    pending = []
+    for paper_id, pdf_url, _ in papers:
+        cache_key = cache.key(paper_id, PDF_SCORING_MODE)
+        if cache_key not in cache:
+            pending.append((paper_id, pdf_url))
+        elif paper_id not in grade_store:
+            record_grades(paper_id, cache.get(cache_key), categories[paper_id])
+    if args.limit is not None:
+        pending = pending[:args.limit]
+    progress = Progress(len(pending), len(papers) - len(pending))
+    print(json.dumps({"corpus": args.corpus, "shard": f"{shard}/{shards}", "papers": len(papers),
+                      "cached": progress.skipped, "to_score": len(pending)}), flush=True)
+    if not pending:
+        return
+
+    job_ids = set()
+
+    def handle(job, done, save_page):
+        if job["id"] not in job_ids:
+            # Left queued by an earlier run for a paper cached since
+            return run_scoring_job(job, done, save_page)
+
+        def checkpoint(page, result):
+            progress.add(pages=1)
+            save_page(page, result)
+
+        # Failed jobs are counted from the queue, which also fails jobs
+        # claimed too many times without calling the handler
+        result = run_scoring_job(job, done, checkpoint, categories.get(job["paper_id"]))
+        if result is None:
+            return None
+        if result.get('failed_pages'):
+            # Not cached; the next run rescores only the failed pages
+            progress.add(partial=1, tokens=result['usage']['total_tokens'])
+        else:
+            progress.add(done=1, tokens=result['usage']['total_tokens'])
+        return result
+
+    queue = JobQueue(handle, path=args.checkpoint or f"bulk_score.{shard}-of-{shards}.sqlite3")
+    if recovered := queue.recover():
+        # Interrupted jobs of an earlier run; its leases would block them until they expire
+        for cache_key in recovered:
+            flight.release(cache_key)
+        print(json.dumps({"resumed_jobs": len(recovered)}), flush=True)
+    for paper_id, pdf_url in pending:
+        job_ids.add(queue.enqueue(paper_id, pdf_url, cache.key(paper_id, PDF_SCORING_MODE), CLASSES.index("bulk")))
+    queue.start(workers=args.concurrency)
+
+    def finished() -> bool:
+        statuses = queue.statuses(job_ids)
+        with progress.lock:
+            progress.failed = statuses.get("failed", 0)
+        return not any(statuses.get(status) for status in ACTIVE)
+
+    next_report = time.monotonic() + args.progress_interval
+    try:
+        while not finished():
+            time.sleep(1)
+            if time.monotonic() >= next_report:
+                print(json.dumps(progress.report()), flush=True)
+                next_report += args.progress_interval
+    except KeyboardInterrupt:
+        print(json.dumps({"interrupted": True} | progress.report()), flush=True)
+        raise SystemExit(130)
+    queue.stop()
+    print(json.dumps({"finished": True} | progress.report()), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,162 @@
+import json
 import os
 
 VERIXIV_ROOT = os.getenv("VERIXIV_ROOT")
 DATA_ROOT = f"{VERIXIV_ROOT}/data"
-MODEL_NAME = "gemini-2.5-flash"
\ No newline at end of file
+MODEL_NAME = "gemini-2.5-flash"
+GEMINI_THINKING_BUDGET = int(os.getenv("GEMINI_THINKING_BUDGET", 2000))
+
+# Multi-page batching for score_pages_concurrently: pages are packed into a
+# single request until their estimated token count reaches the budget.
+PAGE_BATCHING = os.getenv("PAGE_BATCHING", "1") == "1"
+PAGE_BATCH_TOKEN_BUDGET = int(os.getenv("PAGE_BATCH_TOKEN_BUDGET", 12000))
+PAGE_BATCH_MAX_PAGES = int(os.getenv("PAGE_BATCH_MAX_PAGES", 8))
+
+# Scoring result cache shared by all worker processes.
+SCORE_CACHE_DIR = os.getenv("SCORE_CACHE_DIR", "./gemini_cache")
+SCORE_CACHE_HOT_SIZE = int(os.getenv("SCORE_CACHE_HOT_SIZE", 256))
+
+# Process-wide limits on Gemini calls (see engine.py); the rates apply to
+# each model separately, like Gemini quotas. Each gunicorn worker process
+# has its own engine, so divide the account quota between them.
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 16))
+GEMINI_REQUESTS_PER_SECOND = float(os.getenv("GEMINI_REQUESTS_PER_SECOND", 15))
+GEMINI_TOKENS_PER_MINUTE = float(os.getenv("GEMINI_TOKENS_PER_MINUTE", 900000))
+
+# PDF downloads (see fetch.py).
+PDF_STORE_DIR = os.getenv("PDF_STORE_DIR", "./pdf_store")
+PDF_STORE_MAX_BYTES = int(os.getenv("PDF_STORE_MAX_BYTES", 2 * 1024**3))
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", 100 * 1024**2))
+PDF_FETCH_TIMEOUT = float(os.getenv("PDF_FETCH_TIMEOUT", 30))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 16))
+
+# Extracted per-page text shared by /process-arxiv, /upload-pdf and /score.
+EXTRACTION_STORE_DIR = os.getenv("EXTRACTION_STORE_DIR", "./extraction_store")
+EXTRACTION_STORE_MAX_BYTES = int(os.getenv("EXTRACTION_STORE_MAX_BYTES", 2 * 1024**3))
+
+# Parallel PDF text extraction (see extraction.py).
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", min(4, os.cpu_count() or 1)))
+EXTRACTION_MIN_PARALLEL_PAGES = int(os.getenv("EXTRACTION_MIN_PARALLEL_PAGES", 32))
+EXTRACTION_MAX_PAGES = int(os.getenv("EXTRACTION_MAX_PAGES", 500))
+EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", 60))
+
+# Streamed PDF uploads (see uploads.py). Title, abstract and excerpt come
+# from the first UPLOAD_FRONT_PAGES pages; the full text is extracted in the
+# background by UPLOAD_EXTRACTION_WORKERS threads per worker process.
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", PDF_MAX_BYTES))
+UPLOAD_FRONT_PAGES = int(os.getenv("UPLOAD_FRONT_PAGES", 2))
+UPLOAD_EXTRACTION_WORKERS = int(os.getenv("UPLOAD_EXTRACTION_WORKERS", 2))
+
+# /score-batch limits.
+SCORE_BATCH_MAX_PAPERS = int(os.getenv("SCORE_BATCH_MAX_PAPERS", 32))
+SCORE_BATCH_WORKERS = int(os.getenv("SCORE_BATCH_WORKERS", 8))
+
+# Persistent scoring job queue (see jobs.py). With SCORE_ASYNC_DEFAULT=1 a
+# cold /score is queued unless the request sets "async": false.
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "./jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 120))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+SCORE_ASYNC_DEFAULT = os.getenv("SCORE_ASYNC_DEFAULT", "0") == "1"
+
+# Page relevance pre-filter (see prefilter.py).
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "1") == "1"
+PREFILTER_MIN_CHARS = int(os.getenv("PREFILTER_MIN_CHARS", 200))
+PREFILTER_MIN_FIELDS = int(os.getenv("PREFILTER_MIN_FIELDS", 2))
+PREFILTER_REFERENCE_RATIO = float(os.getenv("PREFILTER_REFERENCE_RATIO", 0.3))
+PREFILTER_TABLE_DENSITY = float(os.getenv("PREFILTER_TABLE_DENSITY", 0.3))
+
+# Rule-based pre-scoring of fields provable from text (see prescore.py).
+PRESCORE_ENABLED = os.getenv("PRESCORE_ENABLED", "1") == "1"
+
+# Stop scoring pages once every field is Complete or Not Applicable on some
+# page; optionally keep scoring the rest at background priority so page
+# references stay complete.
+SCORE_EARLY_STOP = os.getenv("SCORE_EARLY_STOP", "1") == "1"
+SCORE_COLLECT_REFERENCES = os.getenv("SCORE_COLLECT_REFERENCES", "0") == "1"
+
+# Tail-latency control for Gemini calls (see engine.py): a deadline per
+# attempt, jittered retries of transient errors within an overall deadline,
+# and a hedged duplicate for calls slower than the given latency percentile.
+GEMINI_CALL_TIMEOUT = float(os.getenv("GEMINI_CALL_TIMEOUT", 90))
+GEMINI_MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", 4))
+GEMINI_RETRY_DEADLINE = float(os.getenv("GEMINI_RETRY_DEADLINE", 240))
+GEMINI_RETRY_MAX_WAIT = float(os.getenv("GEMINI_RETRY_MAX_WAIT", 20))
+GEMINI_HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", 95))
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", 20))
+GEMINI_HEDGE_MAX_RATIO = float(os.getenv("GEMINI_HEDGE_MAX_RATIO", 0.1))
+
+# Static scoring instructions (see prompt_cache.py): "explicit" registers
+# them as Gemini cached content once used PROMPT_CACHE_MIN_USES times,
+# "system" sends them as a system instruction with every call, "off"
+# prepends them to the page text. Explicit caching falls back to "system"
+# whenever a cache is unavailable.
+PROMPT_CACHE_MODE = os.getenv("PROMPT_CACHE_MODE", "explicit")
+PROMPT_CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", 3600))
+PROMPT_CACHE_REFRESH_MARGIN = float(os.getenv("PROMPT_CACHE_REFRESH_MARGIN", 300))
+PROMPT_CACHE_MIN_USES = int(os.getenv("PROMPT_CACHE_MIN_USES", 3))
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", 1024))
+PROMPT_CACHE_RETRY_SECONDS = float(os.getenv("PROMPT_CACHE_RETRY_SECONDS", 600))
+
+# Single page results, keyed by page text, are kept this long (see
+# score_cache.py). New arXiv versions, re-uploads and retries after partly
+# failed scoring only rescore the pages that are not cached.
+SCORE_PAGE_CACHE_TTL = float(os.getenv("SCORE_PAGE_CACHE_TTL", 30 * 24 * 3600))
+
+# Logging goes through a queue drained by a background thread (see log.py).
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Production serving with gunicorn (see gunicorn.conf.py). Gemini limits
+# above are per worker process.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 2))
+GUNICORN_THREADS = int(os.getenv("GUNICORN_THREADS", 8))
+GUNICORN_TIMEOUT = int(os.getenv("GUNICORN_TIMEOUT", 300))
+GUNICORN_GRACEFUL_TIMEOUT = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 120))
+
+# Columnar store of final grades for cohort statistics (see grade_store.py).
+GRADE_STORE_DIR = os.getenv("GRADE_STORE_DIR", "./grade_store")
+
+# Local nearest-neighbor index over paper embeddings (see vector_index.py).
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "./vector_index")
+VECTOR_INDEX_BLOCK_ROWS = int(os.getenv("VECTOR_INDEX_BLOCK_ROWS", 65536))
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", 16))
+NEIGHBORS_MAX_K = int(os.getenv("NEIGHBORS_MAX_K", 50))
+
+# Model cascade for PDF page scoring (see score.py). With SCORE_CASCADE=1
+# every page is scored by the first tier, and only pages whose results match
+# one of that tier's escalate_on rules are rescored by the next:
+#     invalid     RubricValidator rejected the page result
+#     ambiguous   the page holds a field's best grade and that grade is Partial
+#     decisive    at most CASCADE_DECISIVE_MAX_PAGES pages hold a field's best
+#                 grade, so the final grade rests on them
+# Prices are USD per million tokens (thinking tokens bill as output, cached
+# prompt tokens at cached_price) and
+# only feed the per-tier cost report. MODEL_TIERS takes a JSON list of the
+# same shape.
+SCORE_CASCADE = os.getenv("SCORE_CASCADE", "0") == "1"
+CASCADE_DECISIVE_MAX_PAGES = int(os.getenv("CASCADE_DECISIVE_MAX_PAGES", 1))
+MODEL_TIERS = json.loads(os.getenv("MODEL_TIERS", "null")) or [
+    {"name": "fast", "model": os.getenv("CASCADE_FAST_MODEL", "gemini-2.5-flash-lite"),
+     "thinking_budget": int(os.getenv("CASCADE_FAST_THINKING_BUDGET", 0)),
+     "input_price": 0.10, "cached_price": 0.01, "output_price": 0.40,
+     "escalate_on": ["invalid", "ambiguous", "decisive"]},
+    {"name": "strong", "model": MODEL_NAME, "thinking_budget": GEMINI_THINKING_BUDGET,
+     "input_price": 0.30, "cached_price": 0.03, "output_price": 2.50},
+]
+
+# Admission control in front of paper scoring (see admission.py). At most
+# ADMISSION_SLOTS papers are scored at once per worker process; waiting
+# papers are served interactive, then neighbor, then bulk, and each class
+# queue holds at most its ADMISSION_QUEUE_LIMITS entry (429 beyond that).
+# A caller whose deadline ("deadline_seconds" in the request, else the class
+# default in ADMISSION_DEADLINES, null for none) is shorter than the
+# estimated wait gets a 503 at once. Both limits take a JSON object.
+ADMISSION_SLOTS = int(os.getenv("ADMISSION_SLOTS", 6))
+ADMISSION_QUEUE_LIMITS = json.loads(os.getenv("ADMISSION_QUEUE_LIMITS", "null")) or {
+    "interactive": 32, "neighbor": 64, "bulk": 1024,
+}
+ADMISSION_DEADLINES = json.loads(os.getenv("ADMISSION_DEADLINES", "null")) or {
+    "interactive": 240, "neighbor": 240, "bulk": None,
+}
+ADMISSION_INITIAL_SECONDS = float(os.getenv("ADMISSION_INITIAL_SECONDS", 20))
@@ -1,15 +1,34 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
-import requests
+from werkzeug.exceptions import RequestEntityTooLarge
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-import hashlib
+import json
 import os
-
-import fitz
-from score import score as score_paper, score_pages_concurrently
-from constants import MODEL_NAME
-from diskcache import Cache
+import threading
+import time
+from contextlib import nullcontext
+
+from score import gradable, score as score_paper, score_pages_concurrently
+from engine import TokenUsage, get_engine
+from fetch import fetch_pdf
+from extraction import ExtractionError, extract_front
+from extraction_store import ExtractionStore, full_text, excerpt
+from constants import MODEL_NAME, MODEL_TIERS, NEIGHBORS_MAX_K, PAGE_BATCHING, PREFILTER_ENABLED, PRESCORE_ENABLED, SCORE_BATCH_MAX_PAPERS, SCORE_BATCH_WORKERS, SCORE_ASYNC_DEFAULT, SCORE_CASCADE
+from constants import EXTRACTION_TIMEOUT, UPLOAD_EXTRACTION_WORKERS, UPLOAD_FRONT_PAGES
+from score_cache import ScoreCache, text_source
+from grade_store import GradeStore
+from vector_index import VectorIndex
+from singleflight import SingleFlight
+from jobs import JobQueue, RetryLater
+from uploads import UploadRequest, front_matter, prune_uploads
+from admission import CLASSES, ENGINE_PRIORITY, AdmissionController, Overloaded, deadline_for
+from prefilter import select_pages, skipped_page_result
+from prescore import prescore_pages
 from validator import NLP_REPRODUCABILITY_RUBRIC_FIELDS, VALID_VALUES
+from log import get_logger
+import metrics
+from metrics import HTTP_REQUESTS, HTTP_SECONDS, IN_FLIGHT, timed
 
 """
 Endpoint for the scoring service
@@ -26,13 +45,31 @@ curl -X POST http://localhost:1919/score \
 """
 
 app = Flask(__name__)
+# Uploaded files are streamed to disk and hashed while the body is parsed
+app.request_class = UploadRequest
+logger = get_logger("endpoint")
 
 # Configure CORS for production
 # Add your Cloudflare Pages URL to allowed origins
 allowed_origins = os.environ.get("ALLOWED_ORIGINS", "*").split(",")
 CORS(app, origins=allowed_origins if allowed_origins != ["*"] else "*")
 
-cache = Cache('./gemini_cache', size_limit=1e9)
+cache = ScoreCache()
+# Partial results (some pages failed) are served but not cached
+flight = SingleFlight(cache, leases=cache.disk, should_cache=lambda result: not result.get('failed_pages'))
+PDF_SCORING_MODE = (("pdf-batched" if PAGE_BATCHING else "pdf-paged")
+                    + ("-prefiltered" if PREFILTER_ENABLED else "")
+                    + ("-prescored" if PRESCORE_ENABLED else "")
+                    + ("-cascade" if SCORE_CASCADE else ""))
+extractions = ExtractionStore()
+grade_store = GradeStore()
+vector_index = VectorIndex()
+admission = AdmissionController()
+# Download/extraction threads for /score-batch; page scoring itself is
+# bounded by the shared engine.
+paper_pool = ThreadPoolExecutor(max_workers=SCORE_BATCH_WORKERS, thread_name_prefix="score-batch")
+# Full-text extraction of uploads answered from their first pages
+upload_pool = ThreadPoolExecutor(max_workers=UPLOAD_EXTRACTION_WORKERS, thread_name_prefix="upload-extract")
 
 POINTS = [1, 0.5, 0, 1]
 POINTS_MAP = {
@@ -41,20 +78,6 @@ POINTS_MAP = {
     point : rubric_mark for (rubric_mark, point) in zip(VALID_VALUES, POINTS)
 }
 
-def get_pdf_as_bytes(pdf_url: str):
-    """Download PDF from the provided URL (from Vectorize metadata)"""
-    try:
-        response = requests.get(pdf_url, timeout=30)
-        if response.status_code == 200:
-            print(f"Downloaded PDF from: {pdf_url}")
-            return response.content
-        else:
-            print(f"Error downloading PDF from {pdf_url}: HTTP {response.status_code}")
-            return None
-    except requests.RequestException as e:
-        print(f"Error downloading PDF from {pdf_url}: {e}")
-        return None
-    
 def rubric_to_num(graded_rubric: dict[str, str], fields: list[str]):
     """
     Complete : 1
@@ -71,7 +94,7 @@ def rubric_to_num(graded_rubric: dict[str, str], fields: list[str]):
 
 def pretty_print(D):
     for k,v in D.items():
-        print(f"{k} : {v}")
+        logger.debug(f"{k} : {v}")
 
 
 def get_page_references(rubric_fields, graded_rubrics):
@@ -123,6 +146,317 @@ def calc_aggregate_graded_rubric(graded_rubrics):
     return aggregate_graded_rubric_by_name
 
 
+def load_extraction(paper_id: str, pdf_url: str):
+    """
+    Per-page text of a paper from the extraction store, downloading and
+    extracting the PDF only on a miss. Returns None if the download fails.
+    """
+    extraction = extractions.get(paper_id) or extractions.get(pdf_url)
+    if extraction is not None:
+        logger.info(f"Using stored extraction for {paper_id}")
+        return extraction
+
+    blob = fetch_pdf(pdf_url)
+    if blob is None:
+        return None
+    return extractions.extract(blob.path, blob.sha256, aliases=[paper_id, pdf_url],
+                               metadata={"pdf_url": pdf_url})
+
+
+def score_pdf(paper_id: str, pdf_url: str, done: dict = None, on_result=None,
+              priority_class: str = "interactive", deadline: float = None):
+    """
+    Extract and score a PDF page by page. Returns None if the download fails.
+    done and on_result let a job resume from and checkpoint page results.
+    Pages whose text was scored before (an earlier arXiv version, a
+    re-upload, or an attempt where other pages failed) come from the page
+    cache, so only changed pages are sent to Gemini. Pages are only scored
+    once admission control grants priority_class a slot before deadline;
+    raises Overloaded otherwise.
+    """
+    admission.check(priority_class, deadline)
+    extraction = load_extraction(paper_id, pdf_url)
+    if extraction is None:
+        return None
+    pages_text = extraction['pages']
+
+    # Pages that cannot carry rubric evidence are never sent to Gemini
+    with timed("prefilter"):
+        keep, skipped = select_pages(pages_text)
+        # Fields the rules can prove are taken out of the prompt
+        prescored = prescore_pages(pages_text, keep)
+    done = dict(done or {})
+    for i, reason in skipped.items():
+        done.setdefault(i, skipped_page_result(reason))
+    if skipped:
+        logger.info(f"Skipping {len(skipped)} of {len(pages_text)} pages: {sorted(i + 1 for i in skipped)}")
+
+    remaining = [field for field in NLP_REPRODUCABILITY_RUBRIC_FIELDS if field not in prescored]
+    if prescored:
+        logger.info(f"Pre-scored {len(prescored)} fields: {', '.join(prescored)}")
+    if not remaining:
+        for i in keep:
+            done.setdefault(i, {'valid': True, 'fields': {}, 'errors': [], 'warnings': []})
+
+    # A cached page is reusable if it was graded on every field still needed
+    reused = []
+    for i in keep:
+        if i not in done:
+            page_result = cache.get_page(pages_text[i])
+            if page_result is not None and set(remaining) <= set(page_result['fields']) and gradable(page_result):
+                done[i] = page_result
+                reused.append(i)
+    if reused:
+        logger.info(f"Reusing {len(reused)} cached pages: {[i + 1 for i in reused]}")
+
+    usage = TokenUsage()
+    tier_stats = {}
+    unscored = any(i not in done for i in range(len(pages_text)))
+    with admission.slot(priority_class, deadline) if unscored else nullcontext(), timed("scoring"):
+        page_results = score_pages_concurrently(pages_text, MODEL_NAME, usage=usage,
+                                                done=done, on_result=on_result, fields=remaining,
+                                                tiers=MODEL_TIERS if SCORE_CASCADE else None, tier_stats=tier_stats,
+                                                priority=ENGINE_PRIORITY[priority_class])
+
+    failed = [i for i, page_result in enumerate(page_results) if page_result.get('failed')]
+    if failed:
+        logger.warning(f"Scoring failed for pages {[i + 1 for i in failed]}, keeping the other pages")
+    if remaining:
+        # Cascade pages settled by a cheaper model stay out of the page cache,
+        # as do replies with grades the aggregate cannot map
+        for i, page_result in enumerate(page_results):
+            if (i not in reused and not page_result.get('failed') and not page_result.get('skipped')
+                    and page_result.get('model', MODEL_NAME) == MODEL_NAME and gradable(page_result)):
+                cache.set_page(pages_text[i], page_result)
+
+    with timed("aggregation"):
+        graded_rubrics = []
+        for i, page_result in enumerate(page_results):
+            for field, pages in prescored.items():
+                page_result['fields'][field] = "Complete" if i in pages else "Not Present"
+            graded_rubrics.append(page_result['fields'])
+
+        result = {}
+
+        result['fields'] = calc_aggregate_graded_rubric(graded_rubrics)
+        result['page_references'] = get_page_references(NLP_REPRODUCABILITY_RUBRIC_FIELDS, graded_rubrics)
+    result['usage'] = usage.as_dict()
+    result['skipped_pages'] = [{"page": i + 1, "reason": page_result['skipped']}
+                               for i, page_result in enumerate(page_results) if page_result.get('skipped')]
+    result['prescored_fields'] = sorted(prescored)
+    result['failed_pages'] = [i + 1 for i in failed]
+    result['reused_pages'] = len(reused)
+    if tier_stats:
+        result['tiers'] = tier_stats
+
+    return result
+
+
+def record_grades(paper_id: str, result: dict, categories=None):
+    """
+    Add a complete full-PDF result to the grade store for /rank. categories
+    is an arXiv category or a list of them, primary first. Text scores
+    (/score-by-text) are not recorded: an excerpt's grades would replace the
+    paper's, and the worker sends every upload's text as "uploaded".
+    """
+    if result.get('failed_pages') or paper_id == "uploaded":
+        return
+    if isinstance(categories, list):
+        categories = categories[0] if categories else None
+    try:
+        grade_store.add(paper_id, result['fields'],
+                        rubric_to_num(result['fields'], NLP_REPRODUCABILITY_RUBRIC_FIELDS), categories)
+    except OSError as e:
+        logger.warning(f"Could not record grades for {paper_id}: {e}")
+
+
+def run_scoring_job(job, done, save_page, categories=None):
+    """
+    JobQueue handler: score a queued paper, resuming from checkpointed pages.
+    A job's priority is the index of its admission class; jobs have no
+    deadline, and one turned away by admission control is requeued.
+    """
+    priority_class = CLASSES[min(job.get('priority', 0), len(CLASSES) - 1)]
+    try:
+        result, _ = flight.do(
+            job['cache_key'], lambda: score_pdf(job['paper_id'], job['pdf_url'], done, save_page, priority_class)
+        )
+    except Overloaded as e:
+        # Turned away by admission control; the job is tried again later
+        raise RetryLater(e.retry_after, str(e)) from e
+    if result is not None:
+        record_grades(job['paper_id'], result, categories)
+    return result
+
+
+jobs = JobQueue(run_scoring_job)
+draining = threading.Event()
+
+
+def start_background():
+    """
+    Start this process's background threads: job workers and the scoring
+    engine's loop. Threads do not survive fork, so under gunicorn this runs
+    in each worker after the fork, never in the preloading master.
+    """
+    draining.clear()
+    get_engine()
+    jobs.start()
+    prune_uploads()
+
+
+def drain(timeout: float):
+    """
+    Graceful shutdown: report not ready, stop claiming jobs and give running
+    jobs and in-flight Gemini calls up to timeout seconds in all to finish.
+    Under gunicorn, timeout is what is left of graceful_timeout (see
+    gunicorn.conf.py), and a job cut short resumes from its checkpoints.
+    """
+    draining.set()
+    deadline = time.monotonic() + timeout
+    if not jobs.stop(timeout):
+        logger.warning("Job still running at shutdown; it will resume from its checkpoints")
+    while IN_FLIGHT.value(kind="gemini_call") > 0 and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+
+def score_arxiv_paper(paper_id: str, pdf_url: str, categories=None, priority_class: str = "interactive",
+                      deadline: float = None):
+    """
+    Cached scoring of one paper, as (response body, HTTP status). Raises
+    Overloaded when admission control turns a cold paper away.
+    """
+    cache_key = cache.key(paper_id, PDF_SCORING_MODE)
+    try:
+        result, cached = flight.do(cache_key, lambda: score_pdf(paper_id, pdf_url, priority_class=priority_class,
+                                                                deadline=deadline))
+    except ExtractionError as e:
+        return {"error": f"Failed to process PDF: {str(e)}", "paper_id": paper_id}, 422
+    if result is None:
+        return {"error": "Failed to download PDF", "paper_id": paper_id}, 500
+    logger.info("Cache hit! Using cached result." if cached else "Cache miss! Deferred to Gemini API.")
+    record_grades(paper_id, result, categories)
+
+    return format_score_response(paper_id, pdf_url, result), 200
+
+
+def format_score_response(paper_id: str, pdf_url: str, result: dict):
+    graded_rubric = result['fields']
+    graded_rubric_score = rubric_to_num(graded_rubric, NLP_REPRODUCABILITY_RUBRIC_FIELDS)
+    page_references = result['page_references']
+
+    logger.info(f"Graded rubric as number: {graded_rubric_score}")
+    pretty_print(page_references)
+
+    return {
+        "graded_rubric": graded_rubric,
+        "graded_rubric_score" : graded_rubric_score,
+        "page_references" : page_references,
+        "token_usage": result.get('usage'),
+        "skipped_pages": result.get('skipped_pages', []),
+        "prescored_fields": result.get('prescored_fields', []),
+        "failed_pages": result.get('failed_pages', []),
+        "reused_pages": result.get('reused_pages', 0),
+        "model_tiers": result.get('tiers'),
+        "partial": bool(result.get('failed_pages')),
+        "paper_id": paper_id,
+        "pdf_url": pdf_url,
+        "analysis_timestamp": str(datetime.now())
+    }
+
+
+def admission_request(data: dict, default_class: str):
+    """
+    Priority class ("priority") and monotonic deadline ("deadline_seconds")
+    of a scoring request, or ValueError.
+    """
+    priority_class = data.get("priority", None) or default_class
+    if priority_class not in CLASSES:
+        raise ValueError(f"priority must be one of {', '.join(CLASSES)}")
+    seconds = data.get("deadline_seconds", None)
+    try:
+        return priority_class, deadline_for(priority_class, None if seconds is None else float(seconds))
+    except (TypeError, ValueError):
+        raise ValueError("deadline_seconds must be a number")
+
+
+@app.errorhandler(Overloaded)
+def overloaded(error):
+    """Scoring turned away by admission control: 429 or 503 with Retry-After"""
+    response = jsonify(error.as_dict())
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, error.status
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def too_large(error):
+    """Upload refused mid-stream above UPLOAD_MAX_BYTES (see uploads.py)"""
+    return jsonify({"error": error.description}), 413
+
+
+@app.before_request
+def start_timing():
+    g.started = time.perf_counter()
+    IN_FLIGHT.inc(kind="http_request")
+    metrics.start_request()
+
+
+@app.after_request
+def record_timing(response):
+    """
+    Count the request and report its per-stage timings in a Server-Timing
+    header, and in the JSON body too when ?timings=1 is passed.
+    """
+    elapsed = time.perf_counter() - g.get("started", time.perf_counter())
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_REQUESTS.inc(route=route, status=response.status_code)
+    HTTP_SECONDS.observe(elapsed, route=route)
+
+    timings = metrics.finish_request()
+    timings["total"] = elapsed
+    response.headers["Server-Timing"] = ", ".join(f"{stage};dur={seconds * 1000:.1f}"
+                                                  for stage, seconds in timings.items())
+    if request.args.get("timings") == "1" and response.is_json and not response.is_streamed:
+        body = response.get_json()
+        if isinstance(body, dict):
+            body["timings"] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+            response.set_data(json.dumps(body))
+    return response
+
+
+@app.teardown_request
+def end_timing(error=None):
+    IN_FLIGHT.dec(kind="http_request")
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus metrics for this worker process"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/ready", methods=["GET"])
+def readiness_check():
+    """
+    Readiness, unlike the liveness check at /: background workers are
+    running, the shared stores answer and the process is not draining
+    """
+    checks = {
+        "not_draining": not draining.is_set(),
+        "engine": get_engine()._thread.is_alive(),
+        "job_workers": jobs.running,
+        "jobs_db": jobs.ping(),
+    }
+    try:
+        cache.disk.get("ready-probe")
+        checks["score_cache"] = True
+    except Exception:
+        checks["score_cache"] = False
+
+    ready = all(checks.values())
+    return jsonify({"ready": ready, "checks": checks}), 200 if ready else 503
+
+
 @app.route("/", methods=["GET"])
 def health_check():
     """Health check endpoint"""
@@ -133,6 +467,41 @@ def health_check():
     })
 
 
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """Hit/miss counters and sizes of the score cache"""
+    return jsonify(cache.stats())
+
+
+@app.route("/admission/stats", methods=["GET"])
+def admission_stats():
+    """Scoring slots, queue depth and estimated wait per priority class"""
+    return jsonify(admission.stats())
+
+
+@app.route("/text/<handle>", methods=["GET"])
+def get_text(handle):
+    """Fetch stored text by handle, optionally a single page (?page=N, 1-based)"""
+    extraction = extractions.get(handle, wait=EXTRACTION_TIMEOUT)
+    if extraction is None:
+        return jsonify({"error": "Unknown text handle"}), 404
+
+    page = request.args.get("page", type=int)
+    if page is not None:
+        if not 1 <= page <= extraction['page_count']:
+            return jsonify({"error": "Page out of range"}), 400
+        text = extraction['pages'][page - 1]
+    else:
+        text = full_text(extraction)
+
+    return jsonify({
+        "text_handle": extraction['text_handle'],
+        "page_count": extraction['page_count'],
+        "page": page,
+        "text": text
+    })
+
+
 @app.route("/score", methods=["POST"])
 def score_endpoint():
     data = request.json
@@ -141,52 +510,246 @@ def score_endpoint():
     if not paper_id:
         return jsonify({"error": "ArXiv Paper Id is required"}), 400
 
+    # Papers sent to /upload-pdf have no URL; they are scored from their
+    # stored extraction, found by their upload id or a text_handle. A
+    # text_handle is scored under the upload id of its content, never under
+    # the paper_id sent, which could name an arXiv paper.
     pdf_url = data.get("pdf_url", None)
     if not pdf_url:
-        return jsonify({"error": "PDF URL is required"}), 400
+        text_handle = data.get("text_handle", None)
+        if not text_handle and not paper_id.startswith("uploaded_"):
+            return jsonify({"error": "PDF URL is required"}), 400
+        extraction = extractions.get(text_handle or paper_id, wait=EXTRACTION_TIMEOUT)
+        if extraction is None:
+            return jsonify({"error": "Unknown uploaded paper or text handle"}), 404
+        if text_handle:
+            paper_id = f"uploaded_{extraction['text_handle'][:12]}"
+            extractions.add_aliases(extraction['text_handle'], [paper_id])
+        pdf_url = ""
+
+    # "priority" (interactive, neighbor or bulk) orders cold papers waiting
+    # to be scored; see admission.py
+    try:
+        priority_class, deadline = admission_request(data, "interactive")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # With "async": true a cold paper is queued and answered with 202 and a
+    # job id to poll at /jobs/<job_id>, instead of holding the request open.
+    if data.get("async", SCORE_ASYNC_DEFAULT):
+        cache_key = cache.key(paper_id, PDF_SCORING_MODE)
+        result = cache.get(cache_key)
+        if result is None:
+            job_id = jobs.enqueue(paper_id, pdf_url, cache_key, CLASSES.index(priority_class))
+            logger.info(f"Cache miss! Queued scoring job {job_id}.")
+            response = jsonify({
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/jobs/{job_id}",
+                "paper_id": paper_id
+            })
+            response.headers["Location"] = f"/jobs/{job_id}"
+            return response, 202
+        logger.info("Cache hit! Using cached result.")
+        record_grades(paper_id, result, data.get("categories"))
+        return jsonify(format_score_response(paper_id, pdf_url, result))
+
+    body, status = score_arxiv_paper(paper_id, pdf_url, data.get("categories"), priority_class, deadline)
+    return jsonify(body), status
+
+
+@app.route("/rank", methods=["POST"])
+def rank_endpoint():
+    """
+    How a scored paper ranks among a cohort: its k neighbors, or every paper
+    in a category (its own by default). Answered from the grade store's
+    columns, without loading any cached result.
 
-    if paper_id in cache:
-        print("Cache hit! Using cached result.")
-        result = cache[paper_id]
+    Body: {"paper_id": ..., "neighbors": [paper_id, ...]} or
+          {"paper_id": ..., "category": "cs.CL"}
+    """
+    data = request.json
+    paper_id = data.get("paper_id", None)
+    if not paper_id:
+        return jsonify({"error": "Paper ID is required"}), 400
+    if paper_id not in grade_store:
+        return jsonify({"error": "Paper has not been scored", "paper_id": paper_id}), 404
+
+    neighbors = data.get("neighbors", None)
+    if neighbors is not None:
+        if not isinstance(neighbors, list):
+            return jsonify({"error": "neighbors must be a list of paper ids"}), 400
+        category = None
+        rows, missing = grade_store.cohort(paper_ids=[str(n).removeprefix("arxiv:") for n in neighbors],
+                                           exclude=paper_id)
     else:
-        raw_pdf_bytes = get_pdf_as_bytes(pdf_url)
-        if raw_pdf_bytes is None:
-            return jsonify({"error": "Failed to download PDF"}), 500
-        
-        doc = fitz.open(stream=raw_pdf_bytes, filetype="pdf")
-        pages_text = []
-        for page in doc:
-            pages_text.append(page.get_text())
-
-        page_results = score_pages_concurrently(pages_text, MODEL_NAME, max_workers=8)
-        
-        graded_rubrics = []
-        for page_result in page_results:
-            graded_rubrics.append(page_result['fields'])
-        
-        result = {}
+        category = data.get("category", None) or grade_store.category(paper_id)
+        if not category:
+            return jsonify({"error": "Either neighbors or a category is required"}), 400
+        rows, missing = grade_store.cohort(category=category, exclude=paper_id)
 
-        result['fields'] = calc_aggregate_graded_rubric(graded_rubrics)
-        result['page_references'] = get_page_references(NLP_REPRODUCABILITY_RUBRIC_FIELDS, graded_rubrics)
+    body = grade_store.compare(paper_id, rows)
+    body["category"] = category
+    body["missing_neighbors"] = missing
+    body["cohort"] = grade_store.stats(rows)
+    return jsonify(body)
 
-        print("Cache miss! Deferring to Gemini API.")
-        cache[paper_id] = result
 
-    graded_rubric = result['fields']
-    graded_rubric_score = rubric_to_num(graded_rubric, NLP_REPRODUCABILITY_RUBRIC_FIELDS)
-    page_references = result['page_references']
+@app.route("/vectors/upsert", methods=["POST"])
+def upsert_vectors():
+    """
+    Add papers to the local vector index. Same papers as the worker's
+    /api/upsert, plus the embedding it computed for each.
 
-    print(f"Graded rubric as number: {graded_rubric_score}")
-    pretty_print(page_references)
-    
-    return jsonify({
-        "graded_rubric": graded_rubric,
-        "graded_rubric_score" : graded_rubric_score,
-        "page_references" : page_references,
-        "paper_id": paper_id,
-        "pdf_url": pdf_url,
-        "analysis_timestamp": str(datetime.now())
-    })
+    Body: {"papers": [{"id": ..., "vector": [...], "title": ..., "pdf_url": ..., ...}, ...]}
+    """
+    data = request.json
+    papers = data.get("papers", None) if isinstance(data, dict) else None
+    if not isinstance(papers, list) or not papers:
+        return jsonify({"error": "Papers array is required"}), 400
+    for paper in papers:
+        if not isinstance(paper, dict) or not paper.get("id") or not isinstance(paper.get("vector"), list):
+            return jsonify({"error": "Each paper needs an id and a vector"}), 400
+
+    ids = [str(paper["id"]).removeprefix("arxiv:") for paper in papers]
+    metadata = [{k: v for k, v in paper.items() if k not in ("id", "vector")} for paper in papers]
+    try:
+        count = vector_index.upsert(ids, [paper["vector"] for paper in papers], metadata)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"upserted": count, "total": len(vector_index)})
+
+
+@app.route("/neighbors", methods=["POST"])
+def neighbors_endpoint():
+    """
+    Nearest papers from the local vector index, shaped like the worker's
+    similar papers. With "score": true, scoring jobs are queued for the
+    neighbors that are not cached yet.
+
+    Body: {"paper_id": ...} or {"vector": [...]}, optional "k" (default 10,
+          clamped to 1..NEIGHBORS_MAX_K), "exact" and "score"
+    """
+    data = request.json
+    paper_id = data.get("paper_id", None)
+    k = data.get("k", 10)
+    if isinstance(k, bool) or not isinstance(k, int):
+        return jsonify({"error": "k must be an integer"}), 400
+    k = max(1, min(k, NEIGHBORS_MAX_K))
+    if paper_id:
+        paper_id = str(paper_id).removeprefix("arxiv:")
+        query = vector_index.vector(paper_id)
+        if query is None:
+            return jsonify({"error": "Paper is not in the vector index", "paper_id": paper_id}), 404
+    elif isinstance(data.get("vector", None), list):
+        query = data["vector"]
+    else:
+        return jsonify({"error": "Either paper_id or vector is required"}), 400
+
+    try:
+        matches = vector_index.search(query, k, exclude=[paper_id] if paper_id else None,
+                                 exact=bool(data.get("exact", False)))[0]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    neighbors = [{
+        "id": match_id,
+        "title": metadata.get("title", "Untitled"),
+        "authors": metadata.get("authors", []),
+        "categories": metadata.get("categories", []),
+        "published": metadata.get("published", ""),
+        "similarity_score": similarity,
+        "abstract": metadata.get("abstract", ""),
+        "pdf_url": metadata.get("pdf_url") or f"https://arxiv.org/pdf/{match_id}.pdf",
+    } for match_id, similarity, metadata in matches]
+
+    if data.get("score", False):
+        for neighbor in neighbors:
+            cache_key = cache.key(neighbor["id"], PDF_SCORING_MODE)
+            if cache_key in cache:
+                neighbor["scoring"] = {"status": "cached"}
+            else:
+                job_id = jobs.enqueue(neighbor["id"], neighbor["pdf_url"], cache_key, CLASSES.index("neighbor"))
+                neighbor["scoring"] = {"status": "queued", "job_id": job_id, "status_url": f"/jobs/{job_id}"}
+
+    return jsonify({"paper_id": paper_id, "k": k, "neighbors": neighbors})
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Status of a queued scoring job, with the /score response once done"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+
+    body = {
+        "job_id": job_id,
+        "status": job['status'],
+        "paper_id": job['paper_id'],
+        "pages_done": job['pages_done'],
+        "attempts": job['attempts'],
+        "error": job['error']
+    }
+    if job['status'] == "done":
+        body["result"] = format_score_response(job['paper_id'], job['pdf_url'], job['result'])
+    return jsonify(body)
+
+
+@app.route("/score-batch", methods=["POST"])
+def score_batch_endpoint():
+    """
+    Score several papers, streaming one NDJSON line per paper as soon as it
+    is done. Cached papers are answered before any scoring starts. Cold
+    papers are admitted as neighbors unless "priority" says otherwise; one
+    turned away gets a line with status 429 or 503 and its retry_after.
+
+    Body: {"papers": [{"paper_id": ..., "pdf_url": ...}, ...]}, optional
+          "priority" and "deadline_seconds"
+    """
+    data = request.json
+    papers = data.get("papers", None) if isinstance(data, dict) else data
+    if not isinstance(papers, list) or not papers:
+        return jsonify({"error": "A list of papers is required"}), 400
+    if len(papers) > SCORE_BATCH_MAX_PAPERS:
+        return jsonify({"error": f"At most {SCORE_BATCH_MAX_PAPERS} papers per batch"}), 400
+    for paper in papers:
+        if not isinstance(paper, dict) or not paper.get("paper_id") or not paper.get("pdf_url"):
+            return jsonify({"error": "Each paper needs a paper_id and a pdf_url"}), 400
+    try:
+        priority_class, deadline = admission_request(data if isinstance(data, dict) else {}, "neighbor")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def ndjson_line(body, status):
+        return json.dumps(body | {"status": status}) + "\n"
+
+    def generate():
+        pending = {}
+        for paper in papers:
+            paper_id, pdf_url, categories = paper["paper_id"], paper["pdf_url"], paper.get("categories")
+            if cache.key(paper_id, PDF_SCORING_MODE) in cache:
+                # Scored here only if it was evicted since the check
+                try:
+                    yield ndjson_line(*score_arxiv_paper(paper_id, pdf_url, categories, priority_class, deadline))
+                except Overloaded as e:
+                    yield ndjson_line(e.as_dict() | {"paper_id": paper_id}, e.status)
+                except Exception as e:
+                    logger.exception(f"Error scoring paper {paper_id}: {e}")
+                    yield ndjson_line({"error": "Scoring failed", "paper_id": paper_id}, 500)
+            else:
+                pending[paper_pool.submit(score_arxiv_paper, paper_id, pdf_url, categories,
+                                          priority_class, deadline)] = paper_id
+
+        for future in as_completed(pending):
+            try:
+                yield ndjson_line(*future.result())
+            except Overloaded as e:
+                yield ndjson_line(e.as_dict() | {"paper_id": pending[future]}, e.status)
+            except Exception as e:
+                logger.exception(f"Error scoring paper {pending[future]}: {e}")
+                yield ndjson_line({"error": "Scoring failed", "paper_id": pending[future]}, 500)
+
+    return Response(generate(), mimetype="application/x-ndjson")
 
 
 @app.route("/score-by-text", methods=["POST"])
@@ -198,29 +761,51 @@ def score_by_text():
     if not paper_id:
         return jsonify({"error": "Paper ID is required"}), 400
 
+    # Text can be sent inline or as a handle returned by /process-arxiv or /upload-pdf
     paper_text = data.get("paper_text", None)
+    text_handle = data.get("text_handle", None)
+    if not paper_text and text_handle:
+        max_words = data.get("max_words", None)
+        extraction = extractions.get_front(text_handle)
+        # An upload still being extracted: its first pages serve a short
+        # excerpt, anything longer waits for the full text
+        if extraction is not None and extraction.get('partial') and not (
+                max_words and len(excerpt(extraction, int(max_words)).split()) >= int(max_words)):
+            extraction = extractions.get(text_handle, wait=EXTRACTION_TIMEOUT)
+        if extraction is None:
+            return jsonify({"error": "Unknown text handle"}), 404
+        paper_text = excerpt(extraction, int(max_words)) if max_words else full_text(extraction)
     if not paper_text:
         return jsonify({"error": "Paper text is required"}), 400
 
-    print(f"Scoring paper by text: {paper_id}")
+    try:
+        priority_class, deadline = admission_request(data, "interactive")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    logger.info(f"Scoring paper by text: {paper_id}")
     
-    # Check cache first
-    if paper_id in cache:
-        print("Cache hit! Using cached result.")
-        result = cache[paper_id]
+    # Check cache first, keyed by the text itself so excerpts never collide
+    # with full-PDF results for the same paper_id
+    cache_key = cache.key(text_source(paper_text), "text")
+    result = cache.get(cache_key)
+    if result is not None:
+        logger.info("Cache hit! Using cached result.")
     else:
-        print("Cache miss! Deferring to Gemini API.")
-        result = score_paper(paper_text, MODEL_NAME)
-        cache[paper_id] = result
+        logger.info("Cache miss! Deferring to Gemini API.")
+        with admission.slot(priority_class, deadline):
+            result = score_paper(paper_text, MODEL_NAME, ENGINE_PRIORITY[priority_class])
+        cache[cache_key] = result
 
     graded_rubric = result['fields']
     graded_rubric_score = rubric_to_num(graded_rubric, NLP_REPRODUCABILITY_RUBRIC_FIELDS)
 
-    print(f"Graded rubric as number: {graded_rubric_score}")
+    logger.info(f"Graded rubric as number: {graded_rubric_score}")
     
     return jsonify({
         "graded_rubric": graded_rubric,
         "graded_rubric_score": graded_rubric_score,
+        "token_usage": result.get('usage'),
         "paper_id": paper_id,
         "analysis_timestamp": str(datetime.now())
     })
@@ -238,94 +823,120 @@ def process_arxiv():
     # Construct PDF URL from paper ID
     pdf_url = f"https://arxiv.org/pdf/{paper_id}.pdf"
     
-    print(f"Processing arXiv paper: {paper_id}")
+    logger.info(f"Processing arXiv paper: {paper_id}")
     
-    # Download PDF
-    raw_pdf_bytes = get_pdf_as_bytes(pdf_url)
-    if raw_pdf_bytes is None:
+    # Download and extract PDF, or reuse an earlier extraction
+    try:
+        extraction = load_extraction(paper_id, pdf_url)
+    except ExtractionError as e:
+        return jsonify({"error": f"Failed to process PDF: {str(e)}"}), 422
+    if extraction is None:
         return jsonify({"error": "Failed to download arXiv paper"}), 500
     
-    # Extract text from PDF
-    doc = fitz.open(stream=raw_pdf_bytes, filetype="pdf")
-    paper_text = ''
-    for page in doc:
-        paper_text += page.get_text()
-    doc.close()
-    
-    # Return extracted text for Worker to use
-    return jsonify({
+    # Return extracted text for Worker to use. Callers that only need the
+    # excerpt can pass include_text: false and fetch the rest by handle.
+    response = {
         "paper_id": paper_id,
         "pdf_url": pdf_url,
         "status": "processed",
-        "text": paper_text,
-        "text_length": len(paper_text),
+        "text_handle": extraction['text_handle'],
+        "excerpt": excerpt(extraction),
+        "page_count": extraction['page_count'],
+        "text_length": extraction['text_length'],
         "timestamp": str(datetime.now())
-    })
+    }
+    if data.get("include_text", True):
+        response["text"] = full_text(extraction)
+    return jsonify(response)
+
+
+def extract_upload(path: str, sha256: str, aliases: list[str], metadata: dict):
+    """Background full-text extraction of an upload answered from its first pages."""
+    try:
+        extractions.extract(path, sha256, aliases=aliases, metadata=metadata)
+    except Exception as e:
+        logger.warning(f"Extraction of upload {sha256[:12]} failed: {e}")
+    finally:
+        extractions.drop_front(sha256)
+        os.remove(path)
 
 
 @app.route("/upload-pdf", methods=["POST"])
 def upload_pdf():
-    """Handle direct PDF upload from user"""
+    """
+    Handle direct PDF upload from user. Title, abstract and excerpt are read
+    from the first pages and returned right away, while the full text is
+    extracted in the background into the extraction store. A PDF uploaded
+    before is not parsed again. With include_text (the default) the response
+    waits for the full text.
+    """
     if 'file' not in request.files:
         return jsonify({"error": "No file uploaded"}), 400
     
     file = request.files['file']
     if file.filename == '':
         return jsonify({"error": "No file selected"}), 400
-    
-    print(f"Uploading PDF: {file.filename}")
-    
-    # Read PDF bytes
-    pdf_bytes = file.read()
-    
-    # Extract text from PDF
-    try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        paper_text = ''
-        for page in doc:
-            paper_text += page.get_text()
-        doc.close()
-    except Exception as e:
-        return jsonify({"error": f"Failed to process PDF: {str(e)}"}), 500
-    
-    # Generate unique ID for uploaded paper
-    paper_id = f"uploaded_{hashlib.md5(pdf_bytes).hexdigest()[:12]}"
-    
-    # Extract title and abstract from the paper text
-    # Title is typically in the first few lines
-    lines = [line.strip() for line in paper_text.split('\n') if line.strip()]
-    title = lines[0] if lines else file.filename
-    
-    # Abstract is typically after "Abstract" keyword
-    abstract = ""
-    abstract_start = -1
-    for i, line in enumerate(lines):
-        if 'abstract' in line.lower():
-            abstract_start = i + 1
-            break
-    
-    if abstract_start > 0 and abstract_start < len(lines):
-        # Take next few lines as abstract (up to 10 lines or until we hit "Introduction")
-        abstract_lines = []
-        for i in range(abstract_start, min(abstract_start + 10, len(lines))):
-            if 'introduction' in lines[i].lower() or lines[i].startswith('1.') or lines[i].startswith('I.'):
-                break
-            abstract_lines.append(lines[i])
-        abstract = ' '.join(abstract_lines)
-    
-    # Return extracted text with title and abstract for Worker to use
-    return jsonify({
+
+    # Already on disk and hashed by the time the form is parsed (see uploads.py)
+    upload = file.stream
+    upload.flush()
+    paper_id = f"uploaded_{upload.sha256[:12]}"
+    logger.info(f"Uploaded PDF: {file.filename} ({upload.size} bytes)")
+
+    # An identical upload, extracted or still extracting, is not parsed again
+    extraction = extractions.get_front(upload.sha256)
+    if extraction is not None:
+        extractions.add_aliases(upload.sha256, [paper_id])
+    else:
+        try:
+            with timed("extraction"):
+                pages, page_count = extract_front(upload.path, UPLOAD_FRONT_PAGES, min_words=400)
+        except ExtractionError as e:
+            return jsonify({"error": f"Failed to process PDF: {str(e)}"}), 422
+        except Exception as e:
+            # fitz errors name the server-side file
+            logger.warning(f"Could not open upload {file.filename}: {e}")
+            return jsonify({"error": "Failed to process PDF: not a readable PDF"}), 500
+        title, abstract = front_matter(pages, file.filename)
+        metadata = {"filename": file.filename, "title": title, "abstract": abstract}
+        if len(pages) == page_count:
+            extraction = extractions.put(upload.sha256, pages, [paper_id], metadata)
+        else:
+            extraction = extractions.put_front(upload.sha256, pages, page_count, [paper_id], metadata)
+            upload_pool.submit(extract_upload, upload.keep(), upload.sha256, [paper_id], metadata)
+
+    include_text = request.form.get("include_text", "true").lower() != "false"
+    if include_text and extraction.get('partial'):
+        extraction = extractions.get(upload.sha256, wait=EXTRACTION_TIMEOUT)
+        if extraction is None:
+            return jsonify({"error": "Failed to process PDF"}), 500
+
+    # Extractions stored by /process-arxiv have no front matter yet
+    title, abstract = extraction['metadata'].get("title"), extraction['metadata'].get("abstract")
+    if title is None:
+        title, abstract = front_matter(extraction['pages'][:UPLOAD_FRONT_PAGES], file.filename)
+
+    # Return title, abstract and excerpt for Worker to use; the full text
+    # can be fetched by handle once status is "processed"
+    response = {
         "paper_id": paper_id,
         "filename": file.filename,
         "title": title,
         "abstract": abstract if abstract else "No abstract found",
-        "status": "processed",
-        "text": paper_text,
-        "text_length": len(paper_text),
+        "status": "extracting" if extraction.get('partial') else "processed",
+        "text_handle": extraction['text_handle'],
+        "excerpt": excerpt(extraction),
+        "page_count": extraction['page_count'],
+        "text_length": extraction['text_length'],
         "timestamp": str(datetime.now())
-    })
+    }
+    if include_text:
+        response["text"] = full_text(extraction)
+    return jsonify(response)
     
 
 if __name__ == "__main__":
+    # Development server; production runs gunicorn with gunicorn.conf.py
+    start_background()
     port = int(os.environ.get("PORT", 1919))
     app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,405 @@
+"""
+Process-wide asyncio engine for Gemini calls.
+
+Every scoring call in the process goes through one ScoringEngine: a single
+google-genai client, a bounded concurrency semaphore and, per model, token
+buckets on requests/sec and tokens/min. The engine runs its own event loop
+on a daemon thread, so synchronous Flask handlers can block on
+engine.run(...) while async callers (e.g. an ASGI app on another loop)
+await engine.submit(...).
+
+Each call attempt has a deadline; transient failures (timeouts, 429, 5xx,
+connection errors) are retried with jittered exponential backoff, going
+through the rate limiter again, and a 429's Retry-After pauses that
+model's limiter for everyone. Attempts slower than a recent latency
+percentile of the same model get one hedged duplicate request, if a
+concurrency slot is free for it, and the first response wins. A call holds
+its slot only while an attempt is in flight, not during backoff. The static instructions of each call are sent as
+context-cached content where possible (see prompt_cache.py).
+"""
+
+import asyncio
+import collections
+import functools
+import heapq
+import itertools
+import os
+import threading
+import time
+
+import httpx
+from google import genai
+from google.genai import errors, types
+from dotenv import load_dotenv
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, stop_after_delay, wait_random_exponential
+
+from constants import (GEMINI_MAX_CONCURRENCY, GEMINI_REQUESTS_PER_SECOND, GEMINI_TOKENS_PER_MINUTE,
+                       GEMINI_CALL_TIMEOUT, GEMINI_MAX_ATTEMPTS, GEMINI_RETRY_DEADLINE, GEMINI_RETRY_MAX_WAIT,
+                       GEMINI_HEDGE_PERCENTILE, GEMINI_HEDGE_MIN_SAMPLES, GEMINI_HEDGE_MAX_RATIO,
+                       GEMINI_THINKING_BUDGET, MODEL_NAME, PROMPT_CACHE_MODE)
+from log import get_logger
+from metrics import GEMINI_CALLS, GEMINI_SECONDS, GEMINI_TOKENS, IN_FLIGHT, UPSTREAM_ERRORS, timed
+from prompt_cache import PromptCache
+
+logger = get_logger(__name__)
+
+# Lower values are served first when calls queue for a concurrency slot
+PRIORITY_NORMAL = 0
+PRIORITY_NEIGHBOR = 5
+PRIORITY_BACKGROUND = 10
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local token estimate for pre-flight budgeting, no network call.
+    Gemini averages ~4 characters per token on English prose; dense math and
+    tables tokenize worse, so whitespace-separated words put a floor under it.
+    """
+    return max(len(text) // 4, int(len(text.split()) * 1.3)) + 1
+
+
+class TokenUsage:
+    """Token accounting accumulated from generate_content usage metadata."""
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self.thinking_tokens = 0
+        self.total_tokens = 0
+
+    def add(self, usage_metadata):
+        self.requests += 1
+        if usage_metadata is None:
+            return
+        self.prompt_tokens += usage_metadata.prompt_token_count or 0
+        self.cached_tokens += usage_metadata.cached_content_token_count or 0
+        self.output_tokens += usage_metadata.candidates_token_count or 0
+        self.thinking_tokens += usage_metadata.thoughts_token_count or 0
+        self.total_tokens += usage_metadata.total_token_count or 0
+
+    def merge(self, other: "TokenUsage"):
+        for name, value in vars(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self) -> dict[str, int]:
+        return dict(vars(self))
+
+
+class TokenBucket:
+    """Classic token bucket; amounts above capacity are clamped to it."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount can be taken."""
+        self._refill()
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """Requests/sec and tokens/min limits, granted to callers in FIFO order."""
+
+    def __init__(self, requests_per_second: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_second, max(1.0, requests_per_second))
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int):
+        async with self._lock:
+            while True:
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens),
+                           self.paused_until - time.monotonic())
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+
+    def settle(self, estimated: int, actual: int):
+        """Correct the tokens/min bucket once the real token count is known."""
+        self.tokens.take(actual - estimated)
+
+    def pause(self, seconds: float):
+        """Hold every caller back, e.g. for a 429's Retry-After."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class StaleCachedContent(Exception):
+    """A call named cached content the API no longer has; retried without it."""
+
+
+def is_transient(error: BaseException) -> bool:
+    """Errors worth retrying: timeouts, rate limiting, server and connection errors."""
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError, errors.ServerError, StaleCachedContent)):
+        return True
+    return isinstance(error, errors.ClientError) and error.code in (408, 429)
+
+
+def retry_after(error: BaseException) -> float:
+    """Seconds requested by a Retry-After header, or 0."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("Retry-After", 0))
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+class PrioritySemaphore:
+    """
+    Bounded semaphore whose waiters are woken lowest priority value first,
+    FIFO within a priority, so background work only gets the slots that
+    interactive requests leave free.
+    """
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters = []
+        self._order = itertools.count()
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free and nobody is waiting for it."""
+        if self._value > 0 and not self._waiters:
+            self._value -= 1
+            return True
+        return False
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL):
+        if self.try_acquire():
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Woken and cancelled in the same step: hand the slot on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._value += 1
+
+
+class ScoringEngine:
+    def __init__(self, max_concurrency=GEMINI_MAX_CONCURRENCY,
+                 requests_per_second=GEMINI_REQUESTS_PER_SECOND,
+                 tokens_per_minute=GEMINI_TOKENS_PER_MINUTE, client=None, prompt_cache_mode=PROMPT_CACHE_MODE):
+        load_dotenv()
+        self.client = client or genai.Client()
+        # Gemini quotas are per model, so each model gets its own buckets
+        self.limiters = collections.defaultdict(lambda: RateLimiter(requests_per_second, tokens_per_minute))
+        self.semaphore = PrioritySemaphore(max_concurrency)
+        self.latencies = collections.defaultdict(lambda: collections.deque(maxlen=500))
+        self.attempts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.prompt_cache_mode = prompt_cache_mode
+        self.prompts = PromptCache(self.client)
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="scoring-engine", daemon=True)
+        self._thread.start()
+
+    async def generate(self, contents: str, usage: TokenUsage = None, priority: int = PRIORITY_NORMAL,
+                       model_name: str = MODEL_NAME, thinking_budget: int = GEMINI_THINKING_BUDGET,
+                       instruction: str = None) -> str:
+        """
+        Rate-limited generate_content call. Must run on the engine loop.
+        Token counts from the response are added to usage when given.
+        Calls waiting for a concurrency slot are served by priority; a retry
+        gives its slot up during the backoff and queues for one again.
+        instruction is static text that precedes contents, sent as cached
+        content, a system instruction or inline per PROMPT_CACHE_MODE.
+        """
+        if instruction and self.prompt_cache_mode == "off":
+            contents, instruction = instruction + contents, None
+        instruction_tokens = estimate_tokens(instruction) if instruction else 0
+        estimated = estimate_tokens(contents) + instruction_tokens
+        retrying = AsyncRetrying(
+            retry=retry_if_exception(is_transient),
+            wait=wait_random_exponential(multiplier=0.5, max=GEMINI_RETRY_MAX_WAIT),
+            stop=stop_after_attempt(GEMINI_MAX_ATTEMPTS) | stop_after_delay(GEMINI_RETRY_DEADLINE),
+            before_sleep=functools.partial(self._before_retry, model_name),
+            reraise=True,
+        )
+        async for attempt in retrying:
+            with attempt:
+                await self.semaphore.acquire(priority)
+                try:
+                    cached = None
+                    if instruction and self.prompt_cache_mode == "explicit":
+                        cached = await self.prompts.lookup(model_name, instruction, instruction_tokens)
+                    response = await self._hedged_attempt(contents, estimated, model_name, thinking_budget,
+                                                          instruction, cached)
+                except errors.ClientError as e:
+                    if cached and e.code in (403, 404):
+                        # The cache expired or was deleted early; retry with a new one or uncached
+                        self.prompts.invalidate(model_name, cached)
+                        raise StaleCachedContent(cached) from e
+                    raise
+                finally:
+                    self.semaphore.release()
+
+        usage_metadata = response.usage_metadata
+        if usage_metadata is not None and usage_metadata.total_token_count:
+            self.limiters[model_name].settle(estimated, usage_metadata.total_token_count)
+        if usage is not None:
+            usage.add(usage_metadata)
+        if usage_metadata is not None:
+            for kind, count in (("prompt", usage_metadata.prompt_token_count),
+                                ("cached", usage_metadata.cached_content_token_count),
+                                ("output", usage_metadata.candidates_token_count),
+                                ("thinking", usage_metadata.thoughts_token_count)):
+                GEMINI_TOKENS.inc(count or 0, kind=kind, model=model_name)
+        return response.text
+
+    async def _attempt(self, contents: str, estimated: int, model_name: str, thinking_budget: int,
+                       instruction: str = None, cached: str = None):
+        await self.limiters[model_name].acquire(estimated)
+        self.attempts += 1
+        started = time.monotonic()
+        try:
+            with IN_FLIGHT.track(kind="gemini_call"), timed("llm_call"):
+                response = await asyncio.wait_for(
+                    self.client.aio.models.generate_content(
+                        model=model_name,
+                        contents=contents,
+                        config=types.GenerateContentConfig(
+                            thinking_config=types.ThinkingConfig(thinking_budget=thinking_budget),
+                            cached_content=cached,
+                            system_instruction=None if cached else instruction,
+                        ),
+                    ),
+                    GEMINI_CALL_TIMEOUT,
+                )
+        except asyncio.CancelledError:
+            GEMINI_CALLS.inc(outcome="cancelled", model=model_name)
+            raise
+        except Exception as e:
+            GEMINI_CALLS.inc(outcome="error", model=model_name)
+            UPSTREAM_ERRORS.inc(service="gemini", error=str(getattr(e, "code", None) or type(e).__name__))
+            raise
+        elapsed = time.monotonic() - started
+        GEMINI_CALLS.inc(outcome="ok", model=model_name)
+        GEMINI_SECONDS.observe(elapsed, model=model_name)
+        self.latencies[model_name].append(elapsed)
+        return response
+
+    def hedge_delay(self, model_name: str = MODEL_NAME):
+        """Latency percentile of model_name after which an attempt is hedged, or None."""
+        latencies = self.latencies[model_name]
+        if GEMINI_HEDGE_PERCENTILE <= 0 or len(latencies) < GEMINI_HEDGE_MIN_SAMPLES:
+            return None
+        if self.hedges >= GEMINI_HEDGE_MAX_RATIO * self.attempts:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * GEMINI_HEDGE_PERCENTILE / 100))]
+
+    async def _hedged_attempt(self, contents: str, estimated: int, model_name: str, thinking_budget: int,
+                              instruction: str = None, cached: str = None):
+        attempt = functools.partial(self._attempt, contents, estimated, model_name, thinking_budget, instruction, cached)
+        primary = asyncio.ensure_future(attempt())
+        delay = self.hedge_delay(model_name)
+        if delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        # The hedge needs a concurrency slot of its own and never waits for one
+        if not self.semaphore.try_acquire():
+            GEMINI_CALLS.inc(outcome="hedge_skipped", model=model_name)
+            return await primary
+
+        self.hedges += 1
+        GEMINI_CALLS.inc(outcome="hedge", model=model_name)
+        hedge = asyncio.ensure_future(attempt())
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            return primary.result()
+        finally:
+            # The slower call is abandoned; it may still be billed
+            primary.cancel()
+            hedge.cancel()
+            self.semaphore.release()
+
+    def _before_retry(self, model_name, retry_state):
+        self.retries += 1
+        error = retry_state.outcome.exception()
+        pause = retry_after(error)
+        if pause:
+            self.limiters[model_name].pause(pause)
+        GEMINI_CALLS.inc(outcome="retry", model=model_name)
+        logger.warning(f"Retrying Gemini call (attempt {retry_state.attempt_number}): {error!r}")
+
+    def run(self, coro, timeout=None):
+        """
+        Run coro on the engine loop and block until it finishes.
+        For synchronous callers only; never call this from the engine loop.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def submit(self, coro):
+        """Await coro on the engine loop from any other event loop."""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+
+_engine = None
+_engine_lock = threading.Lock()
+_client = None
+
+
+def preload():
+    """
+    Create the genai client ahead of time, e.g. in a gunicorn master with
+    preload_app, so forked workers share it instead of each building one.
+    """
+    global _client
+    load_dotenv()
+    if _client is None:
+        _client = genai.Client()
+
+
+def get_engine() -> ScoringEngine:
+    """The process-wide engine, created on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ScoringEngine(client=_client)
+    return _engine
+
+
+def _reset_after_fork():
+    # The engine's loop thread does not survive fork; children build their own
+    global _engine, _engine_lock
+    _engine = None
+    _engine_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,134 @@
+"""
+PDF text extraction.
+
+Small documents are extracted serially in the calling thread. Larger ones
+are split into page ranges that a shared process pool extracts in parallel,
+each worker opening the document from the same file path, so big scanned or
+image-heavy PDFs do not hold a Flask worker's GIL for seconds.
+"""
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz
+
+from constants import EXTRACTION_WORKERS, EXTRACTION_MIN_PARALLEL_PAGES, EXTRACTION_MAX_PAGES, EXTRACTION_TIMEOUT
+
+
+class ExtractionError(Exception):
+    """The PDF could not be extracted within the page-count or time limits."""
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # spawn rather than fork: the parent runs the scoring engine's event
+    # loop thread, which must not be duplicated into children
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _reset_pool(pool: ProcessPoolExecutor):
+    """
+    Replace pool, unless another caller already did, and kill its workers:
+    a worker stuck in fitz would otherwise keep its process and CPU forever.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        _pool = None
+    # Copied first, shutdown() lets the executor forget its processes
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+def _extract_range(pdf_path: str, start: int, stop: int) -> list[str]:
+    with fitz.open(pdf_path) as doc:
+        return [doc[i].get_text() for i in range(start, stop)]
+
+
+def _page_ranges(page_count: int, chunks: int) -> list[tuple[int, int]]:
+    size = -(-page_count // chunks)
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def extract_front(pdf, pages: int, min_words: int = 0,
+                  max_pages=EXTRACTION_MAX_PAGES) -> tuple[list[str], int]:
+    """
+    Text of the first pages of a PDF (file path or bytes), read until both
+    pages pages and min_words words are reached, and its page count. The
+    other pages are not read.
+
+    Raises:
+        ExtractionError: more than max_pages pages
+    """
+    doc = fitz.open(pdf) if isinstance(pdf, str) else fitz.open(stream=pdf, filetype="pdf")
+    with doc:
+        if doc.page_count > max_pages:
+            raise ExtractionError(f"PDF has {doc.page_count} pages, limit is {max_pages}")
+        texts, words = [], 0
+        for page in doc:
+            if len(texts) >= pages and words >= min_words:
+                break
+            texts.append(page.get_text())
+            words += len(texts[-1].split())
+        return texts, doc.page_count
+
+
+def extract_pages(pdf, workers=EXTRACTION_WORKERS, max_pages=EXTRACTION_MAX_PAGES,
+                  timeout=EXTRACTION_TIMEOUT) -> list[str]:
+    """
+    Ordered per-page text of a PDF given as a file path or as bytes.
+    Only file paths are extracted in parallel; bytes are always serial.
+
+    Raises:
+        ExtractionError: more than max_pages pages, or slower than timeout seconds
+    """
+    deadline = time.monotonic() + timeout
+    doc = fitz.open(pdf) if isinstance(pdf, str) else fitz.open(stream=pdf, filetype="pdf")
+    with doc:
+        page_count = doc.page_count
+        if page_count > max_pages:
+            raise ExtractionError(f"PDF has {page_count} pages, limit is {max_pages}")
+
+        if not isinstance(pdf, str) or workers <= 1 or page_count < EXTRACTION_MIN_PARALLEL_PAGES:
+            pages = []
+            for page in doc:
+                if time.monotonic() > deadline:
+                    raise ExtractionError(f"Extraction exceeded {timeout}s")
+                pages.append(page.get_text())
+            return pages
+
+    # Twice as many ranges as workers evens out pages of uneven cost
+    pool = _get_pool()
+    futures = [pool.submit(_extract_range, pdf, start, stop)
+               for start, stop in _page_ranges(page_count, workers * 2)]
+    pages = []
+    try:
+        for future in futures:
+            pages.extend(future.result(timeout=max(0.0, deadline - time.monotonic())))
+    except FutureTimeoutError:
+        # Workers stuck on a pathological page cannot be interrupted; kill
+        # them and start a fresh pool for later requests.
+        _reset_pool(pool)
+        raise ExtractionError(f"Extraction exceeded {timeout}s")
+    except BrokenProcessPool:
+        # Another request's timeout killed the pool under this one
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ExtractionError(f"Extraction exceeded {timeout}s")
+        return extract_pages(pdf, workers, max_pages, remaining)
+    return pages
@@ -0,0 +1,126 @@
+"""
+Content-addressed store of extracted PDF text.
+
+Each PDF is extracted once and stored by the sha256 of its bytes as per-page
+text plus metadata. arXiv ids, PDF URLs and upload ids are kept as aliases
+of that hash, so /process-arxiv, /upload-pdf and /score can all find an
+earlier extraction without downloading or parsing the PDF again. The hash
+doubles as the text handle returned to clients in place of the full text.
+
+While an upload is extracted in the background, a partial extraction of its
+first pages stands in for it (see put_front()). get_front() returns either,
+and get(wait=...) waits for the full extraction while a partial one exists.
+"""
+
+import time
+from typing import Iterable, Optional
+
+from diskcache import Cache
+
+from constants import EXTRACTION_STORE_DIR, EXTRACTION_STORE_MAX_BYTES, EXTRACTION_TIMEOUT
+from extraction import extract_pages
+from metrics import timed
+
+DOC_PREFIX = "doc:"
+ALIAS_PREFIX = "alias:"
+FRONT_PREFIX = "front:"
+
+
+def full_text(extraction: dict) -> str:
+    return "".join(extraction['pages'])
+
+
+def excerpt(extraction: dict, max_words: int = 400) -> str:
+    """The first max_words words of the document, reading only the pages needed."""
+    words = []
+    for page_text in extraction['pages']:
+        words.extend(page_text.split())
+        if len(words) >= max_words:
+            break
+    return " ".join(words[:max_words])
+
+
+class ExtractionStore:
+    def __init__(self, directory=EXTRACTION_STORE_DIR, size_limit=EXTRACTION_STORE_MAX_BYTES):
+        self.cache = Cache(directory, size_limit=size_limit)
+
+    def _resolve(self, handle: str) -> str:
+        """Content hash of a text handle or alias."""
+        if DOC_PREFIX + handle in self.cache or FRONT_PREFIX + handle in self.cache:
+            return handle
+        return self.cache.get(ALIAS_PREFIX + handle, handle)
+
+    def get(self, handle: str, wait: float = 0) -> Optional[dict]:
+        """
+        Look up an extraction by text handle (content hash) or alias. With
+        wait, a full extraction still running in the background is waited
+        for up to wait seconds.
+        """
+        sha256 = self._resolve(handle)
+        deadline = time.monotonic() + wait
+        while True:
+            extraction = self.cache.get(DOC_PREFIX + sha256)
+            if (extraction is not None or time.monotonic() >= deadline
+                    or FRONT_PREFIX + sha256 not in self.cache):
+                return extraction
+            time.sleep(0.1)
+
+    def get_front(self, handle: str) -> Optional[dict]:
+        """The full extraction if there is one, else the partial one of an upload in progress."""
+        sha256 = self._resolve(handle)
+        return self.cache.get(DOC_PREFIX + sha256) or self.cache.get(FRONT_PREFIX + sha256)
+
+    def add_aliases(self, sha256: str, aliases: Iterable[str]):
+        for alias in aliases:
+            if alias:
+                self.cache.set(ALIAS_PREFIX + alias, sha256)
+
+    def put(self, sha256: str, pages: list[str], aliases: Iterable[str] = (), metadata: dict = None) -> dict:
+        extraction = {
+            'text_handle': sha256,
+            'pages': pages,
+            'page_count': len(pages),
+            'text_length': sum(len(p) for p in pages),
+            'metadata': metadata or {},
+            'extracted_at': time.time(),
+        }
+        self.cache.set(DOC_PREFIX + sha256, extraction)
+        self.add_aliases(sha256, aliases)
+        return extraction
+
+    def put_front(self, sha256: str, pages: list[str], page_count: int, aliases: Iterable[str] = (),
+                  metadata: dict = None, ttl: float = 2 * EXTRACTION_TIMEOUT) -> dict:
+        """
+        Store the first pages of a document whose full extraction runs in the
+        background, marked 'partial'. It lapses after ttl seconds, so a
+        process dying mid-extraction does not leave waiters hanging.
+        """
+        extraction = {
+            'text_handle': sha256,
+            'pages': pages,
+            'page_count': page_count,
+            'text_length': None,
+            'metadata': metadata or {},
+            'extracted_at': time.time(),
+            'partial': True,
+        }
+        self.cache.set(FRONT_PREFIX + sha256, extraction, expire=ttl)
+        self.add_aliases(sha256, aliases)
+        return extraction
+
+    def drop_front(self, sha256: str):
+        """Remove the partial extraction, once the full one is stored or has failed."""
+        self.cache.delete(FRONT_PREFIX + sha256)
+
+    def extract(self, pdf, sha256: str, aliases: Iterable[str] = (), metadata: dict = None) -> dict:
+        """
+        Return the stored extraction for sha256, parsing pdf (path or bytes)
+        only if this content has not been seen before.
+        """
+        extraction = self.cache.get(DOC_PREFIX + sha256)
+        if extraction is not None:
+            self.add_aliases(sha256, aliases)
+            return extraction
+        with timed("extraction"):
+            pages = extract_pages(pdf)
+        return self.put(sha256, pages, aliases, metadata)
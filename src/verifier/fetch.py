@@ -0,0 +1,156 @@
+"""
+PDF download layer.
+
+PDFs are streamed through a pooled keep-alive session straight into a local
+blob store, one file per URL, with a size cap enforced while streaming. The
+stored ETag/Last-Modified headers turn repeat downloads into conditional
+requests, and callers open the stored file with fitz instead of holding the
+bytes in memory.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from constants import PDF_STORE_DIR, PDF_STORE_MAX_BYTES, PDF_MAX_BYTES, PDF_FETCH_TIMEOUT, HTTP_POOL_SIZE
+from log import get_logger
+from metrics import UPSTREAM_ERRORS, timed
+
+logger = get_logger(__name__)
+
+CHUNK_SIZE = 1 << 16
+
+
+class PdfBlob(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+
+
+def _make_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = "VeriXiv/1.0"
+    return session
+
+
+session = _make_session()
+
+
+def _blob_paths(pdf_url: str):
+    name = hashlib.sha256(pdf_url.encode("utf-8")).hexdigest()
+    return os.path.join(PDF_STORE_DIR, f"{name}.pdf"), os.path.join(PDF_STORE_DIR, f"{name}.json")
+
+
+def _read_meta(meta_path: str) -> Optional[dict]:
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path: str, data: str):
+    fd, tmp_path = tempfile.mkstemp(dir=PDF_STORE_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+@timed("download")
+def fetch_pdf(pdf_url: str, max_bytes: int = PDF_MAX_BYTES) -> Optional[PdfBlob]:
+    """
+    Download pdf_url into the blob store and return the stored file.
+    Returns None on HTTP errors, network errors or bodies above max_bytes.
+    """
+    os.makedirs(PDF_STORE_DIR, exist_ok=True)
+    pdf_path, meta_path = _blob_paths(pdf_url)
+
+    headers = {}
+    meta = _read_meta(meta_path)
+    if meta is not None and os.path.exists(pdf_path):
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    tmp_path = None
+    try:
+        with session.get(pdf_url, headers=headers, stream=True, timeout=PDF_FETCH_TIMEOUT) as response:
+            if response.status_code == 304 and headers:
+                logger.info(f"PDF not modified, using stored copy: {pdf_url}")
+                os.utime(pdf_path)
+                return PdfBlob(pdf_path, meta["sha256"], meta["size"])
+
+            if response.status_code != 200:
+                logger.warning(f"Error downloading PDF from {pdf_url}: HTTP {response.status_code}")
+                UPSTREAM_ERRORS.inc(service="pdf", error=f"http_{response.status_code}")
+                return None
+
+            content_length = int(response.headers.get("Content-Length") or 0)
+            if content_length > max_bytes:
+                logger.warning(f"Error downloading PDF from {pdf_url}: {content_length} bytes exceeds limit")
+                return None
+
+            digest = hashlib.sha256()
+            size = 0
+            fd, tmp_path = tempfile.mkstemp(dir=PDF_STORE_DIR, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        logger.warning(f"Error downloading PDF from {pdf_url}: body exceeds {max_bytes} bytes")
+                        return None
+                    digest.update(chunk)
+                    f.write(chunk)
+
+            os.replace(tmp_path, pdf_path)
+            tmp_path = None
+            meta = {
+                "url": pdf_url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "sha256": digest.hexdigest(),
+                "size": size,
+            }
+            _write_atomic(meta_path, json.dumps(meta))
+    except requests.RequestException as e:
+        logger.warning(f"Error downloading PDF from {pdf_url}: {e}")
+        UPSTREAM_ERRORS.inc(service="pdf", error=type(e).__name__)
+        return None
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    logger.info(f"Downloaded PDF from: {pdf_url}")
+    prune_store()
+    return PdfBlob(pdf_path, meta["sha256"], meta["size"])
+
+
+def prune_store(max_bytes: int = PDF_STORE_MAX_BYTES):
+    """Delete least recently used PDFs until the store fits in max_bytes."""
+    entries = []
+    total = 0
+    with os.scandir(PDF_STORE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        for stale in (path, path[:-len(".pdf")] + ".json"):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+        total -= size
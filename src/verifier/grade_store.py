@@ -0,0 +1,296 @@
+"""
+Columnar store of final rubric grades, for cohort statistics.
+
+The score cache holds one pickled result dict per paper, so comparing a
+paper with its neighbors or its category would mean unpickling and walking
+every one of them. This store keeps the same grades as fixed-width columns
+in flat files that are memory-mapped with NumPy:
+
+    grades.u8       one row of uint8 grade codes per paper (VALID_VALUES order)
+    scores.f4       float32 graded_rubric_score per row
+    category.u2     uint16 code into categories.txt per row, 0 for none
+    ids.txt         one paper id per row, written last so a row only
+                    counts once its id line is complete
+
+Rows are only ever appended (under an flock, so all gunicorn workers can
+write); a paper that is re-graded gets a new row that supersedes the old
+one. Readers map the files read-only and pick up rows appended by other
+processes on the next call. Percentile ranks, completion rates and cohort
+comparisons are computed on whole columns at once.
+"""
+
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+import numpy as np
+
+from constants import GRADE_STORE_DIR
+from validator import NLP_REPRODUCABILITY_RUBRIC_FIELDS, VALID_VALUES
+
+MISSING = 255
+CODES = {grade: code for code, grade in enumerate(VALID_VALUES)}
+# Same points as endpoint.rubric_to_num; missing grades are NaN
+GRADE_POINTS = {"Complete": 1.0, "Partial": 0.5, "Not Present": 0.0, "Not Applicable": 1.0}
+POINTS_BY_CODE = np.full(256, np.nan, dtype=np.float32)
+for grade, points in GRADE_POINTS.items():
+    POINTS_BY_CODE[CODES[grade]] = points
+
+
+def encode(graded_rubric: dict[str, str], fields=NLP_REPRODUCABILITY_RUBRIC_FIELDS) -> np.ndarray:
+    return np.array([CODES.get(graded_rubric.get(field), MISSING) for field in fields], dtype=np.uint8)
+
+
+def percentile_rank(values, cohort) -> np.ndarray:
+    """
+    Percentile rank of each value within cohort, 0-100, ties counted half.
+    Broadcasts: values of shape (F,) against a cohort of shape (N, F) ranks
+    every column at once. NaNs in the cohort are ignored.
+    """
+    cohort = np.asarray(cohort, dtype=np.float32)
+    values = np.asarray(values, dtype=np.float32)
+    valid = ~np.isnan(cohort)
+    below = ((cohort < values) & valid).sum(axis=0)
+    equal = ((cohort == values) & valid).sum(axis=0)
+    counts = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, 100.0 * (below + 0.5 * equal) / counts, np.nan)
+
+
+def completion_rates(grades: np.ndarray) -> np.ndarray:
+    """
+    Share of rows with full points, per field. The aggregate maps 1 point
+    back to "Not Applicable", so stored grades are never "Complete".
+    """
+    if len(grades) == 0:
+        return np.full(grades.shape[1], np.nan)
+    return (POINTS_BY_CODE[grades] == 1.0).mean(axis=0)
+
+
+def mean_points(grades: np.ndarray) -> np.ndarray:
+    """Average rubric points per field, ignoring missing grades."""
+    points = POINTS_BY_CODE[grades]
+    counts = (~np.isnan(points)).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, np.nansum(points, axis=0) / counts, np.nan)
+
+
+def _rounded(values, digits=4) -> list:
+    """JSON-ready floats, NaN as None."""
+    return [None if np.isnan(v) else round(float(v), digits) for v in np.atleast_1d(values)]
+
+
+class GradeStore:
+    def __init__(self, directory=GRADE_STORE_DIR, fields=NLP_REPRODUCABILITY_RUBRIC_FIELDS):
+        self.directory = directory
+        self.fields = list(fields)
+        os.makedirs(directory, exist_ok=True)
+        self._path = lambda name: os.path.join(directory, name)
+        self._check_fields()
+
+        self._lock = threading.Lock()
+        self._ids = []
+        self._ids_offset = 0
+        self.index = {}
+        self._categories = []
+        self._category_codes = {}
+        self._grades = np.zeros((0, len(self.fields)), dtype=np.uint8)
+        self._scores = np.zeros(0, dtype=np.float32)
+        self._category = np.zeros(0, dtype=np.uint16)
+        self._latest = np.zeros(0, dtype=bool)
+
+    def _check_fields(self):
+        path = self._path("fields.json")
+        if not os.path.exists(path):
+            with open(path, "w") as f:
+                json.dump(self.fields, f)
+        with open(path) as f:
+            if json.load(f) != self.fields:
+                raise ValueError(f"{self.directory} was created for a different rubric")
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self._path("lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _map(self, name: str, dtype, rows: int, width: int = None):
+        shape = (rows, width) if width else (rows,)
+        if rows == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self._path(name), dtype=dtype, mode="r", shape=shape)
+
+    def _refresh(self):
+        """Pick up rows appended since the last call, by this or another process."""
+        try:
+            size = os.path.getsize(self._path("ids.txt"))
+        except FileNotFoundError:
+            return
+        if size == self._ids_offset:
+            return
+
+        with open(self._path("ids.txt"), "rb") as f:
+            f.seek(self._ids_offset)
+            data = f.read(size - self._ids_offset)
+        complete = data[:data.rfind(b"\n") + 1]
+        for paper_id in complete.decode("utf-8").splitlines():
+            self.index[paper_id] = len(self._ids)
+            self._ids.append(paper_id)
+        self._ids_offset += len(complete)
+
+        if os.path.exists(self._path("categories.txt")):
+            with open(self._path("categories.txt"), encoding="utf-8") as f:
+                self._categories = f.read().splitlines()
+            self._category_codes = {name: code + 1 for code, name in enumerate(self._categories)}
+
+        rows = len(self._ids)
+        self._grades = self._map("grades.u8", np.uint8, rows, len(self.fields))
+        self._scores = self._map("scores.f4", np.float32, rows)
+        self._category = self._map("category.u2", np.uint16, rows)
+        self._latest = np.zeros(rows, dtype=bool)
+        self._latest[np.fromiter(self.index.values(), dtype=np.int64, count=len(self.index))] = True
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self.index)
+
+    def __contains__(self, paper_id):
+        with self._lock:
+            self._refresh()
+            return paper_id in self.index
+
+    def _category_code(self, category: str) -> int:
+        code = self._category_codes.get(category)
+        if code is None:
+            with open(self._path("categories.txt"), "a", encoding="utf-8") as f:
+                f.write(category + "\n")
+            self._categories.append(category)
+            code = self._category_codes[category] = len(self._categories)
+        return code
+
+    def _unchanged(self, row: Optional[int], codes: np.ndarray, score: float, category: Optional[str]) -> bool:
+        if row is None:
+            return False
+        same_category = category is None or self._category_codes.get(category) == self._category[row]
+        return same_category and np.float32(score) == self._scores[row] and np.array_equal(codes, self._grades[row])
+
+    def add(self, paper_id: str, graded_rubric: dict[str, str], score: float, category: str = None) -> bool:
+        """
+        Record a paper's final grades. A no-op, without taking the file lock,
+        when the latest row already holds them. category defaults to the
+        paper's earlier category. Returns whether a row was appended.
+        """
+        codes = encode(graded_rubric, self.fields)
+        with self._lock:
+            self._refresh()
+            if self._unchanged(self.index.get(paper_id), codes, score, category):
+                return False
+
+            with self._file_lock():
+                self._refresh()
+                row = self.index.get(paper_id)
+                if self._unchanged(row, codes, score, category):
+                    return False
+                if category:
+                    category_code = self._category_code(category)
+                else:
+                    category_code = int(self._category[row]) if row is not None else 0
+
+                # Drop the tail of a write that died before its id line
+                rows = len(self._ids)
+                for name, width in (("grades.u8", len(self.fields)), ("scores.f4", 4), ("category.u2", 2)):
+                    path = self._path(name)
+                    if os.path.exists(path) and os.path.getsize(path) != rows * width:
+                        os.truncate(path, rows * width)
+
+                with open(self._path("grades.u8"), "ab") as f:
+                    f.write(codes.tobytes())
+                with open(self._path("scores.f4"), "ab") as f:
+                    f.write(np.float32(score).tobytes())
+                with open(self._path("category.u2"), "ab") as f:
+                    f.write(np.uint16(category_code).tobytes())
+                with open(self._path("ids.txt"), "ab") as f:
+                    f.write(paper_id.encode("utf-8") + b"\n")
+                self._refresh()
+        return True
+
+    def category(self, paper_id: str) -> Optional[str]:
+        with self._lock:
+            self._refresh()
+            row = self.index.get(paper_id)
+            if row is None or self._category[row] == 0:
+                return None
+            return self._categories[self._category[row] - 1]
+
+    def cohort(self, paper_ids: Iterable[str] = None, category: str = None, exclude: str = None):
+        """
+        Rows of the given papers, or of every paper in category, minus
+        exclude. Returns (rows, missing ids).
+        """
+        with self._lock:
+            self._refresh()
+            if paper_ids is not None:
+                paper_ids = [paper_id for paper_id in dict.fromkeys(paper_ids) if paper_id != exclude]
+                rows = np.array([self.index[p] for p in paper_ids if p in self.index], dtype=np.int64)
+                return rows, [p for p in paper_ids if p not in self.index]
+
+            code = self._category_codes.get(category)
+            if code is None:
+                return np.zeros(0, dtype=np.int64), []
+            mask = self._latest & (self._category == code)
+            if exclude in self.index:
+                mask[self.index[exclude]] = False
+            return np.flatnonzero(mask), []
+
+    def stats(self, rows: np.ndarray) -> dict:
+        """Score distribution and per-field rates over a cohort."""
+        with self._lock:
+            grades, scores = self._grades[rows], self._scores[rows]
+        quartiles = np.percentile(scores, [25, 50, 75]) if len(scores) else np.full(3, np.nan)
+        return {
+            "papers": len(rows),
+            "score_mean": _rounded(scores.mean() if len(scores) else np.nan)[0],
+            "score_quartiles": _rounded(quartiles),
+            "completion_rates": dict(zip(self.fields, _rounded(completion_rates(grades)))),
+        }
+
+    def compare(self, paper_id: str, rows: np.ndarray) -> Optional[dict]:
+        """
+        Where a paper stands in a cohort: the percentile rank of its score,
+        and per field its grade, its percentile rank by points and the
+        cohort's completion rate and mean points. None if the paper has no
+        grades stored.
+        """
+        with self._lock:
+            self._refresh()
+            row = self.index.get(paper_id)
+            if row is None:
+                return None
+            grades, score = self._grades[row], self._scores[row]
+            cohort_grades, cohort_scores = self._grades[rows], self._scores[rows]
+
+        field_ranks = percentile_rank(POINTS_BY_CODE[grades], POINTS_BY_CODE[cohort_grades])
+        return {
+            "paper_id": paper_id,
+            "score": round(float(score), 4),
+            "cohort_size": len(rows),
+            "percentile": _rounded(percentile_rank(score, cohort_scores))[0],
+            "fields": {
+                field: {
+                    "grade": VALID_VALUES[code] if code != MISSING else None,
+                    "percentile": rank,
+                    "cohort_completion_rate": rate,
+                    "cohort_mean_points": points,
+                }
+                for field, code, rank, rate, points in zip(
+                    self.fields, grades.tolist(), _rounded(field_ranks),
+                    _rounded(completion_rates(cohort_grades)), _rounded(mean_points(cohort_grades)))
+            },
+        }
@@ -0,0 +1,55 @@
+"""
+gunicorn settings for the production serving mode (see wsgi.py).
+
+Workers are threaded (gthread) because a request spends nearly all of its
+time waiting on Gemini; each worker process runs its own scoring engine,
+job workers and rate limiter. Tune with WEB_CONCURRENCY, GUNICORN_THREADS,
+GUNICORN_TIMEOUT and GUNICORN_GRACEFUL_TIMEOUT.
+"""
+
+import os
+import time
+
+from constants import GUNICORN_GRACEFUL_TIMEOUT, GUNICORN_THREADS, GUNICORN_TIMEOUT, WEB_CONCURRENCY
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 1919)}"
+workers = WEB_CONCURRENCY
+threads = GUNICORN_THREADS
+worker_class = "gthread"
+preload_app = True
+timeout = GUNICORN_TIMEOUT
+graceful_timeout = GUNICORN_GRACEFUL_TIMEOUT
+
+
+# Seconds of graceful_timeout kept back for the worker to exit after draining
+DRAIN_MARGIN = 5
+
+
+def post_fork(server, worker):
+    import endpoint
+    endpoint.start_background()
+
+    # init_process() installs handle_exit as the SIGTERM handler after this hook
+    handle_exit = worker.handle_exit
+
+    def start_draining(sig, frame):
+        # Report not ready while accepted requests still finish; the arbiter
+        # kills the worker graceful_timeout after this signal
+        worker.drain_deadline = time.monotonic() + graceful_timeout - DRAIN_MARGIN
+        endpoint.draining.set()
+        handle_exit(sig, frame)
+
+    worker.handle_exit = start_draining
+
+
+def worker_int(worker):
+    import endpoint
+    endpoint.draining.set()
+
+
+def worker_exit(server, worker):
+    # gthread finishes accepted requests first; then let jobs and Gemini calls
+    # drain in what is left of graceful_timeout
+    import endpoint
+    deadline = getattr(worker, "drain_deadline", time.monotonic() + graceful_timeout - DRAIN_MARGIN)
+    endpoint.drain(max(0.0, deadline - time.monotonic()))
@@ -0,0 +1,337 @@
+"""
+Persistent local job queue for cold scoring.
+
+Jobs and their per-page results live in a SQLite file, so no broker is
+needed and every gunicorn worker process can share the queue. Background
+threads claim queued jobs one at a time, lowest priority value first,
+checkpoint each scored page, and heartbeat while running. Jobs whose
+heartbeat goes stale (the process died or was restarted) are put back in
+the queue and resume from the pages already checkpointed. Checkpoints are
+handed to a writer thread, since they are saved from the scoring engine's
+loop and a write can wait on the database lock.
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+from constants import JOBS_DB_PATH, JOB_WORKERS, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS
+from log import get_logger
+from metrics import IN_FLIGHT
+
+logger = get_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    paper_id TEXT NOT NULL,
+    pdf_url TEXT NOT NULL,
+    cache_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    priority INTEGER NOT NULL DEFAULT 0,
+    run_after REAL NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_cache_key ON jobs (cache_key, status);
+CREATE TABLE IF NOT EXISTS job_pages (
+    job_id TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (job_id, page)
+);
+"""
+
+ACTIVE = ("queued", "running")
+
+
+class RetryLater(Exception):
+    """Raised by a handler to requeue its job for delay seconds, e.g. when scoring is overloaded."""
+
+    def __init__(self, delay: float, reason: str = ""):
+        super().__init__(reason or f"retry in {delay:.0f}s")
+        self.delay = delay
+
+
+class JobQueue:
+    def __init__(self, handler, path=JOBS_DB_PATH, lease_seconds=JOB_LEASE_SECONDS,
+                 max_attempts=JOB_MAX_ATTEMPTS, poll_interval=1.0):
+        """
+        Args:
+            handler: handler(job, done_pages, save_page) -> result dict, or None
+                if the job failed. done_pages maps 0-based page indices to
+                checkpointed results; save_page(index, result) checkpoints one.
+            path: SQLite database file
+            lease_seconds: a running job without a heartbeat for this long is requeued
+            max_attempts: jobs are marked failed after this many claims
+        """
+        self.handler = handler
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            # Databases from before job priorities and delayed retries
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "priority" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+            if "run_after" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN run_after REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, paper_id: str, pdf_url: str, cache_key: str, priority: int = 0) -> str:
+        """
+        Queue a scoring job, reusing an active job for the same cache key.
+        Jobs with lower priority values are claimed first; a reused job
+        takes the lower of the two.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE cache_key = ? AND status IN (?, ?) LIMIT 1",
+                (cache_key, *ACTIVE),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET priority = MIN(priority, ?) WHERE id = ?", (priority, row["id"]))
+                conn.execute("COMMIT")
+                return row["id"]
+
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, paper_id, pdf_url, cache_key, status, priority, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, paper_id, pdf_url, cache_key, priority, now, now),
+            )
+            conn.execute("COMMIT")
+        self._wakeup.set()
+        return job_id
+
+    def recover(self) -> list[str]:
+        """
+        Requeue every running job without waiting for its lease to expire,
+        returning their cache keys. Only safe when no other process works
+        this database.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT cache_key FROM jobs WHERE status = 'running'").fetchall()
+            conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+            conn.execute("COMMIT")
+        if rows:
+            self._wakeup.set()
+        return [row["cache_key"] for row in rows]
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Job row plus the number of checkpointed pages, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            pages_done = conn.execute(
+                "SELECT COUNT(*) FROM job_pages WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["pages_done"] = pages_done
+        return job
+
+    def statuses(self, job_ids) -> dict[str, int]:
+        """Number of jobs among job_ids in each status."""
+        job_ids = list(job_ids)
+        counts = {}
+        with self._connect() as conn:
+            # In chunks, below SQLite's limit on query parameters
+            for start in range(0, len(job_ids), 500):
+                chunk = job_ids[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT status, COUNT(*) AS n FROM jobs WHERE id IN ({', '.join('?' * len(chunk))}) "
+                    "GROUP BY status",
+                    chunk,
+                ).fetchall()
+                for row in rows:
+                    counts[row["status"]] = counts.get(row["status"], 0) + row["n"]
+        return counts
+
+    def _claim(self) -> Optional[dict]:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Requeue jobs abandoned by a dead or restarted process
+            conn.execute(
+                "UPDATE jobs SET status = 'queued' WHERE status = 'running' AND updated_at < ?",
+                (now - self.lease_seconds,),
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Too many attempts' "
+                "WHERE status = 'queued' AND attempts >= ?",
+                (self.max_attempts,),
+            )
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND run_after <= ? ORDER BY priority, created_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (now, row["id"]),
+                )
+            conn.execute("COMMIT")
+        return dict(row) if row is not None else None
+
+    def _done_pages(self, job_id: str) -> dict[int, dict]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT page, result FROM job_pages WHERE job_id = ?", (job_id,)).fetchall()
+        return {row["page"]: json.loads(row["result"]) for row in rows}
+
+    def _save_pages(self, job_id: str, pages: list[tuple[int, dict]]):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT OR REPLACE INTO job_pages (job_id, page, result) VALUES (?, ?, ?)",
+                [(job_id, page, json.dumps(result)) for page, result in pages],
+            )
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+            conn.execute("COMMIT")
+
+    def _checkpoint(self, job_id: str, pages: queue.Queue):
+        """Write the pages queued by save_page, a batch per transaction, until None is queued."""
+        while True:
+            batch = [pages.get()]
+            while not pages.empty():
+                batch.append(pages.get())
+            stopping = batch[-1] is None
+            batch = [page for page in batch if page is not None]
+            if batch:
+                try:
+                    self._save_pages(job_id, batch)
+                except sqlite3.Error as e:
+                    # The pages are scored again if the job has to resume
+                    logger.warning(f"Could not checkpoint {len(batch)} pages of job {job_id}: {e}")
+            if stopping:
+                return
+
+    def _requeue(self, job_id: str, delay: float):
+        """Put a running job back in the queue for delay seconds, without counting the attempt."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = attempts - 1, run_after = ?, updated_at = ? "
+                "WHERE id = ?",
+                (now + delay, now, job_id),
+            )
+
+    def _finish(self, job_id: str, status: str, result: dict = None, error: str = None):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+            conn.execute("DELETE FROM job_pages WHERE job_id = ?", (job_id,))
+            conn.execute("COMMIT")
+
+    def _heartbeat(self, job_id: str, stop: threading.Event):
+        while not stop.wait(self.lease_seconds / 3):
+            with self._connect() as conn:
+                conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def _run(self, job: dict):
+        stop = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job["id"], stop), daemon=True).start()
+        try:
+            done = self._done_pages(job["id"])
+            if done:
+                logger.info(f"Resuming job {job['id']} from {len(done)} checkpointed pages")
+            pages = queue.Queue()
+            writer = threading.Thread(target=self._checkpoint, args=(job["id"], pages), daemon=True)
+            writer.start()
+            try:
+                result = self.handler(job, done, lambda page, r: pages.put((page, r)))
+            finally:
+                # Every checkpoint is written before _finish() clears them
+                pages.put(None)
+                writer.join()
+            if result is None:
+                self._finish(job["id"], "failed", error="Failed to download PDF")
+            else:
+                self._finish(job["id"], "done", result=result)
+        except RetryLater as e:
+            logger.info(f"Job {job['id']} requeued for {e.delay:.0f}s: {e}")
+            self._requeue(job["id"], e.delay)
+        except Exception as e:
+            logger.exception(f"Job {job['id']} failed: {e}")
+            self._finish(job["id"], "failed", error=str(e))
+        finally:
+            stop.set()
+
+    def _work(self):
+        while not self._stopping.is_set():
+            job = self._claim()
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            with IN_FLIGHT.track(kind="job"):
+                self._run(job)
+
+    def start(self, workers: int = JOB_WORKERS):
+        """Start background worker threads (once per process, after any fork)."""
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = None) -> bool:
+        """
+        Stop claiming jobs and wait up to timeout seconds for running ones.
+        Returns False if some job was still running; it resumes from its
+        checkpoints once its lease expires.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        drained = not any(thread.is_alive() for thread in self._threads)
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        return drained
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads) and not self._stopping.is_set() and all(t.is_alive() for t in self._threads)
+
+    def ping(self) -> bool:
+        """Whether the queue database answers."""
+        try:
+            with self._connect() as conn:
+                conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
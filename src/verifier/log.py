@@ -0,0 +1,65 @@
+"""
+Non-blocking logging.
+
+Loggers from get_logger() hand records to an in-memory queue through a
+QueueHandler; a QueueListener thread formats them and writes them to stderr.
+Request threads and the scoring engine's event loop therefore never wait on
+terminal or pipe I/O. Forked children (gunicorn workers) start their own
+listener, since threads do not survive fork.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+from constants import LOG_LEVEL
+
+ROOT_LOGGER = "verixiv"
+
+_queue = queue.SimpleQueue()
+_listener = None
+
+
+def start_listener():
+    """Start the writer thread."""
+    global _listener
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(process)d %(levelname)s %(name)s: %(message)s"))
+    _listener = logging.handlers.QueueListener(_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_listener():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _configure():
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(logging.handlers.QueueHandler(_queue))
+    root.propagate = False
+    start_listener()
+    atexit.register(stop_listener)
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def _restart_after_fork():
+    global _listener
+    _listener = None
+    start_listener()
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+_configure()
@@ -0,0 +1,171 @@
+"""
+In-process metrics with a Prometheus text exposition for /metrics.
+
+Counters, gauges and histograms are plain thread-safe objects, so they can
+be updated from Flask threads, job workers and the scoring engine's event
+loop alike. timed(stage) records a pipeline stage both in the stage
+histogram and, when the calling thread is serving a request that called
+start_request(), in that request's timing breakdown. Every gunicorn worker
+process keeps its own metrics.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry = []
+_local = threading.local()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    @contextmanager
+    def track(self, **labels):
+        """Count the enclosed block as in flight."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_text(names, key + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram("verixiv_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+HTTP_REQUESTS = Counter("verixiv_http_requests_total", "HTTP requests by route and status", ["route", "status"])
+HTTP_SECONDS = Histogram("verixiv_http_request_seconds", "HTTP request latency by route", ["route"])
+IN_FLIGHT = Gauge("verixiv_in_flight", "Work currently in progress", ["kind"])
+CACHE_LOOKUPS = Counter("verixiv_cache_lookups_total", "Score cache lookups", ["tier", "result"])
+GEMINI_CALLS = Counter("verixiv_gemini_calls_total", "Gemini call attempts by outcome", ["outcome", "model"])
+GEMINI_SECONDS = Histogram("verixiv_gemini_call_seconds", "Latency of successful Gemini calls", ["model"])
+PROMPT_CACHE = Counter("verixiv_prompt_cache_total", "Context cache lookups and operations by outcome",
+                       ["model", "outcome"])
+GEMINI_TOKENS = Counter("verixiv_gemini_tokens_total", "Gemini tokens by kind", ["kind", "model"])
+UPSTREAM_ERRORS = Counter("verixiv_upstream_errors_total", "Errors from upstream services", ["service", "error"])
+VALIDATION_ERRORS = Counter("verixiv_validation_errors_total", "Errors reported by RubricValidator")
+PAGES_SCORED = Counter("verixiv_pages_total", "Pages by how they were graded", ["outcome"])
+CASCADE_PAGES = Counter("verixiv_cascade_pages_total", "Pages scored per cascade tier, and whether they escalated",
+                        ["tier", "outcome"])
+ADMISSION_QUEUED = Gauge("verixiv_admission_queued", "Papers waiting for a scoring slot by priority class",
+                         ["priority"])
+ADMISSION_WAIT_SECONDS = Histogram("verixiv_admission_wait_seconds",
+                                   "Time papers waited for a scoring slot by priority class", ["priority"])
+ADMISSION_DECISIONS = Counter("verixiv_admission_total", "Papers admitted, turned away or dropped by priority class",
+                              ["priority", "outcome"])
+
+
+def start_request():
+    """Begin collecting a timing breakdown for the current thread's request."""
+    _local.timings = {}
+
+
+def finish_request() -> dict[str, float]:
+    """Stop collecting and return the breakdown in seconds per stage."""
+    timings = getattr(_local, "timings", None) or {}
+    _local.timings = None
+    return timings
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = getattr(_local, "timings", None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
@@ -0,0 +1,139 @@
+"""
+Cheap local page relevance filter, run between extraction and scoring.
+
+Each page is matched against compiled patterns for the evidence each rubric
+field needs (code links, hardware, hyperparameters, data splits, ...), plus
+table density and reference-list detection. Pages that cannot carry rubric
+evidence -- bibliography pages, near-empty figure pages and pages with too
+few signals -- are skipped instead of being sent to Gemini. Skipped pages get
+an all "Not Present" result, which never raises the max-over-pages
+aggregate, so page references only ever point at pages that were graded.
+"""
+
+import re
+
+from constants import (PREFILTER_ENABLED, PREFILTER_MIN_CHARS, PREFILTER_MIN_FIELDS,
+                       PREFILTER_REFERENCE_RATIO, PREFILTER_TABLE_DENSITY)
+from validator import NLP_REPRODUCABILITY_RUBRIC_FIELDS
+
+FIELD_SIGNALS = {
+    "Model Description": r"\b(architecture|we propose|our (model|method|approach)|algorithm|encoder|decoder|loss function|objective)\b",
+    "Link to Code": r"(github\.com|gitlab\.com|bitbucket\.org|zenodo\.org|huggingface\.co|code is (publicly )?available|source code|our code)",
+    "Infrastructure": r"\b(GPUs?|TPUs?|A100|V100|H100|RTX|NVIDIA|CPUs?|cores|cluster)\b",
+    "Runtime": r"\b(runtime|run time|wall[- ]clock|GPU[- ]hours|training time|inference time|hours|minutes)\b",
+    "Parameters": r"(\b\d+(\.\d+)?\s?[MB]\b|\b(million|billion) parameters|\bparameters\b|#\s?params)",
+    "Validation Performance": r"\b(validation|dev(elopment)? set|held[- ]out)\b",
+    "Metrics": r"\b(accuracy|F1|precision|recall|BLEU|ROUGE|perplexity|exact match|AUC|metrics?|win rate|Elo)\b",
+    "Number of Training/Eval Runs": r"\b(random seeds?|seeds|runs|averaged over|repeated)\b",
+    "Hyperparameter Bounds": r"\b(search space|grid of|range of|sampled from)\b",
+    "Hyperparameter Best Config": r"\b(learning rate|batch size|epochs?|warm-?up|dropout|weight decay|optimizer|AdamW?|momentum)\b",
+    "Hyperparameter Search": r"\b(hyper-?parameter (search|tuning|sweep)|trials|sweeps?)\b",
+    "Hyperparameter Method": r"\b(grid search|random search|bayesian optimi[sz]ation|manual(ly)? tun|(selected|chosen) based on|early stopping)\b",
+    "Expected Performance": r"(±|\+/-|\bstd\b|standard deviation|variance|confidence interval|error bars?)",
+    "Data Statistics": r"\b(\d[\d,.]*[KM]? (examples|samples|instances|sentences|documents|tokens|images|pairs)|statistics)\b",
+    "Data Split": r"\b(train(ing)?/(dev|val|validation|test)|train(ing)? set|test set|splits?)\b",
+    "Data Processing": r"\b(pre-?process(ing|ed)?|tokeni[sz](ed|ation|er)|filter(ed|ing)|normali[sz](ed|ation)|deduplicat\w*)\b",
+    "Data Download": r"(dataset is (publicly )?available|data is (publicly )?available|download|huggingface\.co/datasets|kaggle)",
+    "New Data Description": r"\b(annotators?|annotation guidelines|crowd-?work\w*|Mechanical Turk|MTurk|inter-annotator|we collect(ed)?)\b",
+    "Data Languages": r"\b(English|Chinese|German|French|Spanish|Japanese|Arabic|Hindi|multilingual|languages?)\b",
+}
+FIELD_PATTERNS = {field: re.compile(pattern, re.IGNORECASE) for field, pattern in FIELD_SIGNALS.items()}
+
+REFERENCE_HEADING = re.compile(r"^\s*(\d+\.?\s*)?(references|bibliography)\s*$", re.IGNORECASE | re.MULTILINE)
+APPENDIX_HEADING = re.compile(r"^\s*(Appendix\b|APPENDIX\b|[A-H](\.\d+)?\s+[A-Z][A-Za-z ]{3,}$)", re.MULTILINE)
+CITATION_LINE = re.compile(
+    r"(^\s*\[\d+\]|\bet al\.|\barXiv\b|\bProceedings\b|\bdoi\b|\bIn\s+[A-Z][A-Za-z]+\s+\d{4}|\b(19|20)\d{2}[a-z]?\.)"
+)
+NUMBER_TOKEN = re.compile(r"^[\d.,%±+\-()]+$")
+INFORMATIVE_HEADING = re.compile(
+    r"^\s*([A-H]|\d+)?(\.\d+)*\.?\s*(methods?|methodology|approach|experiments?|experimental (setup|details)"
+    r"|implementation( details)?|training( details)?|hyper-?parameters?|(evaluation )?setup|reproducibility|datasets?)\b",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def classify_page(text: str) -> dict:
+    """
+    Signals for one page:
+        fields: rubric fields with at least one matching signal
+        reference_ratio: share of lines that look like bibliography entries
+        table_density: share of whitespace tokens that are numbers
+        chars: length of the stripped text
+    On reference pages, signals are only searched before the references
+    heading or after an appendix heading, so the titles of cited papers do
+    not count as evidence.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    reference_ratio = sum(bool(CITATION_LINE.search(line)) for line in lines) / len(lines) if lines else 0.0
+    heading = REFERENCE_HEADING.search(text)
+    if heading:
+        reference_ratio = max(reference_ratio, PREFILTER_REFERENCE_RATIO)
+
+    body = text
+    if reference_ratio >= PREFILTER_REFERENCE_RATIO:
+        references_start = heading.start() if heading else 0
+        appendix = APPENDIX_HEADING.search(text, heading.end() if heading else 0)
+        body = text[:references_start] + (text[appendix.start():] if appendix else "")
+
+    tokens = text.split()
+    return {
+        'fields': [field for field, pattern in FIELD_PATTERNS.items() if pattern.search(body)],
+        'reference_ratio': reference_ratio,
+        'table_density': sum(bool(NUMBER_TOKEN.match(t)) for t in tokens) / len(tokens) if tokens else 0.0,
+        'chars': len(text.strip()),
+    }
+
+
+def page_priority(text: str) -> int:
+    """
+    How likely a page is to settle rubric fields, higher first: its signal
+    count, plus a bonus for methods/experiments/hyperparameter sections and
+    for table-dense pages such as appendix hyperparameter tables.
+    """
+    page = classify_page(text)
+    priority = len(page['fields'])
+    if INFORMATIVE_HEADING.search(text):
+        priority += 5
+    if page['table_density'] >= PREFILTER_TABLE_DENSITY:
+        priority += 3
+    return priority
+
+
+def select_pages(pages_text: list[str], enabled: bool = PREFILTER_ENABLED):
+    """
+    Split pages into those worth scoring and those to skip.
+
+    Returns:
+        (keep, skipped): keep is a list of 0-based page indices, skipped maps
+        0-based page indices to the reason they were skipped
+    """
+    if not enabled:
+        return list(range(len(pages_text))), {}
+
+    keep, skipped = [], {}
+    for i, page_text in enumerate(pages_text):
+        page = classify_page(page_text)
+        if i == 0:
+            # Title/abstract page: cheap insurance for code links and model summaries
+            keep.append(i)
+        elif page['chars'] < PREFILTER_MIN_CHARS:
+            skipped[i] = "too little text"
+        elif page['reference_ratio'] >= PREFILTER_REFERENCE_RATIO and len(page['fields']) < PREFILTER_MIN_FIELDS:
+            skipped[i] = "reference list"
+        elif len(page['fields']) < PREFILTER_MIN_FIELDS and page['table_density'] < PREFILTER_TABLE_DENSITY:
+            skipped[i] = "no rubric signals"
+        else:
+            keep.append(i)
+
+    return keep, skipped
+
+
+def skipped_page_result(reason: str) -> dict:
+    """Stand-in page result for a skipped page, shaped like RubricValidator.validate()."""
+    return {
+        'valid': True,
+        'fields': {field: "Not Present" for field in NLP_REPRODUCABILITY_RUBRIC_FIELDS},
+        'errors': [],
+        'warnings': [],
+        'skipped': reason,
+    }
@@ -0,0 +1,75 @@
+"""
+Deterministic rule-based pre-scoring, run before the LLM.
+
+A handful of rubric fields can be settled from the page text alone: a code
+repository URL next to a "we release our code" phrase, a dataset download
+link, a GPU/TPU count and model, a parameter count, the language of the
+data. Each rule is a compiled pattern that only ever proves a field
+"Complete"; a field with no match is left for Gemini, so rules can miss
+evidence but never downgrade it. Fields resolved here are dropped from the
+prompt and get exact page references.
+"""
+
+import re
+
+from constants import PRESCORE_ENABLED
+
+WINDOW = 150
+
+PRESCORE_RULES = {
+    "Link to Code": (
+        r"\b(code|codebase|implementation|source|repository|scripts?)\b[^.]{0,%d}?"
+        r"https?://(www\.)?(github\.com|gitlab\.com|bitbucket\.org|codeberg\.org)/[\w.-]+/[\w.-]+" % WINDOW
+    ),
+    "Data Download": (
+        r"(https?://(www\.)?(huggingface\.co/datasets|zenodo\.org/records?|kaggle\.com/datasets)/[\w.-]+"
+        r"|\b(data(set)?s? (is|are) (publicly |freely )?available|download(ed)? (the|our) data(set)?)\b"
+        r"[^.]{0,%d}?https?://\S+)" % WINDOW
+    ),
+    "Infrastructure": (
+        r"\b(\d+|one|two|four|eight|sixteen)\s*(x\s*)?(NVIDIA\s+)?(Tesla\s+)?"
+        r"(A100|A6000|A40|A10G?|V100|H100|H200|L40S?|T4|P100|RTX\s?\d{4}|TPU\s?v\d\w*)\b"
+    ),
+    "Parameters": (
+        r"\b\d+(\.\d+)?\s?(M|B|million|billion)[- ]param(eter)?s?\b"
+        r"|\b(with|has|have|of|contains?)\s+\d[\d,.]*\s?(M|B|K|million|billion)?\s+(trainable\s+)?parameters\b"
+    ),
+    "Data Languages": (
+        r"\b(English|Chinese|Mandarin|German|French|Spanish|Japanese|Korean|Arabic|Hindi|Russian|Portuguese)"
+        r"(-language|\s+(language\s+)?)(data|datasets?|corpus|corpora|texts?|documents|sentences|speakers?|queries|questions)\b"
+    ),
+}
+PRESCORE_PATTERNS = {field: re.compile(pattern, re.IGNORECASE) for field, pattern in PRESCORE_RULES.items()}
+# Uppercase-only model names are matched case-sensitively to avoid e.g. "t4"
+PRESCORE_PATTERNS["Infrastructure"] = re.compile(PRESCORE_RULES["Infrastructure"])
+
+BROKEN_URL = re.compile(r"(https?:)\s+//")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Undo PDF line breaks inside URLs and collapse whitespace."""
+    return WHITESPACE.sub(" ", BROKEN_URL.sub(r"\1//", text))
+
+
+def prescore_pages(pages_text: list[str], page_indices=None, enabled: bool = PRESCORE_ENABLED) -> dict[str, list[int]]:
+    """
+    Fields proven "Complete" by the rules.
+
+    Args:
+        pages_text: per-page text
+        page_indices: 0-based pages to search (all pages if None)
+
+    Returns:
+        dict mapping each resolved field to the 0-based pages that prove it
+    """
+    if not enabled:
+        return {}
+
+    resolved = {}
+    for i in (range(len(pages_text)) if page_indices is None else page_indices):
+        text = normalize(pages_text[i])
+        for field, pattern in PRESCORE_PATTERNS.items():
+            if pattern.search(text):
+                resolved.setdefault(field, []).append(i)
+    return resolved
@@ -0,0 +1,152 @@
+"""
+Explicit Gemini context caches for the static scoring instructions.
+
+Every scoring request starts with the same rubric instructions (see
+prompts.build_prompt), which are most of the input tokens of a page call.
+PromptCache registers each distinct instruction block once per model as
+cached content, so calls send only the page text and the instruction
+tokens are billed at the cached rate. Caches are created with a TTL and
+have it extended when a call finds them close to expiry, so blocks that
+stop being used simply lapse.
+
+Creating and storing a cache costs money, so an instruction only gets one
+once it has been used PROMPT_CACHE_MIN_USES times (rare field subsets left
+by pre-scoring never do) and if it reaches the model's minimum cache size.
+Until then, or when caching is unavailable, lookup() returns None and the
+engine sends the instructions as a system instruction instead. A block the
+API refuses to cache (400, e.g. below the minimum size) is not tried again;
+after any other failed creation the model is not tried again for
+PROMPT_CACHE_RETRY_SECONDS.
+
+Each gunicorn worker process keeps its own caches.
+"""
+
+import asyncio
+import hashlib
+import time
+from typing import Optional
+
+from google.genai import errors, types
+
+from constants import (PROMPT_CACHE_MIN_TOKENS, PROMPT_CACHE_MIN_USES, PROMPT_CACHE_REFRESH_MARGIN,
+                       PROMPT_CACHE_RETRY_SECONDS, PROMPT_CACHE_TTL)
+from log import get_logger
+from metrics import PROMPT_CACHE
+
+logger = get_logger(__name__)
+
+
+class PromptCache:
+    """Cached content names per (model, instruction); use on the engine loop only."""
+
+    def __init__(self, client, ttl=PROMPT_CACHE_TTL, refresh_margin=PROMPT_CACHE_REFRESH_MARGIN,
+                 min_uses=PROMPT_CACHE_MIN_USES, min_tokens=PROMPT_CACHE_MIN_TOKENS,
+                 retry_seconds=PROMPT_CACHE_RETRY_SECONDS):
+        self.client = client
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.min_uses = min_uses
+        self.min_tokens = min_tokens
+        self.retry_seconds = retry_seconds
+        # key -> (cached content name, monotonic expiry)
+        self.entries = {}
+        self.uses = {}
+        self.refused = set()
+        self.unavailable_until = {}
+        self._locks = {}
+
+    @staticmethod
+    def key(model_name: str, instruction: str) -> tuple[str, str]:
+        return model_name, hashlib.sha256(instruction.encode("utf-8")).hexdigest()[:16]
+
+    def _fresh(self, key) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] - self.refresh_margin > time.monotonic():
+            return entry[0]
+        return None
+
+    async def lookup(self, model_name: str, instruction: str, estimated_tokens: int) -> Optional[str]:
+        """
+        Name of a live cached content holding instruction for model_name,
+        creating or refreshing it as needed, or None to send the
+        instruction uncached.
+        """
+        key = self.key(model_name, instruction)
+        name = self._fresh(key)
+        if name is not None:
+            PROMPT_CACHE.inc(model=model_name, outcome="hit")
+            return name
+
+        self.uses[key] = self.uses.get(key, 0) + 1
+        if self.uses[key] < self.min_uses or estimated_tokens < self.min_tokens or not self._cacheable(key):
+            PROMPT_CACHE.inc(model=model_name, outcome="uncached")
+            return None
+
+        # One create or refresh per key; concurrent callers wait for it
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            if not self._cacheable(key):
+                PROMPT_CACHE.inc(model=model_name, outcome="uncached")
+                return None
+            name = self._fresh(key)
+            if name is not None:
+                PROMPT_CACHE.inc(model=model_name, outcome="hit")
+                return name
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                name = await self._refresh(key)
+            return name or await self._create(key, instruction)
+
+    def _cacheable(self, key) -> bool:
+        return key not in self.refused and self.unavailable_until.get(key[0], 0) <= time.monotonic()
+
+    async def _refresh(self, key) -> Optional[str]:
+        name = self.entries[key][0]
+        try:
+            await self.client.aio.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s"))
+        except Exception as e:
+            # Deleted or expired meanwhile; a new one is created instead
+            logger.info(f"Could not refresh cached content {name}: {e!r}")
+            self.entries.pop(key, None)
+            return None
+        self.entries[key] = (name, time.monotonic() + self.ttl)
+        PROMPT_CACHE.inc(model=key[0], outcome="refreshed")
+        return name
+
+    async def _create(self, key, instruction: str) -> Optional[str]:
+        model_name = key[0]
+        try:
+            cached = await self.client.aio.caches.create(
+                model=model_name,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=instruction,
+                    display_name=f"verixiv-rubric-{key[1]}",
+                    ttl=f"{self.ttl}s",
+                ),
+            )
+        except errors.ClientError as e:
+            if e.code != 400:
+                return self._unavailable(model_name, e)
+            logger.info(f"Instructions {key[1]} not cacheable for {model_name}: {e!r}")
+            self.refused.add(key)
+            PROMPT_CACHE.inc(model=model_name, outcome="refused")
+            return None
+        except Exception as e:
+            return self._unavailable(model_name, e)
+        self.entries[key] = (cached.name, time.monotonic() + self.ttl)
+        PROMPT_CACHE.inc(model=model_name, outcome="created")
+        logger.info(f"Created cached content {cached.name} for {model_name}")
+        return cached.name
+
+    def _unavailable(self, model_name: str, error: Exception) -> None:
+        logger.warning(f"Context caching unavailable for {model_name}, sending instructions uncached "
+                       f"for {self.retry_seconds:.0f}s: {error!r}")
+        self.unavailable_until[model_name] = time.monotonic() + self.retry_seconds
+        PROMPT_CACHE.inc(model=model_name, outcome="failed")
+        return None
+
+    def invalidate(self, model_name: str, name: str):
+        """Forget a cached content the API no longer knows, e.g. after it expired early."""
+        for key, entry in list(self.entries.items()):
+            if key[0] == model_name and entry[0] == name:
+                del self.entries[key]
+                PROMPT_CACHE.inc(model=model_name, outcome="expired")
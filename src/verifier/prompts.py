@@ -5,6 +5,8 @@ Reproducibility in NLP: What Have We Learned from the Checklist?, Magnusson et.
 https://arxiv.org/pdf/2306.09562 
 """
 
+from functools import lru_cache
+
 BASIC_SCORE_PROMPT = \
 f"""Model Description - A clear description of the mathematical setting, algorithm, and/or model
 Link to Code - A link to a downloadable source code, with specification of all dependencies, including external libraries
@@ -33,7 +35,44 @@ New Data Description - For new data collected, a complete description of the dat
 Data Languages - For natural language data, the name of the language(s)
 """
 
-PROMPT = \
+EXAMPLE_EVALUATION = \
+"""Model Description: Complete
+Link to Code: Complete
+Infrastructure: Partial
+Runtime: Not Present
+Parameters: Complete
+Validation Performance: Complete
+Metrics: Complete
+Number of Training/Eval Runs: Partial
+Hyperparameter Bounds: Complete
+Hyperparameter Best Config: Partial
+Hyperparameter Search: Complete
+Hyperparameter Method: Complete
+Expected Performance: Complete
+Data Statistics: Complete
+Data Split: Complete
+Data Processing: Partial
+Data Download: Complete
+New Data Description: Not Applicable
+Data Languages: Complete
+"""
+
+
+def _only_fields(text: str, fields) -> str:
+    """Keep only the lines of a rubric listing that belong to fields (all if None)."""
+    if fields is None:
+        return text
+    return "".join(
+        line for line in text.splitlines(keepends=True)
+        if line.split(" - ", 1)[0].split(":", 1)[0] in fields
+    )
+
+
+def rubric_prompt(fields=None) -> str:
+    """Role, rubric, guidelines and example, restricted to fields when given."""
+    rubric = _only_fields(BASIC_SCORE_PROMPT + MULTIPLE_EXPERIMENT_SCORE_PROMPT + DATASET_SCORE_PROMPT, fields)
+    example = _only_fields(EXAMPLE_EVALUATION, fields)
+    return \
 f"""
 # Role
 
@@ -78,7 +117,7 @@ Assessment: This paper is thorough, but lacks some materials required for reprod
 
 ## RUBRIC:
 
-{BASIC_SCORE_PROMPT}{MULTIPLE_EXPERIMENT_SCORE_PROMPT}{DATASET_SCORE_PROMPT}
+{rubric}
 
 ---
 
@@ -96,32 +135,58 @@ Assessment: This paper is thorough, but lacks some materials required for reprod
 Here's an example of how to format your response:
 
 ```
-Model Description: Complete
-Link to Code: Complete
-Infrastructure: Partial
-Runtime: Not Present
-Parameters: Complete
-Validation Performance: Complete
-Metrics: Complete
-Number of Training/Eval Runs: Partial
-Hyperparameter Bounds: Complete
-Hyperparameter Best Config: Partial
-Hyperparameter Search: Complete
-Hyperparameter Method: Complete
-Expected Performance: Complete
-Data Statistics: Complete
-Data Split: Complete
-Data Processing: Partial
-Data Download: Complete
-New Data Description: Not Applicable
-Data Languages: Complete
-
+{example}
 Assessment: This paper demonstrates good reproducibility practices with 
 comprehensive model descriptions, code availability, and thorough experimental reporting. 
 Minor improvements could include runtime information and complete infrastructure details.
 ```
+"""
+
 
+PAGE_DELIMITER = "=== PAGE {page} ==="
+
+
+@lru_cache(maxsize=None)
+def build_prompt(fields: tuple = None, batched: bool = False) -> str:
+    """
+    The scoring prompt preamble, asking only about fields (a tuple of rubric
+    field names, all fields if None). batched selects the multi-page variant.
+    """
+    if not batched:
+        return \
+f"""{rubric_prompt(fields)}
 Now, please evaluate the provided paper.
 
 === PAPER BEGINS ===
-"""
\ No newline at end of file
+"""
+
+    return \
+f"""{rubric_prompt(fields)}
+## Multi-Page Input
+
+The paper text below has been split into several pages. Each page starts with a delimiter line of the form `{PAGE_DELIMITER.format(page="<n>")}`.
+
+Grade every page independently, using only the text of that page. For each page, first repeat its delimiter line exactly, then give the full rubric in the format above followed by the "Assessment" key for that page. Do not skip any page, even if it contains no relevant information.
+
+For example:
+
+```
+{PAGE_DELIMITER.format(page=3)}
+Model Description: Complete
+Link to Code: Not Present
+...
+Assessment: This page describes the model architecture but contains no experimental details.
+
+{PAGE_DELIMITER.format(page=4)}
+Model Description: Not Present
+...
+```
+
+Now, please evaluate the provided pages.
+
+=== PAPER BEGINS ===
+"""
+
+
+PROMPT = build_prompt()
+BATCH_PROMPT = build_prompt(batched=True)
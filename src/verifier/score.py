@@ -1,71 +1,393 @@
-from google import genai
-from google.genai import types
-from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-import os
+import asyncio
+import time
 
 from constants import *
-from prompts import PROMPT
-from validator import RubricValidator, NLP_REPRODUCABILITY_RUBRIC_FIELDS
+from engine import get_engine, estimate_tokens, TokenUsage, PRIORITY_NORMAL, PRIORITY_BACKGROUND
+from log import get_logger
+from metrics import CASCADE_PAGES, PAGES_SCORED, VALIDATION_ERRORS, timed
+from prefilter import page_priority
+from prompts import PAGE_DELIMITER, build_prompt
+from validator import RubricValidator, NLP_REPRODUCABILITY_RUBRIC_FIELDS, VALID_VALUES
 
+logger = get_logger(__name__)
 
-def score(paper_text: str, model_name: str) -> dict[str, str]:
-    load_dotenv()
+# Grades that already carry the maximum points in the max-over-pages aggregate
+SATURATED_GRADES = ("Complete", "Not Applicable")
 
-    client = genai.Client()
-    paper_tokens = client.models.count_tokens(
-        model=model_name, contents=paper_text
-    )
 
-    contents = PROMPT + paper_text
-    total_tokens = client.models.count_tokens(
-        model=model_name, contents=contents
-    )
+class RubricAggregator:
+    """Tracks, as page results arrive, which fields can still improve."""
+
+    def __init__(self, fields: list[str]):
+        self.open_fields = set(fields)
+
+    def add(self, page_fields: dict[str, str]):
+        for field, grade in page_fields.items():
+            if grade in SATURATED_GRADES:
+                self.open_fields.discard(field)
 
-    model_response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=contents,
-        config=types.GenerateContentConfig(
-            thinking_config=types.ThinkingConfig(thinking_budget=2000)
-        ),
-    ).text
-
-    validator = RubricValidator(NLP_REPRODUCABILITY_RUBRIC_FIELDS)
-    result = validator.validate(model_response)
-    result['paper_tokens'] = paper_tokens.total_tokens
-    result['total_tokens'] = total_tokens.total_tokens
-    
-    print(f"Valid: {result['valid']}")
-    print(f"Errors: {result['errors']}")
+    @property
+    def saturated(self) -> bool:
+        """No further page can change the aggregate grade."""
+        return not self.open_fields
+
+
+def gradable(result: dict) -> bool:
+    """
+    Whether a page result is a valid reply whose grades are all rubric
+    values. A reply missing the page's section or a field is not: the
+    validator fills those in as "Not Present", which the model never said.
+    Only gradable results are cached or checkpointed; any other reply is
+    asked for again on the next attempt.
+    """
+    return result['valid'] and all(grade in VALID_VALUES for field, grade in result['fields'].items()
+                                   if field.lower() != "assessment")
+
+
+def saturated_page_result() -> dict:
+    """Stand-in for a page left unscored because the rubric was already saturated."""
+    return {'valid': True, 'fields': {}, 'errors': [], 'warnings': [], 'skipped': "rubric saturated"}
+
+
+def failed_page_result(error: str) -> dict:
+    """Stand-in for a page whose scoring call failed after all retries."""
+    return {'valid': False, 'fields': {}, 'errors': [error], 'warnings': [], 'failed': True}
+
+
+async def score_async(paper_text: str, model_name: str, usage: TokenUsage = None,
+                      fields: list[str] = None, priority: int = PRIORITY_NORMAL,
+                      thinking_budget: int = GEMINI_THINKING_BUDGET) -> dict[str, str]:
+    """
+    Score one page (or a whole text) with a single request. When fields is
+    given, only those rubric fields are asked for and validated.
+    """
+    fields = fields or NLP_REPRODUCABILITY_RUBRIC_FIELDS
+    call_usage = TokenUsage()
+    model_response = await get_engine().generate(paper_text, call_usage, priority, model_name, thinking_budget,
+                                                 instruction=build_prompt(tuple(fields)))
+
+    validator = RubricValidator(fields)
+    with timed("validation"):
+        result = validator.validate(model_response)
+    VALIDATION_ERRORS.inc(len(result['errors']))
+    result['usage'] = call_usage.as_dict()
+    result['model'] = model_name
+    if usage is not None:
+        usage.merge(call_usage)
+
+    logger.debug(f"Valid: {result['valid']}, errors: {result['errors']}")
 
     return result
 
-def score_pages_concurrently(pages_text, model_name, max_workers=4):
+
+async def score_batch_async(pages_text: list[str], page_numbers: list[int], model_name: str,
+                            usage: TokenUsage = None, fields: list[str] = None,
+                            priority: int = PRIORITY_NORMAL, thinking_budget: int = GEMINI_THINKING_BUDGET) -> list[dict]:
+    """
+    Score several pages with a single request. Each page is sent under its
+    own PAGE_DELIMITER and the response is split back into one validated
+    result per page, in the order of page_numbers.
+    """
+    fields = fields or NLP_REPRODUCABILITY_RUBRIC_FIELDS
+    contents = ""
+    for page_number, page_text in zip(page_numbers, pages_text):
+        contents += f"\n{PAGE_DELIMITER.format(page=page_number)}\n{page_text}\n"
+
+    model_response = await get_engine().generate(contents, usage, priority, model_name, thinking_budget,
+                                                 instruction=build_prompt(tuple(fields), batched=True))
+
+    validator = RubricValidator(fields)
+    with timed("validation"):
+        results = validator.validate_pages(model_response, page_numbers)
+    VALIDATION_ERRORS.inc(sum(len(r['errors']) for r in results))
+    for result in results:
+        result['model'] = model_name
+
+    invalid = [n for n, r in zip(page_numbers, results) if not r['valid']]
+    logger.info(f"Scored pages {page_numbers}, invalid: {invalid}")
+
+    return results
+
+
+def pack_pages(pages_text, token_budget=PAGE_BATCH_TOKEN_BUDGET, max_pages=PAGE_BATCH_MAX_PAGES):
+    """
+    Greedily group pages, in the order given, into batches of indices into
+    pages_text whose estimated token count stays within token_budget. A page
+    larger than the budget gets a batch of its own. score_pages_async()
+    passes pages most informative first, so a batch's pages need not be
+    adjacent in the paper.
     """
-    Run score_paper() for each page concurrently using threads.
-    Preserves original page order.
+    batches = []
+    current, current_tokens = [], 0
+    for i, page_text in enumerate(pages_text):
+        page_tokens = estimate_tokens(page_text)
+        if current and (current_tokens + page_tokens > token_budget or len(current) >= max_pages):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += page_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def score_pages_async(pages_text, model_name, batched=PAGE_BATCHING,
+                            token_budget=PAGE_BATCH_TOKEN_BUDGET, max_pages=PAGE_BATCH_MAX_PAGES,
+                            usage: TokenUsage = None, done: dict = None, on_result=None,
+                            fields: list[str] = None, early_stop=SCORE_EARLY_STOP,
+                            collect_references=SCORE_COLLECT_REFERENCES,
+                            thinking_budget: int = GEMINI_THINKING_BUDGET, priority: int = PRIORITY_NORMAL):
     """
-    from score import score as score_paper  # local import to avoid circular deps
+    Score every page concurrently on the engine loop; results are returned
+    in original page order. Concurrency and rate are bounded by the shared
+    engine, not per call. Pages are submitted most informative first (see
+    prefilter.page_priority).
 
-    results = []
-    future_to_page = {}
+    With batched=True, pages are packed into token-budgeted batches and
+    each batch is scored by one score_batch_async() call instead.
+    Token usage of every request is accumulated into usage when given.
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        for i, page_text in enumerate(pages_text):
-            future = executor.submit(score_paper, page_text, model_name)
-            future_to_page[future] = i  # map the Future -> page index
+    done maps 0-based page indices to results from an earlier run; those
+    pages are not scored again. on_result(index, result) is called on the
+    engine loop for every newly scored, gradable() page, e.g. to checkpoint it.
+    fields narrows the rubric the model is asked about (all fields if None).
+    priority is the engine priority of the calls (see admission.py).
 
-        for future in as_completed(future_to_page):
-            i = future_to_page[future]  # retrieve the page index
-            try:
-                result = future.result()
-                results.append((i, result))
-            except Exception as e:
-                print(f"Error scoring page {i}: {e}")
-                results.append((i, None))
+    With early_stop, pending pages are cancelled once every field is
+    saturated, since they can no longer change the aggregate grades, and get
+    saturated_page_result(). With collect_references as well, those pages are
+    instead rescored at background priority, only to complete page references.
+
+    Pages whose call still fails after the engine's retries, and pages whose
+    reply is still not gradable() after one rescoring, get
+    failed_page_result(), so callers always receive one result per page and
+    only gradable results reach the aggregate.
+    """
+    aggregator = RubricAggregator(fields or NLP_REPRODUCABILITY_RUBRIC_FIELDS)
+    results = [None] * len(pages_text)
+    pending = []
+    for i in range(len(pages_text)):
+        if done and i in done and gradable(done[i]):
+            results[i] = done[i]
+            aggregator.add(done[i]['fields'])
+        else:
+            pending.append(i)
+    pending.sort(key=lambda i: page_priority(pages_text[i]), reverse=True)
 
-    # Sort results back to original order
-    results.sort(key=lambda x: x[0])
-    # Return only the results (not indices)
-    return [r for _, r in results]
\ No newline at end of file
+    def make_batches(indices):
+        if not batched:
+            return [[i] for i in indices]
+        return [[indices[j] for j in batch]
+                for batch in pack_pages([pages_text[i] for i in indices], token_budget, max_pages)]
+
+    async def score_one(batch, priority=priority):
+        if batched:
+            batch_result = await score_batch_async(
+                [pages_text[i] for i in batch], [i + 1 for i in batch], model_name, usage, fields, priority,
+                thinking_budget
+            )
+        else:
+            batch_result = [await score_async(pages_text[batch[0]], model_name, usage, fields, priority,
+                                              thinking_budget)]
+        for i, result in zip(batch, batch_result):
+            if not gradable(result):
+                ungradable[i] = "Ungradable reply: " + "; ".join(result['errors'] or ["grade outside the rubric"])
+                continue
+            results[i] = result
+            aggregator.add(result['fields'])
+            if on_result is not None:
+                on_result(i, result)
+
+    failed = {}
+    ungradable = {}
+
+    def report(batch, error):
+        if isinstance(error, Exception):
+            logger.error(f"Error scoring pages {[i + 1 for i in batch]}: {error!r}")
+            failed.update((i, repr(error)) for i in batch)
+
+    batches = [] if early_stop and aggregator.saturated else make_batches(pending)
+    tasks = {asyncio.ensure_future(score_one(batch)): batch for batch in batches}
+    unfinished = set(tasks)
+    while unfinished and not (early_stop and aggregator.saturated):
+        finished, unfinished = await asyncio.wait(unfinished, return_when=asyncio.FIRST_COMPLETED)
+        for task in finished:
+            report(tasks[task], task.exception())
+
+    if unfinished:
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+    left = [i for i in pending if results[i] is None and i not in failed]
+    if left and early_stop and aggregator.saturated:
+        logger.info(f"Rubric saturated, {'deferring' if collect_references else 'skipping'} pages {sorted(i + 1 for i in left)}")
+        if collect_references:
+            late = make_batches(left)
+            errors = await asyncio.gather(*(score_one(b, max(priority, PRIORITY_BACKGROUND)) for b in late), return_exceptions=True)
+            for batch, error in zip(late, errors):
+                report(batch, error)
+        for i in left:
+            if results[i] is None:
+                results[i] = saturated_page_result()
+    elif left:
+        # Pages whose reply was not gradable are asked for once more
+        logger.warning(f"Rescoring pages {sorted(i + 1 for i in left)} after ungradable replies")
+        retry = make_batches(left)
+        errors = await asyncio.gather(*(score_one(b) for b in retry), return_exceptions=True)
+        for batch, error in zip(retry, errors):
+            report(batch, error)
+    for i, error in (failed | ungradable).items():
+        if results[i] is None:
+            results[i] = failed_page_result(error)
+
+    for i in pending:
+        PAGES_SCORED.inc(outcome="failed" if results[i].get('failed') else
+                         "saturated" if results[i].get('skipped') else "scored")
+    return results
+
+
+def best_grade_pages(results: list[dict], field: str) -> tuple[str, list[int]]:
+    """
+    The class of a field's best grade over the pages ("saturated", "Partial"
+    or "Not Present") and the pages holding it, as the max-over-pages
+    aggregate sees them.
+    """
+    holders = {"saturated": [], "Partial": []}
+    for i, result in enumerate(results):
+        grade = result['fields'].get(field)
+        if grade in SATURATED_GRADES:
+            holders["saturated"].append(i)
+        elif grade == "Partial":
+            holders["Partial"].append(i)
+    for best in ("saturated", "Partial"):
+        if holders[best]:
+            return best, holders[best]
+    return "Not Present", []
+
+
+def pages_to_escalate(results: list[dict], scored: list[int], fields: list[str], rules,
+                      max_decisive=CASCADE_DECISIVE_MAX_PAGES) -> set[int]:
+    """
+    Pages among scored whose results a tier's escalate_on rules send to the
+    next tier (see MODEL_TIERS). Pages outside scored count towards the
+    best grades but are never escalated.
+    """
+    scored = set(scored)
+    escalate = set()
+    if "invalid" in rules:
+        escalate.update(i for i in scored if not results[i]['valid'])
+    for field in fields:
+        best, holders = best_grade_pages(results, field)
+        if ("ambiguous" in rules and best == "Partial"
+                or "decisive" in rules and 0 < len(holders) <= max_decisive):
+            escalate.update(scored.intersection(holders))
+    return escalate
+
+
+def usage_cost(usage: TokenUsage, tier: dict) -> float:
+    """Estimated USD cost of usage at the tier's prices."""
+    input_price = tier.get('input_price', 0)
+    return ((usage.prompt_tokens - usage.cached_tokens) * input_price
+            + usage.cached_tokens * tier.get('cached_price', input_price)
+            + (usage.output_tokens + usage.thinking_tokens) * tier.get('output_price', 0)) / 1e6
+
+
+async def score_pages_cascade_async(pages_text, tiers=MODEL_TIERS, batched=PAGE_BATCHING,
+                                    token_budget=PAGE_BATCH_TOKEN_BUDGET, max_pages=PAGE_BATCH_MAX_PAGES,
+                                    usage: TokenUsage = None, done: dict = None, on_result=None,
+                                    fields: list[str] = None, early_stop=SCORE_EARLY_STOP,
+                                    collect_references=SCORE_COLLECT_REFERENCES, tier_stats: dict = None,
+                                    priority: int = PRIORITY_NORMAL):
+    """
+    score_pages_async() through a model cascade: every page is scored by the
+    first tier, then each further tier rescores only the pages the previous
+    tier's escalate_on rules pick, plus pages left failed or unscored. Other
+    pages keep their earlier results, which count for early stopping as usual;
+    an escalated page whose rescoring fails or is skipped keeps its earlier
+    result too. Newly scored results name their tier under 'tier'. on_result
+    only sees final results, once a tier has decided not to escalate them,
+    so a resumed job never skips a page that was due for escalation.
+
+    tier_stats, when given, is filled per tier name with the model, pages
+    scored and escalated, seconds, token usage and estimated cost.
+    """
+    fields = fields or NLP_REPRODUCABILITY_RUBRIC_FIELDS
+    done = dict(done or {})
+    results, escalate = None, set()
+    for level, tier in enumerate(tiers):
+        tier_done = dict(done)
+        if results is not None:
+            tier_done.update((i, result) for i, result in enumerate(results)
+                             if i not in escalate and not result.get('failed') and not result.get('skipped'))
+        tier_usage = TokenUsage()
+        started = time.monotonic()
+        tier_results = await score_pages_async(
+            pages_text, tier['model'], batched, token_budget, max_pages, tier_usage, tier_done, None,
+            fields, early_stop, collect_references, tier.get('thinking_budget', GEMINI_THINKING_BUDGET), priority
+        )
+        seconds = time.monotonic() - started
+
+        kept = {i for i in escalate if tier_results[i].get('failed') or tier_results[i].get('skipped')}
+        for i in kept:
+            tier_results[i] = results[i]
+        scored = [i for i, result in enumerate(tier_results)
+                  if i not in tier_done and i not in kept and not result.get('failed') and not result.get('skipped')]
+        for i in scored:
+            tier_results[i]['tier'] = tier['name']
+        results = tier_results
+
+        last = level == len(tiers) - 1
+        escalate = set() if last else pages_to_escalate(results, scored, fields, tier.get('escalate_on', ()))
+        if on_result is not None:
+            for i in scored:
+                if i not in escalate and gradable(results[i]):
+                    on_result(i, results[i])
+        CASCADE_PAGES.inc(len(scored) - len(escalate), tier=tier['name'], outcome="final")
+        CASCADE_PAGES.inc(len(escalate), tier=tier['name'], outcome="escalated")
+        if usage is not None:
+            usage.merge(tier_usage)
+        if tier_stats is not None:
+            tier_stats[tier['name']] = {
+                "model": tier['model'],
+                "pages_scored": len(scored),
+                "pages_escalated": len(escalate),
+                "seconds": round(seconds, 3),
+                **tier_usage.as_dict(),
+                "cost_usd": round(usage_cost(tier_usage, tier), 6),
+            }
+        if escalate:
+            logger.info(f"Escalating pages {sorted(i + 1 for i in escalate)} from tier {tier['name']}")
+        else:
+            break
+    return results
+
+
+def score(paper_text: str, model_name: str, priority: int = PRIORITY_NORMAL) -> dict[str, str]:
+    return get_engine().run(score_async(paper_text, model_name, priority=priority))
+
+
+def score_batch(pages_text: list[str], page_numbers: list[int], model_name: str,
+                usage: TokenUsage = None) -> list[dict]:
+    return get_engine().run(score_batch_async(pages_text, page_numbers, model_name, usage))
+
+
+def score_pages_concurrently(pages_text, model_name, batched=PAGE_BATCHING,
+                             token_budget=PAGE_BATCH_TOKEN_BUDGET, max_pages=PAGE_BATCH_MAX_PAGES,
+                             usage: TokenUsage = None, done: dict = None, on_result=None,
+                             fields: list[str] = None, early_stop=SCORE_EARLY_STOP,
+                             collect_references=SCORE_COLLECT_REFERENCES, tiers: list[dict] = None,
+                             tier_stats: dict = None, priority: int = PRIORITY_NORMAL):
+    """
+    Blocking wrapper around score_pages_async() for the Flask endpoints.
+    With tiers, pages go through score_pages_cascade_async() instead and
+    model_name is unused.
+    """
+    if tiers:
+        return get_engine().run(
+            score_pages_cascade_async(pages_text, tiers, batched, token_budget, max_pages, usage, done, on_result,
+                                      fields, early_stop, collect_references, tier_stats, priority)
+        )
+    return get_engine().run(
+        score_pages_async(pages_text, model_name, batched, token_budget, max_pages, usage, done, on_result,
+                          fields, early_stop, collect_references, priority=priority)
+    )
@@ -0,0 +1,196 @@
+"""
+Versioned cache of scoring results.
+
+Keys combine the scoring version (model name plus a hash of the prompts and
+rubric fields), the scoring mode and the source (an arXiv id or a content
+hash), so changing any of them stops stale results from being served. A
+bounded in-process LRU sits in front of diskcache for hot papers; every
+process drops its LRU when the shared invalidation generation on disk
+changes, so an invalidation run anywhere stops hot results everywhere.
+
+Single page results are also kept, keyed by the scoring version and a hash
+of the normalized page text, so a new arXiv version or a re-uploaded PDF
+only sends the pages that changed to Gemini.
+
+Usage:
+    python score_cache.py --stats
+    python score_cache.py --invalidate gemini-2.5-flash@1a2b3c4d5e6f
+"""
+
+import argparse
+import hashlib
+import re
+import threading
+
+from cachetools import LRUCache
+from diskcache import Cache
+
+from constants import MODEL_NAME, SCORE_CACHE_DIR, SCORE_CACHE_HOT_SIZE, SCORE_PAGE_CACHE_TTL
+from metrics import CACHE_LOOKUPS, timed
+from prompts import PROMPT, BATCH_PROMPT
+from validator import NLP_REPRODUCABILITY_RUBRIC_FIELDS
+
+KEY_PREFIX = "score:"
+PAGE_PREFIX = "page:"
+# Bumped on disk by every invalidate()
+GENERATION_KEY = "generation"
+_MISSING = object()
+
+# The margin stamp arXiv adds to page 1 changes with every version
+ARXIV_STAMP = re.compile(r"arXiv:\d{4}\.\d{4,5}(v\d+)?\s*\[[^\]]*\]\s*\d{1,2}\s+[A-Z][a-z]{2}\s+\d{4}")
+WHITESPACE = re.compile(r"\s+")
+
+
+def prompt_version() -> str:
+    """Short hash of everything sent to the model besides the paper text."""
+    digest = hashlib.sha256()
+    for part in (PROMPT, BATCH_PROMPT, *NLP_REPRODUCABILITY_RUBRIC_FIELDS):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:12]
+
+
+def scoring_version(model_name: str = MODEL_NAME) -> str:
+    return f"{model_name}@{prompt_version()}"
+
+
+def text_source(text: str) -> str:
+    """Content-addressed source id for scoring raw text."""
+    return "sha256:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def page_source(text: str) -> str:
+    """
+    Hash of a page's text with the arXiv stamp removed and whitespace
+    collapsed, so re-extracted or re-versioned pages with the same content match.
+    """
+    normalized = WHITESPACE.sub(" ", ARXIV_STAMP.sub("", text)).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class ScoreCache:
+    """diskcache-backed result cache with an in-memory LRU hot tier."""
+
+    def __init__(self, directory=SCORE_CACHE_DIR, size_limit=1e9,
+                 hot_size=SCORE_CACHE_HOT_SIZE, model_name=MODEL_NAME):
+        self.disk = Cache(directory, size_limit=size_limit)
+        self.disk.create_tag_index()
+        self.hot = LRUCache(maxsize=hot_size)
+        self.version = scoring_version(model_name)
+        self._lock = threading.Lock()
+        self._generation = self.disk.get(GENERATION_KEY, 0)
+        self._stats = {"hot_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0}
+
+    def key(self, source: str, mode: str) -> str:
+        return f"{KEY_PREFIX}{self.version}:{mode}:{source}"
+
+    def _sync(self):
+        """Drop the hot tier if any process invalidated since the last check."""
+        generation = self.disk.get(GENERATION_KEY, 0)
+        with self._lock:
+            if generation != self._generation:
+                self.hot.clear()
+                self._generation = generation
+
+    def get(self, key, default=None):
+        self._sync()
+        with self._lock:
+            if key in self.hot:
+                self._stats["hot_hits"] += 1
+                CACHE_LOOKUPS.inc(tier="hot", result="hit")
+                return self.hot[key]
+
+        with timed("cache_get"):
+            value = self.disk.get(key, default)
+        with self._lock:
+            if value is default:
+                self._stats["misses"] += 1
+            else:
+                self._stats["disk_hits"] += 1
+                self.hot[key] = value
+        CACHE_LOOKUPS.inc(tier="disk", result="miss" if value is default else "hit")
+        return value
+
+    def set(self, key, value):
+        with timed("cache_set"):
+            self.disk.set(key, value, tag=self.version)
+        with self._lock:
+            self._stats["sets"] += 1
+            self.hot[key] = value
+
+    def __contains__(self, key):
+        self._sync()
+        with self._lock:
+            if key in self.hot:
+                return True
+        return key in self.disk
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def page_key(self, page_text: str) -> str:
+        return f"{PAGE_PREFIX}{self.version}:{page_source(page_text)}"
+
+    def get_page(self, page_text: str):
+        """Cached result for a page with this text, or None."""
+        value = self.disk.get(self.page_key(page_text))
+        CACHE_LOOKUPS.inc(tier="page", result="miss" if value is None else "hit")
+        return value
+
+    def set_page(self, page_text: str, page_result: dict, expire=SCORE_PAGE_CACHE_TTL):
+        self.disk.set(self.page_key(page_text), page_result, expire=expire, tag=self.version)
+
+    def versions(self) -> dict[str, int]:
+        """Number of cached results per scoring version (walks every key)."""
+        counts = {}
+        for key in self.disk.iterkeys():
+            if isinstance(key, str) and key.startswith(KEY_PREFIX):
+                version = key[len(KEY_PREFIX):].split(":", 1)[0]
+                counts[version] = counts.get(version, 0) + 1
+        return counts
+
+    def invalidate(self, version: str) -> int:
+        """
+        Drop every result cached under version. Returns the number removed.
+        Other processes drop their hot tier on their next lookup.
+        """
+        removed = self.disk.evict(version)
+        self.disk.incr(GENERATION_KEY, default=0)
+        prefix = f"{KEY_PREFIX}{version}:"
+        with self._lock:
+            for key in [k for k in self.hot if k.startswith(prefix)]:
+                del self.hot[key]
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["hot_entries"] = len(self.hot)
+        lookups = stats["hot_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hot_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["disk_entries"] = len(self.disk)
+        stats["disk_bytes"] = self.disk.volume()
+        stats["version"] = self.version
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the score cache.")
+    parser.add_argument("--dir", default=SCORE_CACHE_DIR)
+    parser.add_argument("--stats", action="store_true", help="print entries per scoring version")
+    parser.add_argument("--invalidate", metavar="VERSION", help="drop all results for a scoring version")
+    args = parser.parse_args()
+
+    score_cache = ScoreCache(args.dir)
+    if args.invalidate:
+        print(f"Removed {score_cache.invalidate(args.invalidate)} entries for {args.invalidate}")
+    if args.stats or not args.invalidate:
+        print(f"Current version: {score_cache.version}")
+        for version, count in sorted(score_cache.versions().items()):
+            print(f"{version} : {count}")
@@ -0,0 +1,129 @@
+"""
+Coalescing of concurrent cache misses.
+
+The first caller to miss on a key does the work; later callers for the same
+key wait for its result instead of repeating it. Threads of one process wait
+on an Event, other processes (e.g. gunicorn workers sharing the diskcache
+directory) see a lease stored in the cache and poll until the result lands.
+"""
+
+import threading
+import time
+import uuid
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+LEASE_PREFIX = "lease:"
+_MISSING = object()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run at most one computation per key across threads and processes."""
+
+    def __init__(self, cache, leases=None, lease_ttl=300, poll_interval=0.5, wait_timeout=900,
+                 should_cache=None):
+        """
+        Args:
+            cache: result cache shared by all worker processes
+            leases: diskcache.Cache holding the leases, defaults to cache
+            lease_ttl: seconds a lease survives without a heartbeat
+            poll_interval: seconds between cache checks while another process works
+            wait_timeout: give up waiting on another process and compute locally
+            should_cache: should_cache(result) -> False keeps a non-None result
+                (e.g. a partial one) out of the cache
+        """
+        self.cache = cache
+        self.leases = cache if leases is None else leases
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self.wait_timeout = wait_timeout
+        self.should_cache = should_cache
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """
+        Return (result, cached) for key, computing it with fn() on a miss.
+
+        Results are stored in the cache under key. A result of None (the
+        computation failed) is handed to waiting threads but never cached.
+        """
+        result = self.cache.get(key)
+        if result is not None:
+            return result, True
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result, cached = self._do_across_processes(key, fn)
+            return call.result, cached
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _do_across_processes(self, key, fn):
+        lease_key = LEASE_PREFIX + key
+        deadline = time.monotonic() + self.wait_timeout
+
+        while True:
+            # One lookup: the entry may be evicted between a check and a read
+            result = self.cache.get(key, _MISSING)
+            if result is not _MISSING:
+                return result, True
+
+            token = uuid.uuid4().hex
+            if self.leases.add(lease_key, token, expire=self.lease_ttl):
+                break
+
+            if time.monotonic() > deadline:
+                logger.warning(f"Timed out waiting on lease for {key}, computing locally.")
+                return fn(), False
+            time.sleep(self.poll_interval)
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(lease_key, stop), daemon=True
+        )
+        heartbeat.start()
+        try:
+            result = fn()
+            if result is not None and (self.should_cache is None or self.should_cache(result)):
+                self.cache[key] = result
+            return result, False
+        finally:
+            stop.set()
+            with self.leases.transact():
+                if self.leases.get(lease_key) == token:
+                    del self.leases[lease_key]
+
+    def release(self, key):
+        """Drop the lease on key, e.g. one left by a process that died holding it."""
+        self.leases.delete(LEASE_PREFIX + key)
+
+    def _heartbeat(self, lease_key, stop):
+        """Keep the lease alive while the computation runs."""
+        while not stop.wait(self.lease_ttl / 3):
+            self.leases.touch(lease_key, expire=self.lease_ttl)
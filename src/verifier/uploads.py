@@ -0,0 +1,106 @@
+"""
+Streaming intake of uploaded PDFs.
+
+Werkzeug writes each file of a multipart body to the stream returned by
+Request._get_file_stream(). UploadRequest returns an UploadFile there, so
+an uploaded PDF goes straight to a file under UPLOAD_DIR while the body is
+parsed, its sha256 is computed chunk by chunk, and bodies above
+UPLOAD_MAX_BYTES are refused with 413 mid-stream. The hash is the
+extraction store's content key, so a repeated upload is recognized before
+the PDF is opened at all.
+
+/upload-pdf then reads only the first UPLOAD_FRONT_PAGES pages for the
+title, abstract and excerpt (see front_matter()) and extracts the full text
+in the background. An UploadFile deletes its file when the request closes
+it, unless keep() handed the file over to that background extraction.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from constants import UPLOAD_DIR, UPLOAD_MAX_BYTES
+
+
+class UploadFile:
+    """Writable, readable upload file that hashes and size-checks what is written."""
+
+    def __init__(self, directory=UPLOAD_DIR, max_bytes=UPLOAD_MAX_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix=".pdf")
+        self._file = os.fdopen(fd, "w+b")
+        self._digest = hashlib.sha256()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.kept = False
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            # Never reaches request.files, so nothing else would close it
+            self.close()
+            raise RequestEntityTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+        self._digest.update(data)
+        return self._file.write(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def keep(self) -> str:
+        """Close the file and return its path; the caller now removes it."""
+        self._file.close()
+        self.kept = True
+        return self.path
+
+    def close(self):
+        self._file.close()
+        if not self.kept and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        # read, readline, seek, tell, ... for werkzeug's FileStorage
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadFile()
+
+
+def prune_uploads(max_age: float = 3600, directory=UPLOAD_DIR):
+    """Delete upload files older than max_age seconds, left by a process that died mid-extraction."""
+    if not os.path.isdir(directory):
+        return
+    cutoff = time.time() - max_age
+    with os.scandir(directory) as it:
+        for entry in it:
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def front_matter(pages: list[str], fallback_title: str) -> tuple[str, str]:
+    """
+    Title and abstract from the text of a paper's first pages: the title is
+    the first non-empty line, the abstract up to 10 lines after the one
+    mentioning "abstract", stopping at the introduction. The abstract is ""
+    if none is found.
+    """
+    lines = [line.strip() for line in "".join(pages).split("\n") if line.strip()]
+    title = lines[0] if lines else fallback_title
+
+    abstract_start = next((i + 1 for i, line in enumerate(lines) if "abstract" in line.lower()), -1)
+    abstract_lines = []
+    if 0 < abstract_start < len(lines):
+        for line in lines[abstract_start:abstract_start + 10]:
+            if "introduction" in line.lower() or line.startswith("1.") or line.startswith("I."):
+                break
+            abstract_lines.append(line)
+    return title, " ".join(abstract_lines)
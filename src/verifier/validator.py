@@ -1,6 +1,16 @@
 from typing import Dict, List, Optional
+import re
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
 VALID_VALUES = ["Complete", "Partial", "Not Present", "Not Applicable"]
 
+# Matches the page delimiter lines of prompts.BATCH_PROMPT, tolerating
+# markdown decoration the model sometimes adds around them.
+PAGE_DELIMITER_RE = re.compile(r"^[\s#*`]*=+\s*PAGE\s+(\d+)\s*=+[\s*`]*$", re.IGNORECASE | re.MULTILINE)
+
 class RubricValidator:
     """Validate and extract rubric assessments."""
     
@@ -29,7 +39,7 @@ class RubricValidator:
                     field, value = parts
                     fields[field.strip()] = value.strip()
         except Exception as e:
-            print(f"Warning: Error extracting fields: {e}")
+            logger.warning(f"Error extracting fields: {e}")
         
         return fields
     
@@ -80,13 +90,41 @@ class RubricValidator:
             'warnings': warnings
         }
     
+    def split_pages(self, text: str) -> Dict[int, str]:
+        """Split a multi-page response into {page number: rubric block}."""
+        if not text:
+            return {}
+
+        sections = {}
+        matches = list(PAGE_DELIMITER_RE.finditer(text))
+        for i, match in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+            sections[int(match.group(1))] = text[match.end():end]
+        return sections
+
+    def validate_pages(self, text: str, page_numbers: List[int]) -> List[Dict]:
+        """
+        Validate a multi-page response, one result per requested page.
+
+        Pages the model skipped are validated as empty text, so they come
+        back invalid with every field marked "Not Present".
+        """
+        sections = self.split_pages(text)
+        results = []
+        for page_number in page_numbers:
+            result = self.validate(sections.get(page_number, ""))
+            if page_number not in sections:
+                result['errors'].insert(0, f"Missing section for page {page_number}")
+            results.append(result)
+        return results
+
     def get_assessment(self, text: str) -> Optional[str]:
         """Extract the assessment summary."""
         try:
             fields = self.extract_fields(text)
             return fields.get('Assessment')
         except Exception as e:
-            print(f"Warning: Error getting assessment: {e}")
+            logger.warning(f"Error getting assessment: {e}")
             return None
 
 NLP_REPRODUCABILITY_RUBRIC_FIELDS = [
@@ -0,0 +1,274 @@
+"""
+Local nearest-neighbor index over paper embeddings.
+
+The Cloudflare worker embeds title + abstract with Workers AI and searches
+Vectorize; this index holds the same vectors inside the verifier, so
+neighbors can be found (and scored) without a hop to the worker, and the
+pipeline can run offline. Files:
+
+    vectors.f4      float32 rows, L2-normalized so a dot product is the
+                    cosine similarity Vectorize reports
+    meta.jsonl      one {"id": ..., **metadata} line per row, written last
+                    so a row only counts once its line is complete
+    ivf.npz         optional inverted file built by build_ivf()
+
+Rows are only appended (under an flock, so all gunicorn workers can
+upsert); upserting an existing id adds a row that supersedes the old one.
+Exact search multiplies a batch of queries against the memory-mapped rows
+block by block and keeps a running top k. With an inverted file, a query
+only scans the rows of its nprobe nearest clusters, plus any rows appended
+since the file was built.
+
+Build an inverted file for a large corpus with:
+    python vector_index.py build-ivf --nlist 1024
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+import numpy as np
+
+from constants import VECTOR_INDEX_BLOCK_ROWS, VECTOR_INDEX_DIR, VECTOR_INDEX_NPROBE
+
+
+def normalize(vectors) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of the k largest scores per row, best first."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.zeros((len(scores), 0), dtype=np.int64), np.zeros((len(scores), 0), dtype=np.float32)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-values, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+def kmeans(vectors: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means: normalized centroids that maximize cosine similarity."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = np.bincount(assignment, minlength=clusters) == 0
+        # Reseed empty clusters with random rows
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+class VectorIndex:
+    def __init__(self, directory=VECTOR_INDEX_DIR, block_rows=VECTOR_INDEX_BLOCK_ROWS):
+        self.directory = directory
+        self.block_rows = block_rows
+        os.makedirs(directory, exist_ok=True)
+        self._path = lambda name: os.path.join(directory, name)
+
+        self._lock = threading.Lock()
+        self.dim = None
+        self.ids = []
+        self.metadata = []
+        self.index = {}
+        self._meta_offset = 0
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._latest = np.zeros(0, dtype=bool)
+        self._ivf = None
+        self._ivf_mtime = None
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self._path("lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Pick up rows appended, and inverted files built, by this or another process."""
+        try:
+            ivf_mtime = os.path.getmtime(self._path("ivf.npz"))
+        except FileNotFoundError:
+            ivf_mtime = None
+        if ivf_mtime != self._ivf_mtime:
+            self._ivf = dict(np.load(self._path("ivf.npz"))) if ivf_mtime is not None else None
+            self._ivf_mtime = ivf_mtime
+
+        try:
+            size = os.path.getsize(self._path("meta.jsonl"))
+        except FileNotFoundError:
+            return
+        if size == self._meta_offset:
+            return
+
+        with open(self._path("meta.jsonl"), "rb") as f:
+            f.seek(self._meta_offset)
+            data = f.read(size - self._meta_offset)
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.decode("utf-8").splitlines():
+            record = json.loads(line)
+            self.index[record["id"]] = len(self.ids)
+            self.ids.append(record.pop("id"))
+            self.metadata.append(record)
+        self._meta_offset += len(complete)
+
+        if self.dim is None:
+            with open(self._path("dim.json")) as f:
+                self.dim = json.load(f)["dim"]
+        rows = len(self.ids)
+        self._vectors = np.memmap(self._path("vectors.f4"), dtype=np.float32, mode="r", shape=(rows, self.dim))
+        self._latest = np.zeros(rows, dtype=bool)
+        self._latest[np.fromiter(self.index.values(), dtype=np.int64, count=len(self.index))] = True
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self.index)
+
+    def __contains__(self, paper_id):
+        with self._lock:
+            self._refresh()
+            return paper_id in self.index
+
+    def upsert(self, ids: list[str], vectors, metadata: list[dict] = None) -> int:
+        """Append rows for ids; a repeated id supersedes its earlier row."""
+        vectors = normalize(vectors)
+        if len(vectors) != len(ids):
+            raise ValueError("ids and vectors differ in length")
+        metadata = metadata or [{}] * len(ids)
+
+        with self._lock, self._file_lock():
+            self._refresh()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self._path("dim.json"), "w") as f:
+                    json.dump({"dim": self.dim}, f)
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+            # Drop the tail of a write that died before its metadata lines
+            path = self._path("vectors.f4")
+            expected = len(self.ids) * self.dim * 4
+            if os.path.exists(path) and os.path.getsize(path) != expected:
+                os.truncate(path, expected)
+
+            with open(path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._path("meta.jsonl"), "ab") as f:
+                f.write("".join(json.dumps({"id": paper_id, **meta}) + "\n"
+                                for paper_id, meta in zip(ids, metadata)).encode("utf-8"))
+            self._refresh()
+        return len(ids)
+
+    def vector(self, paper_id: str) -> Optional[np.ndarray]:
+        with self._lock:
+            self._refresh()
+            row = self.index.get(paper_id)
+            return None if row is None else np.array(self._vectors[row])
+
+    def _scan(self, queries: np.ndarray, rows: Optional[np.ndarray], k: int, vectors, latest):
+        """Top k over the given rows (all rows if None), one block at a time."""
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        total = len(vectors) if rows is None else len(rows)
+        for start in range(0, total, self.block_rows):
+            if rows is None:
+                block = np.arange(start, min(start + self.block_rows, total))
+                block_vectors = vectors[start:start + len(block)]
+            else:
+                block = rows[start:start + self.block_rows]
+                block_vectors = vectors[block]
+            scores = queries @ np.asarray(block_vectors).T
+            scores[:, ~latest[block]] = -np.inf
+            merged_rows = np.concatenate([best_rows, np.broadcast_to(block, scores.shape)], axis=1)
+            merged_scores = np.concatenate([best_scores, scores], axis=1)
+            columns, best_scores = top_k(merged_scores, k)
+            best_rows = np.take_along_axis(merged_rows, columns, axis=1)
+        return best_rows, best_scores
+
+    def search(self, queries, k: int = 10, exclude: list[str] = None, exact: bool = False,
+               nprobe: int = VECTOR_INDEX_NPROBE) -> list[list[tuple[str, float, dict]]]:
+        """
+        The k nearest papers to each query vector, as (id, cosine
+        similarity, metadata) best first. exclude lists ids to leave out
+        (e.g. the query paper itself). The inverted file is used when one
+        has been built, unless exact is set.
+        """
+        queries = normalize(queries)
+        with self._lock:
+            self._refresh()
+            vectors, latest, ivf, ids, metadata = self._vectors, self._latest.copy(), self._ivf, self.ids, self.metadata
+            for paper_id in exclude or ():
+                if paper_id in self.index:
+                    latest[self.index[paper_id]] = False
+        if len(vectors) == 0:
+            return [[] for _ in queries]
+
+        if ivf is None or exact:
+            best_rows, best_scores = self._scan(queries, None, k, vectors, latest)
+        else:
+            best_rows, best_scores = self._search_ivf(queries, k, vectors, latest, ivf, nprobe)
+
+        return [[(ids[row], float(score), metadata[row])
+                 for row, score in zip(rows, scores) if np.isfinite(score)]
+                for rows, scores in zip(best_rows, best_scores)]
+
+    def _search_ivf(self, queries, k, vectors, latest, ivf, nprobe):
+        centroids, order, offsets, indexed = ivf["centroids"], ivf["order"], ivf["offsets"], int(ivf["rows"])
+        probes = top_k(queries @ centroids.T, nprobe)[0]
+        tail = np.arange(indexed, len(vectors))
+        best_rows, best_scores = [], []
+        for query, clusters in zip(queries, probes):
+            rows = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in clusters] + [tail])
+            rows.sort()  # sequential reads from the memory map
+            found_rows, found_scores = self._scan(query[None, :], rows, k, vectors, latest)
+            best_rows.append(np.pad(found_rows[0], (0, k - found_rows.shape[1])))
+            best_scores.append(np.pad(found_scores[0], (0, k - found_scores.shape[1]), constant_values=-np.inf))
+        return np.array(best_rows), np.array(best_scores)
+
+    def build_ivf(self, nlist: int, iterations: int = 10, sample: int = 100_000, seed: int = 0) -> dict:
+        """
+        Cluster the current rows into nlist lists and save the inverted file;
+        rows appended later are scanned exactly until the next build.
+        """
+        with self._lock:
+            self._refresh()
+            vectors = self._vectors
+        rows = len(vectors)
+        if rows < nlist:
+            raise ValueError(f"Need at least {nlist} rows to build {nlist} lists, have {rows}")
+
+        rng = np.random.default_rng(seed)
+        training = np.asarray(vectors[np.sort(rng.choice(rows, min(sample, rows), replace=False))])
+        centroids = kmeans(training, nlist, iterations, seed)
+        assignment = np.concatenate([np.argmax(np.asarray(vectors[start:start + self.block_rows]) @ centroids.T, axis=1)
+                                     for start in range(0, rows, self.block_rows)])
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=nlist))])
+
+        tmp = self._path("ivf.tmp.npz")
+        np.savez(tmp, centroids=centroids, order=order, offsets=offsets, rows=rows)
+        os.replace(tmp, self._path("ivf.npz"))
+        return {"rows": rows, "nlist": nlist, "largest_list": int(np.diff(offsets).max())}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the local vector index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build-ivf", help="cluster the index into an inverted file")
+    build.add_argument("--nlist", type=int, default=1024, help="number of clusters")
+    build.add_argument("--iterations", type=int, default=10, help="k-means iterations")
+    args = parser.parse_args()
+
+    print(json.dumps(VectorIndex().build_ivf(args.nlist, args.iterations)))
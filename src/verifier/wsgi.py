@@ -0,0 +1,14 @@
+"""
+WSGI entry point for production serving: gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app, this module is imported once in the gunicorn master, so
+the heavy imports (fitz, google-genai, diskcache) and the genai client are
+set up before the workers fork and are shared copy-on-write. Background
+threads are started per worker by the post_fork hook in gunicorn.conf.py.
+"""
+
+from engine import preload
+
+preload()
+
+from endpoint import app  # noqa: E402
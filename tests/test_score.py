@@ -0,0 +1,85 @@
+import asyncio
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "verifier"))
+
+import pytest
+
+import endpoint
+import score
+from prompts import PAGE_DELIMITER
+from validator import NLP_REPRODUCABILITY_RUBRIC_FIELDS
+
+PAGE_LINE = re.compile("^" + re.escape(PAGE_DELIMITER).replace(r"\{page\}", r"(\d+)") + "$", re.MULTILINE)
+
+
+def reply(**grades) -> str:
+    lines = [f"{field}: {grades.get(field, 'Not Present')}" for field in NLP_REPRODUCABILITY_RUBRIC_FIELDS]
+    return "\n".join(lines) + "\nAssessment: Test assessment.\n"
+
+
+class StubEngine:
+    """Answers every page with a fixed reply, keyed by the page text."""
+
+    def __init__(self, replies: dict[str, str]):
+        self.replies = replies
+        self.pages = []
+
+    async def generate(self, contents, *args, **kwargs):
+        pages = PAGE_LINE.split(contents)
+        if len(pages) == 1:
+            self.pages.append(contents.strip())
+            return self.replies[contents.strip()]
+        # split() gives [preamble, number, text, number, text, ...]
+        self.pages.extend(text.strip() for text in pages[2::2])
+        return "\n".join(f"{PAGE_DELIMITER.format(page=number)}\n{self.replies[text.strip()]}"
+                         for number, text in zip(pages[1::2], pages[2::2]))
+
+    def run(self, coro):
+        return asyncio.run(coro)
+
+
+class StubCache:
+    def get_page(self, page_text):
+        return None
+
+    def set_page(self, page_text, result):
+        pass
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    stub = StubEngine({
+        "good page": reply(Infrastructure="Partial"),
+        "bad page": reply(Infrastructure="Partial (no GPU count)"),
+    })
+    monkeypatch.setattr(score, "get_engine", lambda: stub)
+    return stub
+
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_ungradable_page_is_rescored_then_failed(engine, batched):
+    results = score.score_pages_concurrently(["good page", "bad page"], "test-model", batched=batched,
+                                             early_stop=False)
+
+    assert not results[0].get('failed')
+    assert results[1]['failed'] and results[1]['fields'] == {}
+    assert "Partial (no GPU count)" in results[1]['errors'][0]
+    assert engine.pages.count("bad page") == 2
+
+
+def test_score_pdf_returns_partial_result_for_bad_grade(engine, monkeypatch):
+    monkeypatch.setattr(endpoint, "load_extraction", lambda paper_id, pdf_url: {'pages': ["good page", "bad page"]})
+    monkeypatch.setattr(endpoint, "select_pages", lambda pages_text: (list(range(len(pages_text))), {}))
+    monkeypatch.setattr(endpoint, "prescore_pages", lambda pages_text, keep: {})
+    monkeypatch.setattr(endpoint, "cache", StubCache())
+    monkeypatch.setattr(endpoint, "SCORE_CASCADE", False)
+
+    result = endpoint.score_pdf("test", "https://example.org/test.pdf")
+    response = endpoint.format_score_response("test", "https://example.org/test.pdf", result)
+
+    assert response["partial"]
+    assert response["failed_pages"] == [2]
+    assert response["graded_rubric"]["Infrastructure"] == "Partial"